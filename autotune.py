@@ -0,0 +1,146 @@
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from zipfile import ZipFile
+
+import psutil
+
+import config
+import utils
+from bag.bag_parser import BagParser, OBJECT_TYPE_TABLES
+from database_duckdb import DatabaseDuckdb
+from metrics import Metrics
+
+
+class AutoTune:
+    # Calibration of the worker count and insert batch size per object type. Short parse passes on a sample of the
+    # XML files measure the objects parsed per second. The best settings are saved per host profile (computer name,
+    # CPU cores and memory), so a BAG file copied to another computer is tuned again.
+
+    insert_batch_files_candidates = [1, 4, 16]
+
+    def __init__(self, file_name=None):
+        self.file_name = file_name or config.file_autotune
+
+    @staticmethod
+    def host_profile():
+        return (f"{platform.node()} | {platform.machine()} | {psutil.cpu_count(False)} cores | "
+                f"{psutil.cpu_count()} threads | {round(psutil.virtual_memory().total / 2**30)} GB")
+
+    @staticmethod
+    def workers_count_candidates():
+        # 1, 2, 4, 8... up to the number of logical cores, plus the default from config.py
+        candidates = {config.cpu_cores_used, multiprocessing.cpu_count()}
+        count = 1
+        while count < multiprocessing.cpu_count():
+            candidates.add(count)
+            count *= 2
+        return sorted(candidates)
+
+    def __read(self):
+        if not os.path.exists(self.file_name):
+            return {}
+        with open(self.file_name, encoding='utf-8') as file:
+            return json.load(file)
+
+    def load(self):
+        # Settings per object type for this computer, empty if not tuned yet
+        if not config.use_autotune:
+            return {}
+        settings = self.__read().get(self.host_profile(), {}).get('object_types', {})
+        if settings:
+            utils.print_log(f"autotune: instellingen van '{self.file_name}' gebruikt")
+        return settings
+
+    def save(self, settings):
+        profiles = self.__read()
+        profiles[self.host_profile()] = {'date': datetime.now().isoformat(timespec='seconds'), 'object_types': settings}
+
+        path = os.path.dirname(self.file_name)
+        if path and not os.path.exists(path):
+            os.makedirs(path)
+        with open(self.file_name, 'w', encoding='utf-8') as file:
+            json.dump(profiles, file, indent=2)
+        utils.print_log(f"autotune: instellingen opgeslagen in '{self.file_name}'")
+
+    def run(self, folder_temp='temp'):
+        # Needs the zip files of the object types in folder_temp (the unzipped BAG file)
+        utils.print_log(f"start: autotune | {self.host_profile()}")
+        start_time = time.perf_counter()
+        workers_counts = self.workers_count_candidates()
+        settings = {}
+
+        # The calibration passes should not count in the metrics of the import
+        metrics_import = utils.metrics
+        utils.metrics = Metrics()
+
+        folder = tempfile.mkdtemp()
+        try:
+            database = DatabaseDuckdb(file_db=os.path.join(folder, 'autotune.duckdb'))
+            database.create_bag_tables()
+            parser = BagParser(database)
+
+            for object_type, table_name in OBJECT_TYPE_TABLES.items():
+                parser.set_object_type(object_type)
+                xml_files = self.__sample_xml_files(
+                    utils.find_file(folder_temp, parser.file_bag_code, 'zip'), folder, 2 * max(workers_counts))
+                if len(xml_files) < 2:
+                    # Only a few objects, the settings make no difference
+                    continue
+
+                def measure(workers_count, insert_batch_files):
+                    database.create_bag_table(table_name)
+                    # Start the workers before measuring
+                    parser.worker_pool(workers_count)
+                    pass_start_time = time.perf_counter()
+                    parser.parse_xml_files(xml_files, parser.save_function(), workers_count, insert_batch_files)
+                    objects_per_second = parser.count_xml_tags / (time.perf_counter() - pass_start_time)
+                    utils.print_log(f"autotune: {object_type} | workers: {workers_count} | "
+                                    f"insert batch: {insert_batch_files} files | "
+                                    f"objects per second: {objects_per_second:,.0f}")
+                    return objects_per_second
+
+                # First the worker count, then the insert batch size with the best worker count
+                results = {(workers_count, config.insert_batch_files): measure(workers_count, config.insert_batch_files)
+                           for workers_count in workers_counts if workers_count <= len(xml_files)}
+                best_workers_count = max(results, key=results.get)[0]
+                for insert_batch_files in self.insert_batch_files_candidates:
+                    if (best_workers_count, insert_batch_files) not in results:
+                        results[(best_workers_count, insert_batch_files)] = measure(best_workers_count,
+                                                                                    insert_batch_files)
+
+                (workers_count, insert_batch_files), objects_per_second = max(results.items(), key=lambda r: r[1])
+                settings[object_type] = {'workers_count': workers_count, 'insert_batch_files': insert_batch_files,
+                                         'objects_per_second': round(objects_per_second)}
+                utils.print_log(f"autotune: {object_type} beste instelling | workers: {workers_count} | "
+                                f"insert batch: {insert_batch_files} files")
+
+                for file_xml in xml_files:
+                    os.remove(file_xml)
+
+            parser.close()
+            database.close()
+        finally:
+            shutil.rmtree(folder)
+            utils.metrics = metrics_import
+
+        self.save(settings)
+        utils.print_log(f"ready: autotune {utils.time_elapsed(start_time)}")
+        return settings
+
+    @staticmethod
+    def __sample_xml_files(file_zip, folder, count):
+        # Extract XML files spread evenly over the zip file
+        with ZipFile(file_zip, 'r') as archive:
+            names = sorted(name for name in archive.namelist() if name.endswith('.xml'))
+            step = max(1, len(names) // count)
+            sample = names[::step][:count]
+            for name in sample:
+                archive.extract(name, folder)
+
+        return [os.path.join(folder, name) for name in sample]
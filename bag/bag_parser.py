@@ -1,6 +1,9 @@
 # BAG XML parser
-import math
+import datetime
+import html
 import os
+import pickle
+import re
 import time
 from concurrent.futures import ProcessPoolExecutor, wait
 from lxml import etree
@@ -9,12 +12,86 @@ import config
 
 import utils
 from bag import rijksdriehoek
+from bag.parse_cache import ParseCache
 
+# The *_MULTI functions return a list of all values (a VARCHAR[] column in DuckDB)
 FIND_FIELD = 0
 FIND_FIELD_MULTI = 1
 FIND_NESTED_FIELD = 2
 FIND_NESTED_FIELD_MULTI = 3
 
+# Optional third element of a field in db_fields: the type the value is converted to in the parse workers.
+# Fields without a type are text. Values that cannot be converted are counted and set to None/NULL.
+TYPE_DATE = 0
+TYPE_INTEGER = 1
+TYPE_DOUBLE = 2
+
+
+def to_date(value):
+    # BAG dates can have a time: 2010-01-01T00:00:00.000
+    return datetime.date.fromisoformat(value[:10])
+
+
+TYPE_CONVERSIONS = {
+    TYPE_DATE: to_date,
+    TYPE_INTEGER: int,
+    TYPE_DOUBLE: float,
+}
+
+# BAG object types in the order they are imported, with the table they are saved in
+OBJECT_TYPE_TABLES = {
+    'Woonplaats': 'woonplaatsen',
+    'GemeenteWoonplaatsRelatie': 'gemeente_woonplaatsen',
+    'OpenbareRuimte': 'openbare_ruimten',
+    'Nummeraanduiding': 'nummers',
+    'Pand': 'panden',
+    'Verblijfsobject': 'verblijfsobjecten',
+    'Ligplaats': 'ligplaatsen',
+    'Standplaats': 'standplaatsen',
+}
+
+# Region import (config.region_gemeenten or config.region_bbox): the object types that select the region are parsed
+# first, the others only keep the rows with an id that is referenced by the rows imported before. Per object type, in
+# the order they are imported: (field, SQL query of the ids to keep), 'gemeenten' for the gemeenten in the config or
+# 'bbox' for the objects with their location in the RD bounding box. Panden are selected by reference in both modes.
+REGION_GEMEENTE_FILTERS = {
+    'GemeenteWoonplaatsRelatie': 'gemeenten',
+    'Woonplaats': ('id', "SELECT woonplaats_id FROM gemeente_woonplaatsen"),
+    'OpenbareRuimte': ('woonplaats_id', "SELECT woonplaats_id FROM woonplaatsen"),
+    'Nummeraanduiding': ('openbare_ruimte_id', "SELECT id FROM openbare_ruimten"),
+    'Verblijfsobject': ('nummer_id', "SELECT id FROM nummers"),
+    'Ligplaats': ('nummer_id', "SELECT id FROM nummers"),
+    'Standplaats': ('nummer_id', "SELECT id FROM nummers"),
+    'Pand': ('id', "SELECT unnest(pand_id) FROM verblijfsobjecten"),
+}
+REGION_BBOX_FILTERS = {
+    'Verblijfsobject': 'bbox',
+    'Ligplaats': 'bbox',
+    'Standplaats': 'bbox',
+    'Pand': ('id', "SELECT unnest(pand_id) FROM verblijfsobjecten"),
+    'Nummeraanduiding': ('id', "SELECT nummer_id FROM verblijfsobjecten UNION SELECT unnest(nevenadressen) "
+                               "FROM verblijfsobjecten UNION SELECT nummer_id FROM ligplaatsen "
+                               "UNION SELECT nummer_id FROM standplaatsen"),
+    'OpenbareRuimte': ('id', "SELECT openbare_ruimte_id FROM nummers"),
+    'Woonplaats': ('id', "SELECT woonplaats_id FROM openbare_ruimten UNION SELECT woonplaats_id FROM nummers"),
+    'GemeenteWoonplaatsRelatie': ('woonplaats_id', "SELECT woonplaats_id FROM woonplaatsen"),
+}
+
+
+def region_filters():
+    if config.region_gemeenten and config.region_bbox:
+        raise Exception("Kies een regio met region_gemeenten (--only-gemeente) of region_bbox (--bbox), niet beide")
+    if config.region_gemeenten:
+        return REGION_GEMEENTE_FILTERS
+    if config.region_bbox:
+        return REGION_BBOX_FILTERS
+    return None
+
+
+def import_order():
+    # Object types in the order they are imported
+    return list(region_filters() or OBJECT_TYPE_TABLES)
+
 def prettyprint(element, prepend=''):
     # xml = etree.tostring(element, pretty_print=True)
     # print(xml.decode(), end='')
@@ -29,8 +106,12 @@ def prettyprint(element, prepend=''):
             prettyprint(child, prepend + '\t')
 
 
-def parse_xml_file(file_xml, tag_name, data_init, object_tag_name, db_fields):
-    today_string = utils.bag_date_today()
+def parse_xml_file(file_xml, tag_name, data_init, object_tag_name, db_fields, engine=None, region=None,
+                   filter_dates=True):
+    start_time = time.perf_counter()
+    engine = engine or config.xml_engine
+    start_timestamp = time.time()
+    today = to_date(utils.bag_date_today())
 
     def find_field(bag_element, field_name):
         # print(f"find_field {bag_element}, {nested_list}")
@@ -43,8 +124,7 @@ def parse_xml_file(file_xml, tag_name, data_init, object_tag_name, db_fields):
         # print(f"find_field {bag_element}, {nested_list}")
         fields = bag_element.findall('.//{*}' + field_name)
         if fields:
-            doelen = [field.text for field in fields]
-            return "\t".join(doelen)
+            return [field.text for field in fields]
         return None
 
     def find_nested_field(bag_element, nested_list):
@@ -82,35 +162,31 @@ def parse_xml_file(file_xml, tag_name, data_init, object_tag_name, db_fields):
                             result_list.extend(res)
                 return result_list
             else:
-                # print(f"\tvalue: {field[0].text}")
-                # return [field.text for field in fields]
-                doelen = [field.text for field in fields]
-                return "\t".join(doelen)
+                return [field.text for field in fields]
 
         return None
 
     def bag_begindatum_valid(data):
         datum = data.get('begindatum_geldigheid')
         if datum:
-            datum = datum[0:10]
-            # string date compare is quicker than converting to date types
-            return datum <= today_string
+            return datum <= today
         else:
             return False
 
     def bag_einddatum_valid(data):
+        # Valid up to (not including) the end date, the begin date of the next version. Like geldig_op in history mode.
         datum = data.get('einddatum_geldigheid')
         if datum:
-            datum = datum[0:10]
-            # string date compare is quicker than converting to date types
-            return datum >= today_string
+            return datum > today
         else:
             return True
             # No einddatum means valid
 
     def data_active(data):
+        # Without filter_dates all versions with the active status are kept, the dates are filtered in SQL later,
+        # see BagParser.parse
         status_ok = (not status_active) or (data['status'] == status_active)
-        return status_ok and bag_begindatum_valid(data) and bag_einddatum_valid(data)
+        return status_ok and (not filter_dates or (bag_begindatum_valid(data) and bag_einddatum_valid(data)))
 
     data = data_init.copy()
     coordinates_field = None
@@ -150,43 +226,290 @@ def parse_xml_file(file_xml, tag_name, data_init, object_tag_name, db_fields):
         case _:
             raise Exception(f'No save function found for tag_name "{tag_name}"')
 
-    root = etree.parse(file_xml).getroot()
-    bag_objects = root.findall(".//{*}"+object_tag_name)
-    xml_count += len(bag_objects)
-
-    for bag_object in bag_objects:
-        data = data_init.copy()
-        for db_field, (xml_field, find_function) in db_fields.items():
-            # data[db_field] = find_nested(bag_object, xml_field)
-            # results = find_function(bag_object, xml_field)
-            # print(f"{xml_field} : {results} - {len(results) if results else 'None'}")
-            # data[db_field] = find_functions[find_function](bag_object, xml_field)
-            if find_function == FIND_FIELD:
-                    data[db_field] = find_field(bag_object, xml_field)
-            elif find_function == FIND_NESTED_FIELD:
-                    data[db_field] = find_nested_field(bag_object, xml_field)
-            elif find_function == FIND_FIELD_MULTI:
-                    data[db_field] = find_field_multi(bag_object, xml_field)
-            elif find_function == FIND_NESTED_FIELD_MULTI:
-                data[db_field] = find_nested_field_multi(bag_object, xml_field)
-            else:
-                utils.print_log(f"Unknown find_field function ({find_function}), setting field {db_field} to None/NULL", error=True)
-                data[db_field] = None
-
-        db_data.append(data)
+    scanned = scan_xml_file(file_xml, object_tag_name, db_fields, data_init) if engine == 'scan' else None
+    if scanned is not None:
+        xml_count, db_data = scanned
+    else:
+        root = etree.parse(file_xml).getroot()
+        bag_objects = root.findall(".//{*}"+object_tag_name)
+        xml_count += len(bag_objects)
+
+        for bag_object in bag_objects:
+            data = data_init.copy()
+            for db_field, (xml_field, find_function, *_) in db_fields.items():
+                # data[db_field] = find_nested(bag_object, xml_field)
+                # results = find_function(bag_object, xml_field)
+                # print(f"{xml_field} : {results} - {len(results) if results else 'None'}")
+                # data[db_field] = find_functions[find_function](bag_object, xml_field)
+                if find_function == FIND_FIELD:
+                        data[db_field] = find_field(bag_object, xml_field)
+                elif find_function == FIND_NESTED_FIELD:
+                        data[db_field] = find_nested_field(bag_object, xml_field)
+                elif find_function == FIND_FIELD_MULTI:
+                        data[db_field] = find_field_multi(bag_object, xml_field)
+                elif find_function == FIND_NESTED_FIELD_MULTI:
+                    data[db_field] = find_nested_field_multi(bag_object, xml_field)
+                else:
+                    utils.print_log(f"Unknown find_field function ({find_function}), setting field {db_field} to None/NULL", error=True)
+                    data[db_field] = None
+
+            db_data.append(data)
+
+    invalid_values = convert_types(db_data, db_fields)
 
     if config.active_only:
         db_data = list(filter(lambda d: data_active(d), db_data))
 
+    # Region import: (field, ids file, bbox), see BagParser.region_filter
+    region_field, region_file_ids, region_bbox = region or (None, None, None)
+    if region_file_ids:
+        ids = region_ids(region_file_ids)
+        db_data = [row for row in db_data if row[region_field] in ids]
+
     if coordinates_field is not None:
         db_data = add_coordinates(db_data, coordinates_field)
 
+    if region_bbox:
+        xmin, ymin, xmax, ymax = region_bbox
+        db_data = [row for row in db_data if row.get('rd_x') is not None and
+                   xmin <= row['rd_x'] <= xmax and ymin <= row['rd_y'] <= ymax]
+
+    if tag_name == 'Pand' and config.parse_geometries:
+        # From the RD coordinates, before the geometry is converted or simplified
+        db_data = add_footprint(db_data, geometry_points)
+
     if has_geometry:
-        if config.parse_geometries:
+        if not config.parse_geometries:
+            db_data = geometry_to_empty(db_data)
+        elif config.geometry_crs == 'RD':
+            db_data = geometry_to_rd(db_data, geometry_points)
+        else:
             db_data = geometry_to_wgs84(db_data, geometry_points)
+    coordinates_cache_hits, coordinates_cache_misses = utils.coordinates_cache_counts()
+    # Start and end timestamps and process id to measure how long the workers are idle
+    return {'count':xml_count, 'data':db_data, 'seconds': time.perf_counter() - start_time, 'pid': os.getpid(),
+            'start': start_timestamp, 'end': time.time(),
+            'coordinates_cache_hits': coordinates_cache_hits, 'coordinates_cache_misses': coordinates_cache_misses,
+            'invalid_values': invalid_values}
+
+
+def convert_types(rows, db_fields):
+    # Convert the text values of the typed fields, returns the number of invalid values per field
+    conversions = [(db_field, TYPE_CONVERSIONS[spec[2]]) for db_field, spec in db_fields.items() if len(spec) > 2]
+    invalid_values = {}
+    for row in rows:
+        for db_field, convert in conversions:
+            value = row[db_field]
+            if not value:
+                row[db_field] = None
+                continue
+            try:
+                row[db_field] = convert(value)
+            except ValueError:
+                row[db_field] = None
+                invalid_values[db_field] = invalid_values.get(db_field, 0) + 1
+
+    return invalid_values
+
+
+# Byte scanning extractor engine (config.xml_engine = 'scan'). Finds the fields in the raw bytes of each object
+# with bytes.find instead of building an lxml tree. Gives the same values as the lxml functions in parse_xml_file:
+# the text of the first (or every) element with the field name, in any namespace, up to its first child element.
+# Files it does not support (comments, CDATA, other encodings than UTF-8) are parsed with lxml.
+SCAN_PREFIX = re.compile(rb'[\w.-]+')
+SCAN_NAME_END = b' \t\r\n/>'
+scan_names = {}
+scan_end_tags = {}
+
+
+def scan_start_tag(data, name, start, end):
+    # (qualified name, position of the closing >) of the first start tag <name or <prefix:name in data[start:end]
+    if name not in scan_names:
+        scan_names[name] = (b':' + name.encode(), b'<' + name.encode(), len(name.encode()))
+    colon_name, open_name, length = scan_names[name]
+
+    position = start
+    while True:
+        index = data.find(colon_name, position, end)
+        # Elements without a namespace prefix
+        index_open = data.find(open_name, position, end if index == -1 else index)
+        if index_open != -1:
+            tag_start = index_open
+            name_end = index_open + 1 + length
+            position = index_open + 1
+        elif index == -1:
+            return None
         else:
-            db_data = geometry_to_empty(db_data)
-    return {'count':xml_count, 'data':db_data}
+            tag_start = data.rfind(b'<', start, index)
+            name_end = index + 1 + length
+            position = index + 1
+            # The prefix rules out end tags and text containing :name
+            if tag_start == -1 or not SCAN_PREFIX.fullmatch(data, tag_start + 1, index):
+                continue
+        if name_end < end and data[name_end] in SCAN_NAME_END:
+            return data[tag_start + 1:name_end], data.index(b'>', name_end)
+
+
+def scan_element_end(data, qualified_name, content_start, end):
+    # Position of the end tag of an element, also if it contains elements with the same qualified name
+    if qualified_name not in scan_end_tags:
+        scan_end_tags[qualified_name] = (b'</' + qualified_name + b'>', b'<' + qualified_name,
+                                         re.compile(rb'<(/?)' + re.escape(qualified_name) + rb'(?=[\s/>])'))
+    end_tag, start_tag, tags = scan_end_tags[qualified_name]
+
+    end_position = data.find(end_tag, content_start, end)
+    if end_position != -1 and data.find(start_tag, content_start, end_position) == -1:
+        return end_position
+
+    # Nested elements with the same name or whitespace in the end tag
+    depth = 1
+    position = content_start
+    while True:
+        match = tags.search(data, position, end)
+        if not match:
+            raise Exception(f"Geen eindtag gevonden voor {qualified_name.decode()}")
+        position = data.index(b'>', match.end())
+        if match.group(1):
+            depth -= 1
+            if depth == 0:
+                return match.start()
+        elif data[position - 1] != ord('/'):
+            depth += 1
+        position += 1
+
+
+def scan_elements(data, name, start, end, first_only=False):
+    # (content start, content end) of the elements with name in data[start:end] in document order. Nested elements
+    # with the same name are included, like lxml findall('.//{*}name'). A self-closing element has no content.
+    elements = []
+    position = start
+    while True:
+        tag = scan_start_tag(data, name, position, end)
+        if not tag:
+            return elements
+        qualified_name, tag_end = tag
+        if data[tag_end - 1] == ord('/'):
+            elements.append((tag_end + 1, tag_end + 1))
+        else:
+            elements.append((tag_end + 1, scan_element_end(data, qualified_name, tag_end + 1, end)))
+        if first_only:
+            return elements
+        position = tag_end + 1
+
+
+def scan_text(data, content_start, content_end):
+    # Text of an element up to its first child element, None if empty (like lxml)
+    text_end = data.find(b'<', content_start, content_end)
+    text = data[content_start:content_end if text_end == -1 else text_end]
+    if not text:
+        return None
+    text = text.decode('utf-8')
+    if '&' in text:
+        text = html.unescape(text)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def scan_field(data, start, end, field_name):
+    # First element only, the end of the element is not needed for its text
+    tag = scan_start_tag(data, field_name, start, end)
+    if not tag:
+        return None
+    tag_end = tag[1]
+    if data[tag_end - 1] == ord('/'):
+        return None
+    return scan_text(data, tag_end + 1, end)
+
+
+def scan_field_multi(data, start, end, field_name):
+    elements = scan_elements(data, field_name, start, end)
+    if elements:
+        return [scan_text(data, content_start, content_end) for content_start, content_end in elements]
+    return None
+
+
+def scan_nested_field(data, start, end, nested_list):
+    elements = scan_elements(data, nested_list[0], start, end, first_only=True)
+    if not elements:
+        return None
+    content_start, content_end = elements[0]
+    if len(nested_list) > 1:
+        return scan_nested_field(data, content_start, content_end, nested_list[1:])
+    return scan_text(data, content_start, content_end)
+
+
+def scan_nested_field_multi(data, start, end, nested_list):
+    elements = scan_elements(data, nested_list[0], start, end)
+    if not elements:
+        return None
+    if len(nested_list) > 1:
+        results = [value for content_start, content_end in elements
+                   for value in scan_nested_field_multi(data, content_start, content_end, nested_list[1:]) or []]
+        return results or None
+    return [scan_text(data, content_start, content_end) for content_start, content_end in elements]
+
+
+SCAN_FUNCTIONS = {
+    FIND_FIELD: scan_field,
+    FIND_FIELD_MULTI: scan_field_multi,
+    FIND_NESTED_FIELD: scan_nested_field,
+    FIND_NESTED_FIELD_MULTI: scan_nested_field_multi,
+}
+
+
+def scan_xml_file(file_xml, object_tag_name, db_fields, data_init):
+    # Returns (number of objects, rows) or None if the file has to be parsed with lxml
+    with open(file_xml, 'rb') as file:
+        data = file.read()
+
+    header = data[:200]
+    if (b'<![CDATA[' in data or b'<!--' in data or
+            (b'encoding=' in header and not re.search(rb'encoding=["\']utf-8["\']', header, re.IGNORECASE))):
+        return None
+
+    fields = [(db_field, SCAN_FUNCTIONS[find_function], xml_field)
+              for db_field, (xml_field, find_function, *_) in db_fields.items()]
+
+    rows = []
+    for start, end in scan_elements(data, object_tag_name, 0, len(data)):
+        row = data_init.copy()
+        for db_field, scan_function, xml_field in fields:
+            row[db_field] = scan_function(data, start, end, xml_field)
+        rows.append(row)
+
+    return len(rows), rows
+
+
+# Set in the worker processes by init_parse_worker
+worker_field_specs = {}
+# Ids of the region filters, loaded once per worker process
+worker_region_ids = {}
+
+
+def init_parse_worker(field_specs):
+    # Initializer of the worker processes. Runs once per process, the pool is reused for all object types.
+    # Unpickling this function already imported lxml, config, utils and rijksdriehoek.
+    global worker_field_specs
+    worker_field_specs = field_specs
+    etree.fromstring(b'<warm/>')
+
+
+def parse_xml_job(file_xml, tag_name, region=None, filter_dates=True):
+    # Parse job with the fields of the object type preloaded in the worker, instead of sending them with every job
+    data_init, object_tag_name, db_fields = worker_field_specs[tag_name]
+    return parse_xml_file(file_xml, tag_name, data_init, object_tag_name, db_fields, region=region,
+                          filter_dates=filter_dates)
+
+
+def region_ids(file_ids):
+    # The ids are written to a file once per object type instead of being sent with every job
+    key = (file_ids, os.path.getmtime(file_ids))
+    if key not in worker_region_ids:
+        with open(file_ids, 'rb') as file:
+            worker_region_ids.clear()
+            worker_region_ids[key] = pickle.load(file)
+    return worker_region_ids[key]
 
 
 def geometry_to_wgs84(rows, geometry_points=2):
@@ -195,6 +518,21 @@ def geometry_to_wgs84(rows, geometry_points=2):
     return rows
 
 
+def add_footprint(rows, geometry_points=2):
+    for row in rows:
+        footprint = utils.bag_geometry_footprint(row['geometry'], geometry_points) if row['geometry'] else None
+        if footprint:
+            (row['oppervlakte'], row['rd_x'], row['rd_y'],
+             row['rd_xmin'], row['rd_ymin'], row['rd_xmax'], row['rd_ymax']) = footprint
+    return rows
+
+
+def geometry_to_rd(rows, geometry_points=2):
+    for row in rows:
+        row['geometry'] = utils.bag_geometry_to_rd_wkt(row['geometry'], geometry_points)
+    return rows
+
+
 def geometry_to_empty(rows):
     for i, row in enumerate(rows):
         row['geometry'] = ''
@@ -228,11 +566,15 @@ class BagParser:
     gui_time = None
     folder_temp_xml = "temp_xml"
 
-    def __init__(self, database):
+    def __init__(self, database, tuned_settings=None):
         self.database = database
+        # Worker count and insert batch size per object type, see autotune.py
+        self.tuned_settings = tuned_settings or {}
         self.count_xml_tags = 0
         self.count_xml_files = 0
         self.total_xml_files = None
+        self.count_xml_bytes = 0
+        self.total_xml_bytes = 0
         self.tag_name = None
         self.object_tag_name = None
         self.file_bag_code = None
@@ -241,23 +583,102 @@ class BagParser:
         self.today_string = utils.bag_date_today()
         # self.data_init = {'status': '', 'begindatum_geldigheid': '', 'einddatum_geldigheid': ''}
         self.data_init = {}
+        self.parse_cache = ParseCache(database)
+        self.pool = None
+        self.pool_workers_count = None
+        self.pools_started = 0
+        self.pools_start_seconds = 0.0
+        # Filter of the rows in the workers for a region import, see region_filter
+        self.region = None
+        # Filter the versions on the date of today in the workers, see parse
+        self.filter_dates = True
+
+        # Fields of all object types, preloaded in the worker processes
+        self.field_specs = {}
+        for object_type in OBJECT_TYPE_TABLES:
+            self.set_object_type(object_type)
+            self.field_specs[object_type] = (self.data_init.copy(), self.object_tag_name, self.db_fields)
+        self.tag_name = None
+        self.data_init = {}
 
         if not os.path.exists(self.folder_temp_xml):
             os.makedirs(self.folder_temp_xml)
 
     def parse(self, tag_name):
-        self.tag_name = tag_name
+        self.set_object_type(tag_name)
         self.count_xml_tags = 0
 
+        utils.print_log(f'start: parse {self.tag_name}')
+
+        table_name = OBJECT_TYPE_TABLES[self.tag_name]
+        cache_key = None
+        # With active_only the cache holds all versions with the active status and the versions valid today are
+        # selected in SQL after parsing or loading, so a cache entry is still valid on the next days
+        cache_all_versions = config.use_parse_cache and config.active_only
+        if config.use_parse_cache:
+            cache_key = self.__cache_key(table_name)
+            if cache_all_versions:
+                self.database.create_bag_table(table_name, all_versions=True)
+            if self.parse_cache.load(self.tag_name, cache_key, [table_name]):
+                if cache_all_versions:
+                    self.database.keep_versions_valid_on(table_name, self.today_string)
+                return
+
+        with utils.metrics.span('parse', object_type=self.tag_name):
+            with utils.metrics.span('unzip', object_type=self.tag_name):
+                self.__unzip_xml()
+
+            utils.print_log('convert XML files to DuckDB')
+            self.filter_dates = not cache_all_versions
+            self.__parse_xml_files()
+            self.filter_dates = True
+
+        time_elapsed = utils.time_elapsed(self.start_time)
+        utils.print_log(f'ready: parse XML {self.tag_name} | {time_elapsed} '
+                        f'| XML nodes: {self.count_xml_tags:,d}')
+
+        utils.empty_folder(self.folder_temp_xml)
+
+        if cache_key:
+            self.parse_cache.save(self.tag_name, cache_key, [table_name])
+        if cache_all_versions:
+            self.database.keep_versions_valid_on(table_name, self.today_string)
+
+    def __cache_key(self, table_name):
+        # Everything that changes the parsed table: the zip file of the object type, the fields, the table definition
+        # and the settings. Not the date of today, the cache holds all versions (see parse). Except for a region
+        # import: its ids come from the versions of the object types imported before that are valid today.
+        return self.parse_cache.key(
+            utils.find_file('temp', self.file_bag_code, 'zip'),
+            self.tag_name,
+            self.db_fields,
+            self.database.BAG_TABLES[table_name],
+            config.active_only,
+            config.parse_geometries,
+            config.geometry_crs,
+            config.geometry_decimals,
+            config.geometry_simplify_tolerance,
+            config.use_short_street_names,
+            config.region_gemeenten,
+            config.region_bbox,
+            # A region import also depends on the object types imported before
+            utils.file_fingerprint(config.file_bag) if region_filters() else None,
+            self.today_string if config.active_only and region_filters() else None)
+
+    def set_object_type(self, tag_name):
+        # Set the XML object tag, zip file code and the fields to parse for a BAG object type
+        self.tag_name = tag_name
+
         if self.tag_name == 'Woonplaats':
             self.object_tag_name = tag_name
             self.file_bag_code = "9999WPL"
             self.data_init['geometry'] = None
             self.db_fields = {
-                'id': ('identificatie', FIND_FIELD),
+                'id': ('identificatie', FIND_FIELD, TYPE_INTEGER),
+                'voorkomen_id': ('voorkomenidentificatie', FIND_FIELD, TYPE_INTEGER),
                 'naam': ('naam', FIND_FIELD),
-                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD),
-                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD),
+                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD, TYPE_DATE),
+                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD, TYPE_DATE),
                 'status': ('status', FIND_FIELD),
             }
             if config.parse_geometries:
@@ -267,25 +688,26 @@ class BagParser:
             self.object_tag_name = tag_name
             self.file_bag_code = "GEM-WPL-RELATIE"
             self.db_fields = {
-                'begindatum_geldigheid': ('begindatumTijdvakGeldigheid', FIND_FIELD),
-                'einddatum_geldigheid': ('einddatumTijdvakGeldigheid', FIND_FIELD),
+                'begindatum_geldigheid': ('begindatumTijdvakGeldigheid', FIND_FIELD, TYPE_DATE),
+                'einddatum_geldigheid': ('einddatumTijdvakGeldigheid', FIND_FIELD, TYPE_DATE),
                 'status': ('status', FIND_FIELD),
-                'woonplaats_id': (['gerelateerdeWoonplaats', 'identificatie'], FIND_NESTED_FIELD),
-                'gemeente_id': (['gerelateerdeGemeente', 'identificatie'], FIND_NESTED_FIELD),
+                'woonplaats_id': (['gerelateerdeWoonplaats', 'identificatie'], FIND_NESTED_FIELD, TYPE_INTEGER),
+                'gemeente_id': (['gerelateerdeGemeente', 'identificatie'], FIND_NESTED_FIELD, TYPE_INTEGER),
             }
 
         elif self.tag_name == 'OpenbareRuimte':
             self.object_tag_name = tag_name
             self.file_bag_code = "9999OPR"
             self.db_fields = {
-                'id': ('identificatie', FIND_FIELD),
+                'id': ('identificatie', FIND_FIELD, TYPE_INTEGER),
+                'voorkomen_id': ('voorkomenidentificatie', FIND_FIELD, TYPE_INTEGER),
                 'naam': ('naam', FIND_FIELD),
                 'type': ('type', FIND_FIELD),
                 'inactief': ('aanduidingRecordInactief', FIND_FIELD),
-                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD),
-                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD),
+                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD, TYPE_DATE),
+                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD, TYPE_DATE),
                 'status': ('status', FIND_FIELD),
-                'woonplaats_id': ('WoonplaatsRef', FIND_FIELD),
+                'woonplaats_id': ('WoonplaatsRef', FIND_FIELD, TYPE_INTEGER),
                 'verkorte_naam': (['verkorteNaam', 'VerkorteNaamOpenbareRuimte', 'verkorteNaam'], FIND_NESTED_FIELD),
             }
         elif self.tag_name == 'Nummeraanduiding':
@@ -293,26 +715,31 @@ class BagParser:
             self.file_bag_code = "9999NUM"
             self.db_fields = {
                 'id': ('identificatie', FIND_FIELD),
+                'voorkomen_id': ('voorkomenidentificatie', FIND_FIELD, TYPE_INTEGER),
                 'postcode': ('postcode', FIND_FIELD),
-                'huisnummer': ('huisnummer', FIND_FIELD),
+                'huisnummer': ('huisnummer', FIND_FIELD, TYPE_INTEGER),
                 'huisletter': ('huisletter', FIND_FIELD),
                 'toevoeging': ('huisnummertoevoeging', FIND_FIELD),
-                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD),
-                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD),
+                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD, TYPE_DATE),
+                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD, TYPE_DATE),
                 'status': ('status', FIND_FIELD),
-                'openbare_ruimte_id': ('OpenbareRuimteRef', FIND_FIELD),
-                'woonplaats_id': ('WoonplaatsRef', FIND_FIELD),
+                'openbare_ruimte_id': ('OpenbareRuimteRef', FIND_FIELD, TYPE_INTEGER),
+                'woonplaats_id': ('WoonplaatsRef', FIND_FIELD, TYPE_INTEGER),
             }
 
         elif self.tag_name == 'Pand':
             self.object_tag_name = tag_name
             self.file_bag_code = "9999PND"
             self.data_init['geometry'] = None
+            # Footprint of the pand, computed from the geometry (parse_geometries)
+            for field in ['oppervlakte', 'rd_x', 'rd_y', 'rd_xmin', 'rd_ymin', 'rd_xmax', 'rd_ymax']:
+                self.data_init[field] = None
             self.db_fields = {
                 'id': ('identificatie', FIND_FIELD),
-                'bouwjaar': ('oorspronkelijkBouwjaar', FIND_FIELD),
-                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD),
-                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD),
+                'voorkomen_id': ('voorkomenidentificatie', FIND_FIELD, TYPE_INTEGER),
+                'bouwjaar': ('oorspronkelijkBouwjaar', FIND_FIELD, TYPE_INTEGER),
+                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD, TYPE_DATE),
+                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD, TYPE_DATE),
                 'status': ('status', FIND_FIELD),
             }
             if config.parse_geometries:
@@ -323,11 +750,12 @@ class BagParser:
             self.file_bag_code = "9999VBO"
             self.db_fields = {
                 'id': ('identificatie', FIND_FIELD),
-                'oppervlakte': ('oppervlakte', FIND_FIELD),
+                'voorkomen_id': ('voorkomenidentificatie', FIND_FIELD, TYPE_INTEGER),
+                'oppervlakte': ('oppervlakte', FIND_FIELD, TYPE_DOUBLE),
                 'gebruiksdoel': ('gebruiksdoel', FIND_FIELD_MULTI),
                 'pos': ('pos', FIND_FIELD),
-                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD),
-                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD),
+                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD, TYPE_DATE),
+                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD, TYPE_DATE),
                 'status': ('status', FIND_FIELD),
                 'pand_id': ('PandRef', FIND_FIELD_MULTI),
                 'nummer_id': (['heeftAlsHoofdadres', 'NummeraanduidingRef'], FIND_NESTED_FIELD),
@@ -344,10 +772,11 @@ class BagParser:
             self.data_init['longitude'] = None
             self.db_fields = {
                 'id': ('identificatie', FIND_FIELD),
+                'voorkomen_id': ('voorkomenidentificatie', FIND_FIELD, TYPE_INTEGER),
                 'geometry': ('posList', FIND_FIELD),
                 'inactief': ('aanduidingRecordInactief', FIND_FIELD),
-                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD),
-                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD),
+                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD, TYPE_DATE),
+                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD, TYPE_DATE),
                 'status': ('status', FIND_FIELD),
                 'nummer_id': (['heeftAlsHoofdadres', 'NummeraanduidingRef'], FIND_NESTED_FIELD),
             }
@@ -364,106 +793,240 @@ class BagParser:
 
             self.db_fields = {
                 'id': ('identificatie', FIND_FIELD),
+                'voorkomen_id': ('voorkomenidentificatie', FIND_FIELD, TYPE_INTEGER),
                 'geometry': ('posList', FIND_FIELD),
                 'inactief': ('aanduidingRecordInactief', FIND_FIELD),
-                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD),
-                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD),
+                'begindatum_geldigheid': ('beginGeldigheid', FIND_FIELD, TYPE_DATE),
+                'einddatum_geldigheid': ('eindGeldigheid', FIND_FIELD, TYPE_DATE),
                 'status': ('status', FIND_FIELD),
                 'nummer_id': (['heeftAlsHoofdadres', 'NummeraanduidingRef'], FIND_NESTED_FIELD),
             }
         else:
             raise Exception("Tag name not found")
 
-        utils.print_log(f'start: parse {self.tag_name}')
-
-        self.__unzip_xml()
-
-        utils.print_log('convert XML files to DuckDB')
-        self.__parse_xml_files()
-
-        time_elapsed = utils.time_elapsed(self.start_time)
-        utils.print_log(f'ready: parse XML {self.tag_name} | {time_elapsed} '
-                        f'| XML nodes: {self.count_xml_tags:,d}')
-
-        utils.empty_folder(self.folder_temp_xml)
-
     def __unzip_xml(self):
         utils.empty_folder(self.folder_temp_xml)
 
         file_zip = utils.find_file('temp', self.file_bag_code, 'zip')
 
         utils.print_log('unzip ' + file_zip)
-        utils.unzip_files_multithreaded(file_zip, self.folder_temp_xml)
+        workers_count = self.__tuned_setting('workers_count', config.cpu_cores_used)
+        utils.unzip_files_multithreaded(file_zip, self.folder_temp_xml, workers_count, self.worker_pool(workers_count))
+
+    def __tuned_setting(self, name, default):
+        # Settings measured by import_bag.py --autotune on this computer, if any
+        return self.tuned_settings.get(self.tag_name, {}).get(name, default)
+
+    def worker_pool(self, workers_count):
+        # One pool for all object types. Only replaced if another worker count is needed (see autotune.py).
+        if self.pool and self.pool_workers_count == workers_count:
+            return self.pool
+
+        self.close()
+        start_time = time.perf_counter()
+        with utils.metrics.span('worker_pool_start'):
+            self.pool = ProcessPoolExecutor(workers_count, initializer=init_parse_worker, initargs=(self.field_specs,))
+            # Start all workers now, otherwise the first jobs pay for it. A short job for each worker makes sure
+            # every worker process has started and run the initializer.
+            list(self.pool.map(time.sleep, [0.01] * workers_count))
+        self.pool_workers_count = workers_count
+        self.pools_started += 1
+        self.pools_start_seconds += time.perf_counter() - start_time
+        return self.pool
+
+    def close(self):
+        # Stop the worker processes
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+            self.pool_workers_count = None
+
+    def log_worker_startup(self):
+        if self.pools_started:
+            utils.print_log(f"worker processen: {self.pools_started} pool(s) gestart | "
+                            f"opstarttijd: {utils.time_text(self.pools_start_seconds)}")
 
     def __parse_xml_files(self):
+        save_function = self.save_function()
 
         post_sql = None
         match self.tag_name:
-            case 'Woonplaats':
-                save_function = self.database.save_woonplaats
-            case 'GemeenteWoonplaatsRelatie':
-                save_function = self.database.save_gemeente_woonplaats
             case 'OpenbareRuimte':
-                save_function = self.database.save_openbare_ruimte
                 if config.use_short_street_names:
                     post_sql = 'UPDATE openbare_ruimten SET naam=verkorte_naam WHERE verkorte_naam is not NULL'
-            case 'Nummeraanduiding':
-                save_function = self.database.save_nummer
-            case 'Pand':
-                save_function = self.database.save_pand
             case 'Verblijfsobject':
-                save_function = self.database.save_verblijfsobject
                 post_sql = "UPDATE verblijfsobjecten SET lon_lat=st_point(longitude, latitude) WHERE longitude is not NULL and latitude is not NULL"
             case 'Ligplaats':
-                save_function = self.database.save_ligplaats
                 post_sql = "UPDATE ligplaatsen SET lon_lat=st_point(longitude, latitude) WHERE longitude is not NULL and latitude is not NULL"
             case 'Standplaats':
-                save_function = self.database.save_standplaats
                 post_sql = "UPDATE standplaatsen SET lon_lat=st_point(longitude, latitude) WHERE longitude is not NULL and latitude is not NULL"
+
+        xml_files = utils.find_xml_files(self.folder_temp_xml, self.file_bag_code)
+
+        self.region = self.region_filter()
+        self.parse_xml_files(xml_files, save_function,
+                             self.__tuned_setting('workers_count', config.cpu_cores_used),
+                             self.__tuned_setting('insert_batch_files', config.insert_batch_files))
+        self.region = None
+
+        if post_sql:
+            utils.print_log(f"Post processing {self.tag_name}")
+            with utils.metrics.span('post_sql', object_type=self.tag_name):
+                self.database.post_process(post_sql)
+
+    def region_filter(self):
+        # (field, ids file, bbox) of a region import for the workers, None for an import of the whole BAG
+        filters = region_filters()
+        if not filters:
+            return None
+
+        region = filters[self.tag_name]
+        if region == 'bbox':
+            utils.print_log(f"regio: {self.tag_name} in bbox {config.region_bbox}")
+            return None, None, tuple(config.region_bbox)
+
+        if region == 'gemeenten':
+            field, ids = 'gemeente_id', set(config.region_gemeenten)
+        else:
+            field, sql = region
+            ids = {row[0] for row in self.database.fetchall(sql)}
+        file_ids = os.path.join(self.folder_temp_xml, f"region_{self.tag_name}.pickle")
+        with open(file_ids, 'wb') as file:
+            pickle.dump(ids, file)
+        utils.print_log(f"regio: {self.tag_name} met {field} in {len(ids):,d} ids")
+        return field, file_ids, None
+
+    def save_function(self):
+        match self.tag_name:
+            case 'Woonplaats':
+                return self.database.save_woonplaats
+            case 'GemeenteWoonplaatsRelatie':
+                return self.database.save_gemeente_woonplaats
+            case 'OpenbareRuimte':
+                return self.database.save_openbare_ruimte
+            case 'Nummeraanduiding':
+                return self.database.save_nummer
+            case 'Pand':
+                return self.database.save_pand
+            case 'Verblijfsobject':
+                return self.database.save_verblijfsobject
+            case 'Ligplaats':
+                return self.database.save_ligplaats
+            case 'Standplaats':
+                return self.database.save_standplaats
             case _:
                 raise Exception(f'No save function found for tag_name "{self.tag_name}"')
 
-        xml_files = utils.find_xml_files(self.folder_temp_xml, self.file_bag_code)
+    def parse_xml_files(self, xml_files, save_function, workers_count, insert_batch_files=1):
+        # Parse the XML files in worker processes (one XML file per job) and save the results of every
+        # insert_batch_files XML files at once
+        # Largest files first, so no worker is still busy with a big file at the end while the others are idle
+        file_sizes = {file_xml: os.path.getsize(file_xml) for file_xml in xml_files}
+        xml_files = sorted(xml_files, key=file_sizes.get, reverse=True)
+
         files_total = len(xml_files)
         self.total_xml_files = files_total
         self.count_xml_files = 0
+        self.count_xml_tags = 0
+        self.total_xml_bytes = sum(file_sizes.values())
+        self.count_xml_bytes = 0
 
         self.start_time = time.perf_counter()
 
-        workers_count = config.cpu_cores_used
-
         futures = []
-        # Multi-threading and batch
-        # use ceil instead of round to prevent zero batch size
-        batch_size = math.ceil(files_total / workers_count)
+        worker_jobs = []
 
-        # Multi-threading. One XML file per executor.
-        pool = ProcessPoolExecutor(workers_count)
+        # Multi-processing. One XML file per job.
+        pool = self.worker_pool(workers_count)
         for file_xml in xml_files:
-            future = pool.submit(
-                parse_xml_file,
-                file_xml,
-                self.tag_name,
-                self.data_init,
-                self.object_tag_name,
-                self.db_fields)
-            futures.append(future)
-
-        for future in futures:
-            result = future.result()
+            futures.append(pool.submit(parse_xml_job, file_xml, self.tag_name, self.region, self.filter_dates))
+
+        rows = []
+        files_in_batch = 0
+        coordinates_cache_hits = 0
+        coordinates_cache_misses = 0
+        invalid_values = {}
+        for file_xml, future in zip(xml_files, futures):
+            # Waiting time for the workers: parsing and transferring the results to this process
+            with utils.metrics.span('result_wait', object_type=self.tag_name):
+                result = future.result()
             count_file_xml = result['count']
-
-            save_function(result['data'])
+            utils.metrics.add_time('xml_parse_worker', result['seconds'], object_type=self.tag_name)
+            worker_jobs.append((result['pid'], result['start'], result['end']))
+
+            rows.extend(result['data'])
+            files_in_batch += 1
+            if files_in_batch >= insert_batch_files:
+                with utils.metrics.span('insert', object_type=self.tag_name):
+                    save_function(rows)
+                rows = []
+                files_in_batch = 0
+
+            utils.metrics.count('xml_files', object_type=self.tag_name)
+            utils.metrics.count('bytes_read', file_sizes[file_xml], object_type=self.tag_name)
+            utils.metrics.count('objects_parsed', count_file_xml, object_type=self.tag_name)
+            utils.metrics.count('rows_inserted', len(result['data']), object_type=self.tag_name)
+            coordinates_cache_hits += result['coordinates_cache_hits']
+            coordinates_cache_misses += result['coordinates_cache_misses']
+            if result['coordinates_cache_misses']:
+                utils.metrics.count('coordinates_cache_hits', result['coordinates_cache_hits'],
+                                    object_type=self.tag_name)
+                utils.metrics.count('coordinates_cache_misses', result['coordinates_cache_misses'],
+                                    object_type=self.tag_name)
+            for db_field, count in result['invalid_values'].items():
+                invalid_values[db_field] = invalid_values.get(db_field, 0) + count
+                utils.metrics.count('invalid_values', count, object_type=self.tag_name, field=db_field)
 
             self.count_xml_files += 1
             self.count_xml_tags += count_file_xml
+            self.count_xml_bytes += file_sizes[file_xml]
             self.__update_xml_status()
 
+        if files_in_batch:
+            with utils.metrics.span('insert', object_type=self.tag_name):
+                save_function(rows)
+
         wait(futures)
         self.__update_xml_status(True)
-        if post_sql:
-            utils.print_log(f"Post processing {self.tag_name}")
-            self.database.post_process(post_sql)
+        utils.print_log_repeated_summary()
+        self.__log_coordinates_cache(coordinates_cache_hits, coordinates_cache_misses)
+        self.__log_invalid_values(invalid_values)
+        self.__log_worker_idle_time(worker_jobs, workers_count)
+
+    def __log_coordinates_cache(self, hits, misses):
+        if misses:
+            utils.print_log(f"coordinaten cache {self.tag_name} | hits: {hits:,d} | "
+                            f"omgerekend: {misses:,d} | hit rate: {100 * hits / (hits + misses):.0f}%")
+
+    def __log_invalid_values(self, invalid_values):
+        # Values that could not be converted to the type of their field, saved as NULL
+        if invalid_values:
+            utils.print_log(f"ongeldige waarden {self.tag_name} | " +
+                            " | ".join(f"{db_field}: {count:,d}" for db_field, count in sorted(invalid_values.items())),
+                            error=True)
+
+    def __log_worker_idle_time(self, worker_jobs, workers_count):
+        # Idle time: the time the workers were not parsing between the start of the first job and the end of the
+        # last one. Tail: the time between the first worker running out of jobs and the last job being ready.
+        if not worker_jobs:
+            return
+
+        first_start = min(start for _, start, _ in worker_jobs)
+        last_end = max(end for _, _, end in worker_jobs)
+        busy = sum(end - start for _, start, end in worker_jobs)
+        workers_last_end = {}
+        for pid, _, end in worker_jobs:
+            workers_last_end[pid] = max(end, workers_last_end.get(pid, end))
+
+        total = workers_count * (last_end - first_start)
+        idle = max(0.0, total - busy)
+        # A worker that got no job at all was idle from the start
+        tail = last_end - (min(workers_last_end.values()) if len(workers_last_end) == workers_count else first_start)
+
+        utils.metrics.add_time('worker_idle', idle, object_type=self.tag_name)
+        utils.metrics.add_time('worker_tail', tail, object_type=self.tag_name)
+        utils.print_log(f"workers {self.tag_name} | niet actief: {utils.time_text(idle)} "
+                        f"({100 * idle / total if total else 0:.0f}%) | staart: {utils.time_text(tail)}")
 
 
     def add_gemeenten_into_woonplaatsen(self):
@@ -483,4 +1046,8 @@ class BagParser:
             time_elapsed_text = utils.time_elapsed(self.start_time)
 
             bar_text = f" {time_elapsed_text} | XML nodes: {self.count_xml_tags:,d} | per second: {tags_per_second:,d}"
-            utils.print_progress_bar(self.count_xml_files, self.total_xml_files, bar_text, final)
+            # Progress and estimated time remaining are based on the bytes parsed, XML files differ in size
+            if self.count_xml_bytes and not final:
+                seconds_left = self.elapsed_time * (self.total_xml_bytes - self.count_xml_bytes) / self.count_xml_bytes
+                bar_text += f" | ETA: {utils.time_text(seconds_left)}"
+            utils.print_progress_bar(self.count_xml_bytes, self.total_xml_bytes or 1, bar_text, final)
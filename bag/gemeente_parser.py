@@ -1,20 +1,35 @@
 # Gemeente parser
 
+import os
 import time
 import utils
 import config
 import csv
+from bag.parse_cache import ParseCache
 
 
 class GemeentenParser:
+    table_names = ['gemeenten', 'provincies']
 
     def __init__(self, database):
         self.database = database
         self.start_time = None
         self.elapsed_time = None
+        self.parse_cache = ParseCache(database)
 
     def parse(self):
         utils.print_log('parse gemeenten/provincies xlsx/csv start')
         self.start_time = time.perf_counter()
+
+        cache_key = None
+        if config.use_parse_cache and os.path.exists(config.file_gemeenten):
+            cache_key = self.parse_cache.key(config.file_gemeenten, 'gemeenten')
+            if self.parse_cache.load('gemeenten', cache_key, self.table_names, create=True):
+                return
+
         self.database.create_gemeenten_provincies(config.file_gemeenten)
+
+        if cache_key and all(self.database.table_exists(table_name) for table_name in self.table_names):
+            self.parse_cache.save('gemeenten', cache_key, self.table_names)
+
         utils.print_log(f"parse gemeenten/provincies xlsx/csv ready {utils.time_elapsed(self.start_time)}")
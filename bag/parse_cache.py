@@ -0,0 +1,63 @@
+# Cache of parsed BAG tables as Parquet files
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import config
+import utils
+
+
+class ParseCache:
+    # Content-addressed cache of the tables created from one source file (e.g. the 9999WPL zip or the gemeenten
+    # xlsx). An entry is a folder '<name>-<key>' with a Parquet file per table. The key is a hash of the source
+    # file content and everything else that changes the parsed result.
+
+    def __init__(self, database, folder=None):
+        self.database = database
+        self.folder = folder or config.folder_parse_cache
+
+    @staticmethod
+    def key(file_source, *parts):
+        sha256 = hashlib.sha256(utils.file_hash(file_source).encode())
+        sha256.update(json.dumps([config.version, *parts], sort_keys=True, default=str).encode())
+        return sha256.hexdigest()[:32]
+
+    def __folder_entry(self, name, key):
+        return os.path.join(self.folder, f"{name}-{key}")
+
+    def load(self, name, key, table_names, create=False):
+        # Returns True if the tables were loaded from the cache
+        folder_entry = self.__folder_entry(name, key)
+        if not os.path.isdir(folder_entry):
+            utils.print_log(f"cache: {name} niet in cache (miss)")
+            utils.metrics.count('parse_cache_misses', object_type=name)
+            return False
+
+        start_time = time.perf_counter()
+        with utils.metrics.span('parse_cache_load', object_type=name):
+            for table_name in table_names:
+                self.database.load_table_parquet(table_name, os.path.join(folder_entry, f"{table_name}.parquet"),
+                                                 create)
+        utils.print_log(f"cache: {name} geladen uit cache (hit) {utils.time_elapsed(start_time)}")
+        utils.metrics.count('parse_cache_hits', object_type=name)
+        return True
+
+    def save(self, name, key, table_names):
+        folder_entry = self.__folder_entry(name, key)
+        folder_temp = folder_entry + '.tmp'
+        if os.path.exists(folder_temp):
+            shutil.rmtree(folder_temp)
+        os.makedirs(folder_temp)
+
+        with utils.metrics.span('parse_cache_save', object_type=name):
+            for table_name in table_names:
+                self.database.save_table_parquet(table_name, os.path.join(folder_temp, f"{table_name}.parquet"))
+
+        # Only keep the latest entry of each name
+        for folder_name in os.listdir(self.folder):
+            if folder_name.startswith(f"{name}-") and os.path.join(self.folder, folder_name) != folder_temp:
+                shutil.rmtree(os.path.join(self.folder, folder_name))
+        os.replace(folder_temp, folder_entry)
+        utils.print_log(f"cache: {name} opgeslagen in '{folder_entry}'")
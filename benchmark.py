@@ -0,0 +1,98 @@
+#! /usr/bin/env python3
+import sys
+from argparse import ArgumentParser
+
+from benchmarks import (Benchmark, ExportBenchmark, GeometryPrecisionBenchmark, HistoryBenchmark, LookupBenchmark,
+                        MicroBenchmark, ReverseGeocoderBenchmark, ScalingBenchmark, SyntheticBag, XmlEngineBenchmark)
+
+parser = ArgumentParser(description='Benchmark the BAG parser, DuckDB database and exports')
+
+helpText = "Microbenchmarks of XML parsing, coordinate conversion and saving on a synthetic BAG"
+parser.add_argument('-m', '--micro', action='store_true', help=helpText)
+
+helpText = ("Check that the lxml and scan XML engines (config.xml_engine) give identical results on a synthetic BAG "
+            "and a sample of the BAG file, and compare their throughput per object type")
+parser.add_argument('-x', '--xml-engines', action='store_true', help=helpText)
+
+helpText = ("Import synthetic BAG extracts at the given scales (default: 0.001 0.01, 1.0 is the size of the full BAG) "
+            "and report time and peak memory per phase")
+parser.add_argument('-s', '--scaling', nargs='*', type=float, metavar='SCALE', help=helpText)
+
+helpText = ("Import with parse_geometries=True at several geometry_decimals and geometry_simplify_tolerance settings "
+            "and report database size, export size and import time. Uses a synthetic BAG (--scale) or the given BAG "
+            "file, since the rectangles of the synthetic panden can not be simplified")
+parser.add_argument('-p', '--geometry-precision', nargs='?', const='', metavar='BAG_FILE', help=helpText)
+
+helpText = ("Import a synthetic BAG (--scale) in history mode (active_only=False) and time adressen_as_of snapshots "
+            "at the given dates (default: 2000-01-01 2010-01-01 2020-01-01) and today")
+parser.add_argument('-H', '--history', nargs='*', metavar='DATE', help=helpText)
+
+helpText = "Write a synthetic BAG extract zip file, to import with ./import_bag.py --bag-file"
+parser.add_argument('-g', '--generate', metavar='ZIP_FILE', help=helpText)
+
+helpText = "Scale of the generated synthetic BAG (default: 0.001, 1.0 is the size of the full BAG)"
+parser.add_argument('--scale', type=float, default=0.001, help=helpText)
+
+helpText = "Benchmark bbox queries on an exported Parquet file (default: output/adressen_all_data.parquet)"
+parser.add_argument('-e', '--export', nargs='?', const='output/adressen_all_data.parquet', help=helpText)
+
+helpText = "Time the full adressen export with joins and from the denormalized adressen_export table"
+parser.add_argument('-t', '--export-time', action='store_true', help=helpText)
+
+helpText = "Latency (p50/p99) of address lookups on postcode and huisnummer"
+parser.add_argument('-l', '--lookup', action='store_true', help=helpText)
+
+helpText = "Reverse geocoding with the adressen_grid table compared to a brute force query"
+parser.add_argument('-r', '--reverse', action='store_true', help=helpText)
+
+helpText = "Save the results with the git commit to a JSON file"
+parser.add_argument('-j', '--json', help=helpText)
+
+helpText = "Compare two JSON results files and report benchmarks that became more than 10%% slower"
+parser.add_argument('-c', '--compare', nargs=2, metavar=('BASE_JSON', 'JSON'), help=helpText)
+
+args = parser.parse_args()
+
+benchmark = None
+if args.micro:
+    benchmark = MicroBenchmark()
+    benchmark.run()
+elif args.xml_engines:
+    benchmark = XmlEngineBenchmark(args.scale)
+    benchmark.run()
+elif args.scaling is not None:
+    benchmark = ScalingBenchmark()
+    benchmark.run(args.scaling)
+elif args.geometry_precision is not None:
+    benchmark = GeometryPrecisionBenchmark()
+    benchmark.run(args.geometry_precision, args.scale)
+elif args.history is not None:
+    benchmark = HistoryBenchmark()
+    benchmark.run(args.history, args.scale)
+elif args.generate:
+    SyntheticBag(args.scale).write_zip(args.generate)
+elif args.export:
+    benchmark = ExportBenchmark()
+    benchmark.run(args.export)
+elif args.export_time:
+    benchmark = ExportBenchmark()
+    benchmark.run_export_time()
+elif args.lookup:
+    benchmark = LookupBenchmark()
+    benchmark.run()
+elif args.reverse:
+    benchmark = ReverseGeocoderBenchmark()
+    benchmark.run()
+elif args.compare:
+    # Regressions are an error, e.g. for a CI job
+    if Benchmark.compare_results(*args.compare):
+        sys.exit(1)
+else:
+    parser.print_help()
+
+if benchmark and args.json:
+    benchmark.save_results(args.json)
+
+# Differences between the XML engines are an error, e.g. for a CI job
+if args.xml_engines and benchmark.differences:
+    sys.exit(1)
@@ -0,0 +1,10 @@
+from benchmarks.benchmark import Benchmark
+from benchmarks.export_benchmark import ExportBenchmark
+from benchmarks.geometry_precision_benchmark import GeometryPrecisionBenchmark
+from benchmarks.history_benchmark import HistoryBenchmark
+from benchmarks.lookup_benchmark import LookupBenchmark
+from benchmarks.micro_benchmark import MicroBenchmark
+from benchmarks.reverse_geocoder_benchmark import ReverseGeocoderBenchmark
+from benchmarks.scaling_benchmark import ScalingBenchmark
+from benchmarks.synthetic_bag import SyntheticBag
+from benchmarks.xml_engine_benchmark import XmlEngineBenchmark
@@ -0,0 +1,113 @@
+# Timing helpers shared by the benchmarks
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+import utils
+
+
+class Benchmark:
+    repeat = 5
+
+    def __init__(self):
+        self.results = {}
+
+    def measure(self, name, function, *args, repeat=None, setup=None, **info):
+        # Run function repeat times and store best and median run time (in seconds) under name. setup is called
+        # before every run and is not timed. Extra keyword arguments are stored with the timings, e.g. row counts.
+        timings = []
+        result = None
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            start_time = time.perf_counter()
+            result = function(*args)
+            timings.append(time.perf_counter() - start_time)
+
+        self.results[name] = {
+            'best': min(timings),
+            'median': statistics.median(timings),
+            'runs': len(timings),
+            **info,
+        }
+        utils.print_log(f"benchmark: {name} | best: {min(timings):.4f}s | median: {statistics.median(timings):.4f}s")
+        return result
+
+    def measure_latency(self, name, function, calls):
+        # Time every single call of function (calls is a list of argument tuples) and store the
+        # p50, p99 and max latency (in seconds) under name.
+        latencies = []
+        for args in calls:
+            start_time = time.perf_counter()
+            function(*args)
+            latencies.append(time.perf_counter() - start_time)
+
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        self.results[name] = {
+            'p50': percentiles[49],
+            'p99': percentiles[98],
+            'max': max(latencies),
+            'calls': len(latencies),
+        }
+        utils.print_log(f"benchmark: {name} | p50: {1000 * percentiles[49]:.3f}ms | "
+                        f"p99: {1000 * percentiles[98]:.3f}ms | max: {1000 * max(latencies):.3f}ms")
+
+    @staticmethod
+    def git_commit():
+        # Short hash of the current git commit, with -dirty appended if there are uncommitted changes
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                    capture_output=True, text=True, check=True).stdout.strip()
+            changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                     capture_output=True, text=True, check=True).stdout.strip()
+            return commit + '-dirty' if changes else commit
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def save_results(self, file_json):
+        # Save the results with the git commit and system info, so results of different commits can be compared
+        folder = os.path.dirname(file_json)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with open(file_json, 'w') as file:
+            json.dump({
+                'commit': self.git_commit(),
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': multiprocessing.cpu_count(),
+                'results': self.results,
+            }, file, indent=2)
+        utils.print_log(f"benchmark resultaten opgeslagen in '{file_json}'")
+
+    @staticmethod
+    def compare_results(file_json_base, file_json, threshold=0.1):
+        # Compare two saved results files. Benchmarks that are more than threshold (fraction) slower are
+        # logged as error. Returns the number of regressions.
+        with open(file_json_base) as file:
+            base = json.load(file)
+        with open(file_json) as file:
+            new = json.load(file)
+
+        utils.print_log(f"compare benchmarks: {base['commit']} ({base['date']}) -> {new['commit']} ({new['date']})")
+        regressions = 0
+        for name, result in new['results'].items():
+            base_result = base['results'].get(name)
+            # Latency benchmarks are compared on p50, imports on their run time, the other benchmarks on the best run
+            key = next((key for key in ('best', 'p50', 'seconds') if key in result), None)
+            if not key or not base_result or not base_result.get(key):
+                continue
+
+            ratio = result[key] / base_result[key]
+            regression = ratio > 1 + threshold
+            regressions += regression
+            utils.print_log(f"{name} | {key}: {base_result[key]:.4f}s -> {result[key]:.4f}s | {ratio:.2f}x",
+                            error=regression)
+
+        return regressions
@@ -0,0 +1,95 @@
+# Benchmark bbox queries on an exported (Geo)Parquet adressen file and the export itself
+import os
+import tempfile
+
+import duckdb
+
+import utils
+from benchmarks.benchmark import Benchmark
+from exporter import Exporter
+
+# WGS84 query boxes: (xmin, ymin, xmax, ymax)
+QUERY_BOXES = {
+    'rijksmuseum': (4.8800, 52.3570, 4.8890, 52.3620),
+    'amsterdam': (4.8058, 52.2833, 5.0025, 52.4301),
+    'utrecht_provincie': (4.7900, 51.9500, 5.6200, 52.3000),
+}
+
+
+class ExportBenchmark(Benchmark):
+
+    def __init__(self):
+        super().__init__()
+        self.connection = duckdb.connect()
+        self.connection.execute("""
+            INSTALL Spatial;
+            LOAD Spatial;
+        """)
+
+    def row_groups_overlapping(self, file_parquet, box):
+        # Count the row groups whose bbox statistics overlap the box. Only these have to be read by a reader
+        # that uses the bbox covering columns, the other row groups are skipped.
+        xmin, ymin, xmax, ymax = box
+        stats = {}
+        for row_group_id, column, stats_min, stats_max in self.connection.execute(f"""
+                SELECT row_group_id, path_in_schema, stats_min, stats_max
+                FROM parquet_metadata('{file_parquet}')
+                WHERE path_in_schema IN ('bbox, xmin', 'bbox, ymin', 'bbox, xmax', 'bbox, ymax')
+                """).fetchall():
+            stats.setdefault(row_group_id, {})[column] = (float(stats_min), float(stats_max))
+
+        overlapping = 0
+        for row_group in stats.values():
+            if (row_group['bbox, xmin'][0] <= xmax and row_group['bbox, xmax'][1] >= xmin and
+                    row_group['bbox, ymin'][0] <= ymax and row_group['bbox, ymax'][1] >= ymin):
+                overlapping += 1
+
+        return overlapping, len(stats)
+
+    def query_bbox(self, file_parquet, box):
+        xmin, ymin, xmax, ymax = box
+        return self.connection.execute(f"""
+            SELECT COUNT(*) FROM read_parquet('{file_parquet}')
+            WHERE bbox.xmin <= {xmax} AND bbox.xmax >= {xmin}
+              AND bbox.ymin <= {ymax} AND bbox.ymax >= {ymin}
+            """).fetchone()[0]
+
+    def query_geometry(self, file_parquet, box):
+        xmin, ymin, xmax, ymax = box
+        return self.connection.execute(f"""
+            SELECT COUNT(*) FROM read_parquet('{file_parquet}')
+            WHERE ST_Intersects(lon_lat, ST_MakeEnvelope({xmin}, {ymin}, {xmax}, {ymax}))
+            """).fetchone()[0]
+
+    def run(self, file_parquet):
+        utils.print_log(f"start: benchmark bbox queries op '{file_parquet}'")
+
+        for name, box in QUERY_BOXES.items():
+            overlapping, total = self.row_groups_overlapping(file_parquet, box)
+            count = self.measure(f"export {name} bbox", self.query_bbox, file_parquet, box,
+                                 row_groups_read=overlapping, row_groups_total=total)
+            self.measure(f"export {name} st_intersects", self.query_geometry, file_parquet, box)
+            utils.print_log(f"benchmark: export {name} | adressen: {count:n} | "
+                            f"row groups gelezen: {overlapping:n}/{total:n}")
+
+        return self.results
+
+    def run_export_time(self, export_options="(FORMAT parquet)", extension='parquet'):
+        # Time the full adressen export (-a) with joins on the lookup tables and from the denormalized
+        # adressen_export table (if present in the database).
+        exporter = Exporter()
+        with tempfile.TemporaryDirectory() as folder:
+            output_filename = os.path.join(folder, f'adressen.{extension}')
+
+            exporter.use_adressen_export = False
+            self.measure("export adressen joins", exporter.export, output_filename, export_options, repeat=3)
+
+            if exporter.database.table_exists('adressen_export'):
+                exporter.use_adressen_export = True
+                self.measure("export adressen_export", exporter.export, output_filename, export_options, repeat=3)
+            else:
+                utils.print_log("DuckDB database bevat geen adressen_export tabel. "
+                                "Zet create_adressen_export_table in config.py aan.", True)
+
+        exporter.database.close()
+        return self.results
@@ -0,0 +1,59 @@
+# Database size, export size and import time with parse_geometries=True for the geometry precision settings
+# (geometry_decimals and geometry_simplify_tolerance in config.py)
+import os
+import tempfile
+import time
+
+import config
+import utils
+from benchmarks.scaling_benchmark import ScalingBenchmark
+from benchmarks.synthetic_bag import SyntheticBag
+from exporter import Exporter
+
+
+class GeometryPrecisionBenchmark(ScalingBenchmark):
+    # (geometry_decimals, geometry_simplify_tolerance in metres)
+    settings = [(None, 0), (7, 0), (6, 0), (7, 0.1), (7, 0.5)]
+
+    def run(self, file_bag=None, scale=0.001):
+        # The synthetic panden are rectangles, which can not be simplified. Use a BAG file to measure simplification.
+        with tempfile.TemporaryDirectory() as folder:
+            if not file_bag:
+                file_bag = SyntheticBag(scale).write_zip(os.path.join(folder, 'lvbag-extract-nl.zip'))
+
+            for geometry_decimals, geometry_simplify_tolerance in self.settings:
+                name = (f"geometrie {'volledig' if geometry_decimals is None else geometry_decimals} decimalen | "
+                        f"vereenvoudiging {geometry_simplify_tolerance} m")
+                folder_import = os.path.join(folder, f"{geometry_decimals}_{geometry_simplify_tolerance}")
+                os.makedirs(folder_import)
+                self.run_import(name, file_bag, folder_import, {
+                    'parse_geometries': True,
+                    'geometry_decimals': geometry_decimals,
+                    'geometry_simplify_tolerance': geometry_simplify_tolerance,
+                })
+                result = self.results[f"import {name}"]
+                if result['returncode'] != 0:
+                    continue
+                result['export_mb'], result['export_seconds'] = self.export_size(folder_import)
+                utils.print_log(f"benchmark: {name} | import: {result['seconds']:.1f}s | database: "
+                                f"{result['db_mb']:.1f} MB | export: {result['export_mb'] or 0:.1f} MB")
+
+        return self.results
+
+    @staticmethod
+    def export_size(folder):
+        # Size and time of the export with geometries (export.py -ag) of the database in folder
+        file_db = os.path.join(folder, 'bag.duckdb')
+        file_export = os.path.join(folder, 'adressen_all_data_geometry.parquet')
+        file_db_duckdb = config.file_db_duckdb
+        config.file_db_duckdb = file_db
+        try:
+            start_time = time.perf_counter()
+            exporter = Exporter()
+            exporter.export(file_export, "(FORMAT parquet)", True)
+            exporter.database.close()
+            seconds = time.perf_counter() - start_time
+        finally:
+            config.file_db_duckdb = file_db_duckdb
+
+        return os.path.getsize(file_export) / 1e6, seconds
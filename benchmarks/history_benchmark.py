@@ -0,0 +1,39 @@
+# Import of a synthetic BAG in history mode (active_only = False) and the time per adressen_as_of snapshot
+import os
+import tempfile
+
+import utils
+from benchmarks.scaling_benchmark import ScalingBenchmark
+from benchmarks.synthetic_bag import SyntheticBag
+from database_duckdb import DatabaseDuckdb
+
+
+class HistoryBenchmark(ScalingBenchmark):
+    dates = ['2000-01-01', '2010-01-01', '2020-01-01']
+    repeat = 3
+
+    def run(self, dates=None, scale=0.001):
+        dates = (dates or self.dates) + [utils.bag_date_today()]
+        with tempfile.TemporaryDirectory() as folder:
+            synthetic_bag = SyntheticBag(scale)
+            file_bag = synthetic_bag.write_zip(os.path.join(folder, 'lvbag-extract-nl.zip'))
+            self.run_import(f"{scale} historie", file_bag, folder, {'active_only': False})
+            if self.results[f"import {scale} historie"]['returncode'] != 0:
+                return self.results
+
+            database = DatabaseDuckdb(file_db=os.path.join(folder, 'bag.duckdb'))
+            for peildatum in dates:
+                count = self.measure(f"adressen_as_of {peildatum}", self.snapshot, database, peildatum)
+                self.results[f"adressen_as_of {peildatum}"]['adressen'] = count
+                utils.print_log(f"benchmark: adressen_as_of {peildatum} | adressen: {count:n} | "
+                                f"{self.results[f'adressen_as_of {peildatum}']['best']:.3f}s")
+            database.close()
+
+        return self.results
+
+    @staticmethod
+    def snapshot(database, peildatum):
+        # Materialized, so all columns are computed
+        database.connection.execute(
+            f"CREATE OR REPLACE TEMP TABLE adressen_snapshot AS SELECT * FROM adressen_as_of('{peildatum}')")
+        return database.fetchone("SELECT COUNT(*) FROM adressen_snapshot")
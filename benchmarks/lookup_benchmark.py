@@ -0,0 +1,29 @@
+# Benchmark address lookups with geocoder.BagLookup
+import utils
+from benchmarks.benchmark import Benchmark
+from geocoder import BagLookup
+
+
+class LookupBenchmark(Benchmark):
+
+    def __init__(self):
+        super().__init__()
+        self.bag_lookup = BagLookup()
+
+    def run(self, sample_size=10000):
+        addresses = self.bag_lookup.cursor.execute(f"""
+            SELECT postcode, huisnummer, toevoeging FROM adressen_lookup USING SAMPLE {sample_size} ROWS
+            """).fetchall()
+        utils.print_log(f"start: benchmark lookups van {len(addresses):n} adressen")
+
+        self.bag_lookup.cache_clear()
+        self.measure_latency("lookup", self.bag_lookup.lookup, addresses)
+        self.measure_latency("lookup cached", self.bag_lookup.lookup, addresses)
+
+        self.bag_lookup.cache_clear()
+        self.measure("lookup_many", self.bag_lookup.lookup_many, addresses, repeat=1, addresses=len(addresses))
+        per_address = self.results['lookup_many']['best'] / len(addresses)
+        utils.print_log(f"benchmark: lookup_many | per adres: {1000 * per_address:.4f}ms")
+
+        utils.print_log(f"benchmark: lookup cache | {self.bag_lookup.cache_info()}")
+        return self.results
@@ -0,0 +1,132 @@
+# Microbenchmarks of the hot paths of the import: XML parsing, coordinate conversion and saving to DuckDB.
+# The input is a small synthetic BAG generated from a fixed seed, so results of different commits can be compared.
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import polars as pl
+from lxml import etree
+
+import config
+import utils
+from bag import rijksdriehoek
+from bag.bag_parser import BagParser, parse_xml_file, add_coordinates, init_parse_worker, OBJECT_TYPE_TABLES
+from benchmarks.benchmark import Benchmark
+from benchmarks.synthetic_bag import SyntheticBag, OBJECT_TYPES
+from database_duckdb import DatabaseDuckdb
+
+SAVE_FUNCTIONS = {
+    'Woonplaats': 'save_woonplaats',
+    'GemeenteWoonplaatsRelatie': 'save_gemeente_woonplaats',
+    'OpenbareRuimte': 'save_openbare_ruimte',
+    'Nummeraanduiding': 'save_nummer',
+    'Pand': 'save_pand',
+    'Verblijfsobject': 'save_verblijfsobject',
+    'Ligplaats': 'save_ligplaats',
+    'Standplaats': 'save_standplaats',
+}
+
+
+class MicroBenchmark(Benchmark):
+
+    def __init__(self, scale=0.0005, seed=1):
+        super().__init__()
+        self.scale = scale
+        self.seed = seed
+
+    def run(self):
+        utils.print_log(f"start: microbenchmarks | synthetische BAG schaal {self.scale} | seed {self.seed}")
+        synthetic_bag = SyntheticBag(self.scale, self.seed)
+
+        with tempfile.TemporaryDirectory() as folder:
+            database = DatabaseDuckdb(file_db=os.path.join(folder, 'micro_benchmark.duckdb'))
+            database.create_bag_tables()
+            parser = BagParser(database)
+
+            for object_type in OBJECT_TYPES:
+                file_xml = synthetic_bag.write_xml_files(object_type, folder, objects_per_file=10**9)[0]
+                objects = len(synthetic_bag.objects[object_type])
+
+                parser.set_object_type(object_type)
+                result = self.measure(f"parse_xml_file {object_type}", parse_xml_file, file_xml, object_type,
+                                      parser.data_init, parser.object_tag_name, parser.db_fields, objects=objects)
+
+                table_name = OBJECT_TYPE_TABLES[object_type]
+                # DataFrame with the schema of the table, compared to inferring the types from all rows
+                self.measure(f"dataframe {table_name} type inferentie", pl.from_dicts, result['data'],
+                             infer_schema_length=None, objects=objects)
+                self.measure(f"dataframe {table_name}", database.dataframe, table_name, result['data'],
+                             objects=objects)
+                # Every run inserts into an empty table, like the import, instead of replacing the rows of the
+                # previous run
+                save_function = getattr(database, SAVE_FUNCTIONS[object_type])
+                self.measure(f"{SAVE_FUNCTIONS[object_type]}", save_function, result['data'], objects=objects,
+                             setup=lambda: database.create_bag_table(table_name))
+
+                if object_type == 'Pand':
+                    geometries = [pos_list.text for pos_list in etree.parse(file_xml).iter('{*}posList')]
+                    self.parse_geometries(parser, file_xml, objects)
+                elif object_type == 'Verblijfsobject':
+                    rows = result['data']
+
+            database.close()
+
+        points = [(row['rd_x'], row['rd_y']) for row in rows]
+        self.measure("rijksdriehoek_to_wgs84", self.rijksdriehoek_to_wgs84, points, objects=len(points))
+        self.measure("bag_geometry_to_wgs_geojson", self.geometry_to_wgs_geojson, geometries,
+                     objects=len(geometries))
+        coordinates_cache_size = config.coordinates_cache_size
+        config.coordinates_cache_size = 0
+        self.measure("bag_geometry_to_wgs_geojson zonder cache", self.geometry_to_wgs_geojson, geometries,
+                     objects=len(geometries))
+        config.coordinates_cache_size = coordinates_cache_size
+        self.measure("add_coordinates", add_coordinates, rows, 'pos', objects=len(rows))
+
+        # Starting a pool of worker processes, saved for every object type since the pool is reused
+        workers_count = config.cpu_cores_used
+        self.measure("worker_pool_start", self.worker_pool_start, workers_count, repeat=3, objects=workers_count)
+
+        for name, result in self.results.items():
+            utils.print_log(f"benchmark: {name} | per seconde: {result['objects'] / result['best']:,.0f}")
+
+        return self.results
+
+    @staticmethod
+    def worker_pool_start(workers_count):
+        with ProcessPoolExecutor(workers_count, initializer=init_parse_worker, initargs=({},)) as pool:
+            list(pool.map(time.sleep, [0.01] * workers_count))
+
+    def parse_geometries(self, parser, file_xml, objects):
+        # Parsing panden with parse_geometries=True, with and without the coordinates cache and in RD coordinates
+        def parse():
+            utils.coordinates_cache.clear()
+            return parse_xml_file(file_xml, 'Pand', parser.data_init, parser.object_tag_name, parser.db_fields)
+
+        parse_geometries = config.parse_geometries
+        coordinates_cache_size = config.coordinates_cache_size
+        geometry_crs = config.geometry_crs
+        config.parse_geometries = True
+        # The geometry field is only parsed with parse_geometries=True
+        parser.set_object_type('Pand')
+        self.measure("parse_xml_file Pand geometrie", parse, objects=objects)
+        config.coordinates_cache_size = 0
+        self.measure("parse_xml_file Pand geometrie zonder cache", parse, objects=objects)
+        config.coordinates_cache_size = coordinates_cache_size
+        config.geometry_crs = 'RD'
+        self.measure("parse_xml_file Pand geometrie RD", parse, objects=objects)
+        config.geometry_crs = geometry_crs
+        config.parse_geometries = parse_geometries
+        parser.set_object_type('Pand')
+
+    @staticmethod
+    def rijksdriehoek_to_wgs84(points):
+        for x, y in points:
+            rijksdriehoek.rijksdriehoek_to_wgs84(x, y)
+
+    @staticmethod
+    def geometry_to_wgs_geojson(geometries):
+        # Every run starts with an empty coordinates cache
+        utils.coordinates_cache.clear()
+        for geometry in geometries:
+            utils.bag_geometry_to_wgs_geojson(geometry, 3)
@@ -0,0 +1,50 @@
+# Benchmark reverse geocoding with geocoder.ReverseGeocoder against a brute force query on adressen
+import utils
+from benchmarks.benchmark import Benchmark
+from geocoder import ReverseGeocoder
+
+
+class ReverseGeocoderBenchmark(Benchmark):
+
+    def __init__(self):
+        super().__init__()
+        self.reverse_geocoder = ReverseGeocoder()
+        self.cursor = self.reverse_geocoder.cursor
+
+    def nearest_brute_force(self, x, y):
+        return self.cursor.execute("""
+            SELECT nummer_id, sqrt((rd_x - $x) ^ 2 + (rd_y - $y) ^ 2) AS afstand
+            FROM adressen
+            WHERE rd_x IS NOT NULL AND hoofd_nummer_id IS NULL
+            ORDER BY afstand
+            LIMIT 1
+            """, {'x': x, 'y': y}).fetchone()
+
+    def run(self, sample_size=100, batch_size=100000):
+        # Points near existing addresses: RD coordinates of a sample of addresses, moved up to 100 meters
+        points = self.cursor.execute(f"""
+            SELECT rd_x + 200 * (random() - 0.5), rd_y + 200 * (random() - 0.5)
+            FROM adressen_grid USING SAMPLE {batch_size} ROWS
+            """).fetchall()
+        utils.print_log(f"start: benchmark reverse geocoding | punten: {sample_size:n} enkel, {len(points):n} batch")
+
+        sample = points[:sample_size]
+        self.measure_latency("reverse geocode brute force", self.nearest_brute_force, sample)
+        self.measure_latency("reverse geocode grid", self.reverse_geocoder.nearest_rd, sample)
+
+        # Check that the grid finds an address at the same distance as the brute force query
+        differences = 0
+        for x, y in sample:
+            brute_force = self.nearest_brute_force(x, y)
+            grid = self.reverse_geocoder.nearest_rd(x, y)
+            if grid is None or abs(grid['afstand'] - brute_force[1]) > 0.001:
+                differences += 1
+        utils.print_log(f"benchmark: reverse geocode grid | verschillen met brute force: {differences}",
+                        differences > 0)
+
+        self.measure("reverse geocode grid batch", self.reverse_geocoder.nearest_many_rd, points,
+                     repeat=1, points=len(points))
+        per_second = len(points) / self.results['reverse geocode grid batch']['best']
+        utils.print_log(f"benchmark: reverse geocode grid batch | punten per seconde: {per_second:,.0f}")
+
+        return self.results
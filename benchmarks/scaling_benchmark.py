@@ -0,0 +1,145 @@
+# End-to-end imports of synthetic BAG extracts at different scales, with run time and peak memory per phase
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+
+import utils
+from benchmarks.benchmark import Benchmark
+from benchmarks.synthetic_bag import SyntheticBag
+
+FOLDER_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOG_LINE = re.compile(r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d+ (.*)$')
+
+# Log messages of import_bag.py that start a new phase
+PHASES = [
+    (re.compile(r'^unzip BAG file'), 'unzip'),
+    (re.compile(r'^create BAG DuckDB database structure'), 'create tables'),
+    (re.compile(r'^parse gemeenten'), 'gemeenten'),
+    (re.compile(r'^start: parse (\w+)$'), 'parse {0}'),
+    (re.compile(r'^create adressen tabel'), 'adressen'),
+    (re.compile(r'^fix: '), 'adressen fixes'),
+    (re.compile(r'^start: tests'), 'tests'),
+    (re.compile(r'^create (adressen_\w+) tabel'), '{0}'),
+    (re.compile(r'^delete no longer needed'), 'delete tables'),
+    (re.compile(r'^cleaning up'), 'cleanup'),
+]
+
+
+class ScalingBenchmark(Benchmark):
+    scales = [0.001, 0.01]
+    # Seconds between memory samples
+    sample_interval = 0.05
+
+    def run(self, scales=None):
+        for scale in scales or self.scales:
+            with tempfile.TemporaryDirectory() as folder:
+                start_time = time.perf_counter()
+                synthetic_bag = SyntheticBag(scale)
+                file_bag = synthetic_bag.write_zip(os.path.join(folder, 'lvbag-extract-nl.zip'))
+                utils.print_log(f"synthetische BAG schaal {scale} | nummeraanduidingen: "
+                                f"{len(synthetic_bag.objects['Nummeraanduiding']):n} | "
+                                f"{os.path.getsize(file_bag) / 1e6:.1f} MB | {utils.time_elapsed(start_time)}")
+
+                self.run_import(scale, file_bag, folder,
+                                nummeraanduidingen=len(synthetic_bag.objects['Nummeraanduiding']),
+                                zip_mb=os.path.getsize(file_bag) / 1e6)
+
+        return self.results
+
+    def run_import(self, scale, file_bag, folder, config_overrides=None, **info):
+        # Run import_bag.py in a separate process and attribute time and peak memory (RSS of the importer and its
+        # worker processes) to the phases of the import, based on the log messages
+        utils.print_log(f"start: import synthetische BAG schaal {scale}")
+        file_db = os.path.join(folder, 'bag.duckdb')
+        environment = {
+            **os.environ,
+            'PYTHONUNBUFFERED': '1',
+            'BAG_PARSER_CONFIG': json.dumps({
+                'file_log': os.path.join(folder, 'bag_importer.log'),
+                'file_gemeenten': os.path.join(FOLDER_ROOT, 'input', 'gemeenten.csv'),
+                **(config_overrides or {}),
+            }),
+        }
+
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(FOLDER_ROOT, 'import_bag.py'), '--bag-file', file_bag, '--db-file', file_db],
+            cwd=folder, env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+        importer = psutil.Process(process.pid)
+        lock = threading.Lock()
+        phases = {'start': {'start': time.perf_counter(), 'peak_rss': 0}}
+        current = ['start']
+        output = []
+
+        def sample_rss():
+            rss = 0
+            try:
+                for p in [importer] + importer.children(recursive=True):
+                    rss += p.memory_info().rss
+            except psutil.Error:
+                pass
+            with lock:
+                phase = phases[current[0]]
+                phase['peak_rss'] = max(phase['peak_rss'], rss)
+            return rss
+
+        def read_output():
+            for line in process.stdout:
+                output.append(line.rstrip())
+                match = LOG_LINE.match(line.strip())
+                if not match:
+                    continue
+                for pattern, name in PHASES:
+                    phase_match = pattern.match(match.group(1))
+                    if phase_match:
+                        phase = name.format(*phase_match.groups())
+                        with lock:
+                            if phase != current[0]:
+                                phases[current[0]]['end'] = time.perf_counter()
+                                phases[phase] = {'start': time.perf_counter(), 'peak_rss': 0}
+                                current[0] = phase
+                        # Short phases could otherwise end before the first memory sample
+                        sample_rss()
+                        break
+
+        reader = threading.Thread(target=read_output)
+        reader.start()
+
+        peak_rss = 0
+        while process.poll() is None:
+            peak_rss = max(peak_rss, sample_rss())
+            time.sleep(self.sample_interval)
+
+        reader.join()
+        end_time = time.perf_counter()
+        phases[current[0]]['end'] = end_time
+
+        if process.returncode != 0:
+            utils.print_log(f"import schaal {scale} mislukt (exit code {process.returncode}):\n" +
+                            '\n'.join(output[-20:]), error=True)
+
+        for phase, values in phases.items():
+            self.results[f"import {scale} | {phase}"] = {
+                'seconds': values['end'] - values['start'],
+                'peak_rss_mb': values['peak_rss'] / 1e6,
+            }
+            utils.print_log(f"benchmark: import {scale} | {phase:32} | {values['end'] - values['start']:8.2f}s | "
+                            f"piek geheugen: {values['peak_rss'] / 1e6:8.1f} MB")
+
+        self.results[f"import {scale}"] = {
+            'seconds': end_time - phases['start']['start'],
+            'peak_rss_mb': peak_rss / 1e6,
+            'db_mb': os.path.getsize(file_db) / 1e6 if os.path.exists(file_db) else None,
+            'returncode': process.returncode,
+            **info,
+        }
+        utils.print_log(f"ready: import schaal {scale} | {end_time - phases['start']['start']:.2f}s | "
+                        f"piek geheugen: {peak_rss / 1e6:.1f} MB")
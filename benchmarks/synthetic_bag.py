@@ -0,0 +1,526 @@
+# Synthetic BAG data with the same XML structure as the BAG 2.0 extract of the Kadaster.
+# The data is generated from a fixed seed, so every run produces exactly the same XML files.
+import csv
+import os
+import random
+import tempfile
+from xml.sax.saxutils import escape
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+OBJECT_TYPES = ['Woonplaats', 'GemeenteWoonplaatsRelatie', 'OpenbareRuimte', 'Nummeraanduiding', 'Pand',
+                'Verblijfsobject', 'Ligplaats', 'Standplaats']
+
+# Number of objects in the full BAG extract (2025). Scale 1.0 generates a BAG of the same size.
+FULL_BAG_COUNTS = {
+    'Woonplaats': 2500,
+    'OpenbareRuimte': 260000,
+    'Nummeraanduiding': 9900000,
+    'Ligplaats': 12000,
+    'Standplaats': 25000,
+}
+
+FILE_BAG_CODES = {
+    'Woonplaats': '9999WPL',
+    'GemeenteWoonplaatsRelatie': 'GEM-WPL-RELATIE',
+    'OpenbareRuimte': '9999OPR',
+    'Nummeraanduiding': '9999NUM',
+    'Pand': '9999PND',
+    'Verblijfsobject': '9999VBO',
+    'Ligplaats': '9999LIG',
+    'Standplaats': '9999STA',
+}
+
+EXTRACT_DATE = '08102025'
+
+STATUS_CURRENT = {
+    'Woonplaats': 'Woonplaats aangewezen',
+    'OpenbareRuimte': 'Naamgeving uitgegeven',
+    'Nummeraanduiding': 'Naamgeving uitgegeven',
+    'Pand': 'Pand in gebruik',
+    'Verblijfsobject': 'Verblijfsobject in gebruik',
+    'Ligplaats': 'Plaats aangewezen',
+    'Standplaats': 'Plaats aangewezen',
+}
+
+# Status of the historical version of an object, before the current version
+STATUS_HISTORY = {
+    'Woonplaats': 'Woonplaats aangewezen',
+    'OpenbareRuimte': 'Naamgeving uitgegeven',
+    'Nummeraanduiding': 'Naamgeving uitgegeven',
+    'Pand': 'Bouw gestart',
+    'Verblijfsobject': 'Verblijfsobject gevormd',
+    'Ligplaats': 'Plaats aangewezen',
+    'Standplaats': 'Plaats aangewezen',
+}
+
+NAMESPACES_BAG = (
+    'xmlns:sl-bag-extract="http://www.kadaster.nl/schemas/lvbag/extract-deelbestand-lvc/v20200601" '
+    'xmlns:sl="http://www.kadaster.nl/schemas/standlevering-generiek/1.0" '
+    'xmlns:selecties-extract="http://www.kadaster.nl/schemas/lvbag/extract-selecties/v20200601" '
+    'xmlns:Objecten="www.kadaster.nl/schemas/lvbag/imbag/objecten/v20200601" '
+    'xmlns:Objecten-ref="www.kadaster.nl/schemas/lvbag/imbag/objecten-ref/v20200601" '
+    'xmlns:Historie="www.kadaster.nl/schemas/lvbag/imbag/historie/v20200601" '
+    'xmlns:nen5825="www.kadaster.nl/schemas/lvbag/imbag/nen5825/v20200601" '
+    'xmlns:gml="http://www.opengis.net/gml/3.2"')
+
+NAMESPACES_GWR = (
+    'xmlns:gwr-bestand="www.kadaster.nl/schemas/lvbag/gem-wpl-rel/bag-extract-deelbestand" '
+    'xmlns:gwr-product="www.kadaster.nl/schemas/lvbag/gem-wpl-rel/gwr-producten-lvc/v20200601" '
+    'xmlns:bagtypes="www.kadaster.nl/schemas/lvbag/gem-wpl-rel/bag-types" '
+    'xmlns:selecties-extract="http://www.kadaster.nl/schemas/lvbag/extract-selecties/v20200601"')
+
+PLAATS_DELEN = ['Ooster', 'Wester', 'Zuider', 'Noorder', 'Hooge', 'Lage', 'Nieuw', 'Oud', 'Groot', 'Klein', 'Sint ']
+PLAATS_NAMEN = ['wolde', 'veen', 'dijk', 'dam', 'hoven', 'broek', 'horst', 'zijl', 'meer', 'wijk', 'hem', 'lo']
+STRAAT_NAMEN = ['Kerk', 'Molen', 'School', 'Dorps', 'Stations', 'Beuken', 'Eiken', 'Linden', 'Wilgen', 'Berken',
+                'Tulpen', 'Rozen', 'Sportpark', 'Vondel', 'Rembrandt', 'Koning Willem-Alexander', "'t Hoge",
+                'Burgemeester van der Heijden', 'Prinses Beatrix', 'Jan van Nassau', 'Hof & Tuin']
+STRAAT_TYPEN = ['straat', 'weg', 'laan', 'plein', 'pad', 'singel', 'kade', 'hof', 'dreef']
+GEBRUIKSDOELEN = ['woonfunctie', 'kantoorfunctie', 'winkelfunctie', 'bijeenkomstfunctie', 'industriefunctie',
+                  'logiesfunctie', 'overige gebruiksfunctie', 'onderwijsfunctie', 'gezondheidszorgfunctie']
+
+
+class SyntheticBag:
+    # Pand width and depth in meters. Panden along a street share their walls, like rows of houses.
+    pand_width = 6.0
+    pand_depth = 10.0
+
+    def __init__(self, scale=0.001, seed=1, file_gemeenten='input/gemeenten.csv', history_fraction=0.2):
+        self.scale = scale
+        self.history_fraction = history_fraction
+        self.rng = random.Random(seed)
+        self.objects = {object_type: [] for object_type in OBJECT_TYPES}
+
+        with open(file_gemeenten, encoding='utf-8') as file:
+            self.gemeente_codes = [row['Gemeentecode'] for row in csv.DictReader(file)]
+
+        self.__generate()
+
+    def count(self, object_type):
+        return max(1, round(FULL_BAG_COUNTS[object_type] * self.scale))
+
+    def __random_date(self, first_year=1995, last_year=2024):
+        return f"{self.rng.randint(first_year, last_year)}-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}"
+
+    def __generate(self):
+        rng = self.rng
+
+        woonplaatsen = self.objects['Woonplaats']
+        names = set()
+        for i in range(self.count('Woonplaats')):
+            naam = rng.choice(PLAATS_DELEN) + rng.choice(PLAATS_NAMEN)
+            if naam in names:
+                naam += f" {i}"
+            names.add(naam)
+            woonplaatsen.append({
+                'id': f"{1000 + i:04d}",
+                'naam': naam,
+                'gemeente_id': self.gemeente_codes[i % len(self.gemeente_codes)],
+                'x': rng.uniform(20000, 270000),
+                'y': rng.uniform(310000, 610000),
+                'begindatum': self.__random_date(1995, 2015),
+            })
+
+        for woonplaats in woonplaatsen:
+            self.objects['GemeenteWoonplaatsRelatie'].append({
+                'woonplaats_id': woonplaats['id'],
+                'gemeente_id': woonplaats['gemeente_id'],
+                'begindatum': woonplaats['begindatum'],
+            })
+
+        openbare_ruimten = self.objects['OpenbareRuimte']
+        for i in range(self.count('OpenbareRuimte')):
+            woonplaats = woonplaatsen[rng.randrange(len(woonplaatsen))]
+            naam = rng.choice(STRAAT_NAMEN) + rng.choice(STRAAT_TYPEN)
+            openbare_ruimten.append({
+                'id': f"{woonplaats['gemeente_id']}30{i:010d}",
+                'naam': naam,
+                'verkorte_naam': naam[:21] + naam[-3:] if len(naam) > 24 else None,
+                'type': 'Weg' if rng.random() < 0.95 else rng.choice(['Water', 'Terrein', 'Kunstwerk']),
+                'woonplaats_id': woonplaats['id'],
+                'x': woonplaats['x'] + rng.uniform(-2000, 2000),
+                'y': woonplaats['y'] + rng.uniform(-2000, 2000),
+                'begindatum': self.__random_date(int(woonplaats['begindatum'][0:4]), 2020),
+                'postcode': f"{rng.randint(1000, 9999)}",
+            })
+
+        # Nummeraanduidingen are divided over the openbare ruimten in blocks of consecutive huisnummers
+        nummer_count = self.count('Nummeraanduiding')
+        ligplaats_count = self.count('Ligplaats')
+        standplaats_count = self.count('Standplaats')
+        ligplaats_every = nummer_count // ligplaats_count
+        standplaats_every = nummer_count // standplaats_count
+
+        huisnummers = {}
+        panden_on_street = {}
+        previous_verblijfsobject = None
+        for i in range(nummer_count):
+            openbare_ruimte = openbare_ruimten[i * len(openbare_ruimten) // nummer_count]
+            gemeente_id = openbare_ruimte['id'][0:4]
+            huisnummer = huisnummers.get(openbare_ruimte['id'], 0) + 1
+            huisnummers[openbare_ruimte['id']] = huisnummer
+
+            huisletter = None
+            toevoeging = None
+            if rng.random() < 0.05:
+                huisletter = rng.choice('ABCD')
+            elif rng.random() < 0.05:
+                toevoeging = rng.choice(['1', '2', '3', 'BS', 'HS', 'RD'])
+
+            # Postcode letters change every 24 huisnummers
+            block = huisnummer // 24
+            postcode = openbare_ruimte['postcode'] + chr(65 + (block // 26) % 26) + chr(65 + block % 26)
+
+            nummer = {
+                'id': f"{gemeente_id}20{i:010d}",
+                'huisnummer': huisnummer,
+                'huisletter': huisletter,
+                'toevoeging': toevoeging,
+                'postcode': postcode,
+                'openbare_ruimte_id': openbare_ruimte['id'],
+                # Only a small part of the nummeraanduidingen has an explicit woonplaats
+                'woonplaats_id': openbare_ruimte['woonplaats_id'] if rng.random() < 0.02 else None,
+                'begindatum': self.__random_date(int(openbare_ruimte['begindatum'][0:4]), 2024),
+            }
+            self.objects['Nummeraanduiding'].append(nummer)
+
+            x = openbare_ruimte['x'] + (huisnummer // 2) * self.pand_width
+            y = openbare_ruimte['y'] + (huisnummer % 2) * 30.0
+
+            if i % ligplaats_every == ligplaats_every - 1:
+                nummer['type'] = 'Ligplaats'
+                self.objects['Ligplaats'].append(self.__plaats(f"{gemeente_id}02{i:010d}", nummer, x, y + 40))
+                continue
+
+            if i % standplaats_every == standplaats_every - 1:
+                nummer['type'] = 'Standplaats'
+                self.objects['Standplaats'].append(self.__plaats(f"{gemeente_id}03{i:010d}", nummer, x, y + 40))
+                continue
+
+            nummer['type'] = 'Verblijfsobject'
+
+            # A few nummeraanduidingen are nevenadressen of the previous verblijfsobject
+            if (previous_verblijfsobject and rng.random() < 0.03 and
+                    previous_verblijfsobject['openbare_ruimte_id'] == openbare_ruimte['id']):
+                previous_verblijfsobject['nevenadressen'].append(nummer['id'])
+                continue
+
+            # Apartments: some verblijfsobjecten are in the same pand as the previous one
+            pand_key = (openbare_ruimte['id'], huisnummer // 2 if rng.random() < 0.8 else -huisnummer)
+            pand = panden_on_street.get(pand_key)
+            if pand is None:
+                pand = self.__pand(gemeente_id, x, y, nummer['begindatum'])
+                panden_on_street[pand_key] = pand
+                # Some panden have no verblijfsobject, like sheds and garages
+                if rng.random() < 0.13:
+                    self.__pand(gemeente_id, x, y + self.pand_depth, nummer['begindatum'])
+
+            pand_ids = [pand['id']]
+            if rng.random() < 0.01:
+                pand_ids.append(self.__pand(gemeente_id, x, y - self.pand_depth, nummer['begindatum'])['id'])
+
+            gebruiksdoelen = ['woonfunctie'] if rng.random() < 0.9 else [rng.choice(GEBRUIKSDOELEN)]
+            if rng.random() < 0.03:
+                gebruiksdoelen.append(rng.choice(GEBRUIKSDOELEN[1:]))
+
+            previous_verblijfsobject = {
+                'id': f"{gemeente_id}01{i:010d}",
+                'nummer_id': nummer['id'],
+                'openbare_ruimte_id': openbare_ruimte['id'],
+                'nevenadressen': [],
+                'pand_ids': pand_ids,
+                'x': round(x + self.pand_width / 2 + rng.uniform(-1, 1), 3),
+                'y': round(y + self.pand_depth / 2 + rng.uniform(-1, 1), 3),
+                'gebruiksdoelen': list(dict.fromkeys(gebruiksdoelen)),
+                'oppervlakte': rng.randint(15, 250),
+                'begindatum': nummer['begindatum'],
+            }
+            self.objects['Verblijfsobject'].append(previous_verblijfsobject)
+
+        # Historical versions: an earlier voorkomen that ended when the current version started
+        for object_type, status in STATUS_HISTORY.items():
+            for bag_object in self.objects[object_type]:
+                if rng.random() < self.history_fraction:
+                    year = int(bag_object['begindatum'][0:4])
+                    bag_object['historie'] = [{
+                        'voorkomen_id': 1,
+                        'begindatum': self.__random_date(year - 10, year - 1),
+                        'einddatum': bag_object['begindatum'],
+                        'status': status,
+                    }]
+
+    def __pand(self, gemeente_id, x, y, begindatum):
+        pand = {
+            'id': f"{gemeente_id}10{len(self.objects['Pand']):010d}",
+            'x': round(x, 3),
+            'y': round(y, 3),
+            'bouwjaar': self.rng.randint(1850, int(begindatum[0:4])),
+            'begindatum': begindatum,
+        }
+        self.objects['Pand'].append(pand)
+        return pand
+
+    def __plaats(self, identificatie, nummer, x, y):
+        return {
+            'id': identificatie,
+            'nummer_id': nummer['id'],
+            'x': round(x, 3),
+            'y': round(y, 3),
+            'begindatum': nummer['begindatum'],
+        }
+
+    @staticmethod
+    def __voorkomen(version):
+        begindatum = version['begindatum']
+        eind = ''
+        if version['einddatum']:
+            eind = (f'<Historie:eindGeldigheid>{version["einddatum"]}</Historie:eindGeldigheid>'
+                    f'<Historie:eindRegistratie>{version["einddatum"]}T09:00:00.000</Historie:eindRegistratie>')
+        return (
+            '<Objecten:voorkomen><Historie:Voorkomen>'
+            f'<Historie:voorkomenidentificatie>{version["voorkomen_id"]}</Historie:voorkomenidentificatie>'
+            f'<Historie:beginGeldigheid>{begindatum}</Historie:beginGeldigheid>'
+            f'{eind}'
+            f'<Historie:tijdstipRegistratie>{begindatum}T09:00:00.000</Historie:tijdstipRegistratie>'
+            '<Historie:BeschikbaarLV>'
+            f'<Historie:tijdstipRegistratieLV>{begindatum}T09:05:00.000</Historie:tijdstipRegistratieLV>'
+            '</Historie:BeschikbaarLV>'
+            '</Historie:Voorkomen></Objecten:voorkomen>')
+
+    @staticmethod
+    def __document_kenmerken(begindatum):
+        return (
+            '<Objecten:geconstateerd>N</Objecten:geconstateerd>'
+            f'<Objecten:documentdatum>{begindatum}</Objecten:documentdatum>'
+            f'<Objecten:documentnummer>BAG-{begindatum.replace("-", "")}</Objecten:documentnummer>')
+
+    @staticmethod
+    def __pos_list(x, y, width, depth, dimension=2):
+        # Closed rectangle, counterclockwise
+        points = [(x, y), (x + width, y), (x + width, y + depth), (x, y + depth), (x, y)]
+        z = ' 0.0' if dimension == 3 else ''
+        pos_list = ' '.join(f"{px:.3f} {py:.3f}{z}" for px, py in points)
+        return f'<gml:posList srsDimension="{dimension}" count="5">{pos_list}</gml:posList>'
+
+    def __polygon(self, x, y, width, depth, dimension=2):
+        return (f'<gml:Polygon srsName="urn:ogc:def:crs:EPSG::28992" srsDimension="{dimension}">'
+                f'<gml:exterior><gml:LinearRing>{self.__pos_list(x, y, width, depth, dimension)}'
+                '</gml:LinearRing></gml:exterior></gml:Polygon>')
+
+    @staticmethod
+    def versions(object_type, bag_object):
+        # Historical versions (voorkomens) of the object followed by the current version
+        history = bag_object.get('historie', [])
+        return history + [{
+            'voorkomen_id': len(history) + 1,
+            'begindatum': bag_object['begindatum'],
+            'einddatum': None,
+            'status': STATUS_CURRENT.get(object_type),
+        }]
+
+    def object_xml(self, object_type, bag_object, version):
+        o = bag_object
+        v = version
+        match object_type:
+            case 'Woonplaats':
+                return (
+                    '<Objecten:Woonplaats>'
+                    f'<Objecten:identificatie domein="NL.IMBAG.Woonplaats">{o["id"]}</Objecten:identificatie>'
+                    f'<Objecten:naam>{escape(o["naam"])}</Objecten:naam>'
+                    '<Objecten:geometrie><Objecten:vlak>'
+                    f'{self.__polygon(o["x"] - 2500, o["y"] - 2500, 5000, 5000)}'
+                    '</Objecten:vlak></Objecten:geometrie>'
+                    f'<Objecten:status>{v["status"]}</Objecten:status>'
+                    f'{self.__document_kenmerken(v["begindatum"])}'
+                    f'{self.__voorkomen(v)}'
+                    '</Objecten:Woonplaats>')
+            case 'GemeenteWoonplaatsRelatie':
+                return (
+                    '<gwr-product:GemeenteWoonplaatsRelatie>'
+                    '<gwr-product:tijdvakgeldigheid>'
+                    f'<bagtypes:begindatumTijdvakGeldigheid>{o["begindatum"]}</bagtypes:begindatumTijdvakGeldigheid>'
+                    '</gwr-product:tijdvakgeldigheid>'
+                    '<gwr-product:gerelateerdeWoonplaats>'
+                    f'<gwr-product:identificatie>{o["woonplaats_id"]}</gwr-product:identificatie>'
+                    '</gwr-product:gerelateerdeWoonplaats>'
+                    '<gwr-product:gerelateerdeGemeente>'
+                    f'<gwr-product:identificatie>{o["gemeente_id"]}</gwr-product:identificatie>'
+                    '</gwr-product:gerelateerdeGemeente>'
+                    '<gwr-product:status>definitief</gwr-product:status>'
+                    '</gwr-product:GemeenteWoonplaatsRelatie>')
+            case 'OpenbareRuimte':
+                verkorte_naam = ''
+                if o['verkorte_naam']:
+                    verkorte_naam = (
+                        '<Objecten:verkorteNaam><nen5825:VerkorteNaamOpenbareRuimte>'
+                        f'<nen5825:verkorteNaam>{escape(o["verkorte_naam"])}</nen5825:verkorteNaam>'
+                        '</nen5825:VerkorteNaamOpenbareRuimte></Objecten:verkorteNaam>')
+                return (
+                    '<Objecten:OpenbareRuimte>'
+                    f'<Objecten:identificatie domein="NL.IMBAG.Openbareruimte">{o["id"]}</Objecten:identificatie>'
+                    f'<Objecten:naam>{escape(o["naam"])}</Objecten:naam>'
+                    f'<Objecten:type>{o["type"]}</Objecten:type>'
+                    f'<Objecten:status>{v["status"]}</Objecten:status>'
+                    f'{self.__document_kenmerken(v["begindatum"])}'
+                    '<Objecten:ligtIn>'
+                    f'<Objecten-ref:WoonplaatsRef domein="NL.IMBAG.Woonplaats">{o["woonplaats_id"]}</Objecten-ref:WoonplaatsRef>'
+                    '</Objecten:ligtIn>'
+                    f'{verkorte_naam}'
+                    f'{self.__voorkomen(v)}'
+                    '</Objecten:OpenbareRuimte>')
+            case 'Nummeraanduiding':
+                huisletter = f'<Objecten:huisletter>{o["huisletter"]}</Objecten:huisletter>' if o['huisletter'] else ''
+                toevoeging = (f'<Objecten:huisnummertoevoeging>{o["toevoeging"]}</Objecten:huisnummertoevoeging>'
+                              if o['toevoeging'] else '')
+                ligt_in = ''
+                if o['woonplaats_id']:
+                    ligt_in = (
+                        '<Objecten:ligtIn>'
+                        f'<Objecten-ref:WoonplaatsRef domein="NL.IMBAG.Woonplaats">{o["woonplaats_id"]}</Objecten-ref:WoonplaatsRef>'
+                        '</Objecten:ligtIn>')
+                return (
+                    '<Objecten:Nummeraanduiding>'
+                    f'<Objecten:identificatie domein="NL.IMBAG.Nummeraanduiding">{o["id"]}</Objecten:identificatie>'
+                    f'<Objecten:huisnummer>{o["huisnummer"]}</Objecten:huisnummer>'
+                    f'{huisletter}{toevoeging}'
+                    f'<Objecten:postcode>{o["postcode"]}</Objecten:postcode>'
+                    f'<Objecten:typeAdresseerbaarObject>{o["type"]}</Objecten:typeAdresseerbaarObject>'
+                    f'<Objecten:status>{v["status"]}</Objecten:status>'
+                    f'{self.__document_kenmerken(v["begindatum"])}'
+                    f'{self.__voorkomen(v)}'
+                    f'{ligt_in}'
+                    '<Objecten:ligtAan>'
+                    f'<Objecten-ref:OpenbareRuimteRef domein="NL.IMBAG.OpenbareRuimte">{o["openbare_ruimte_id"]}</Objecten-ref:OpenbareRuimteRef>'
+                    '</Objecten:ligtAan>'
+                    '</Objecten:Nummeraanduiding>')
+            case 'Pand':
+                return (
+                    '<Objecten:Pand>'
+                    f'<Objecten:identificatie domein="NL.IMBAG.Pand">{o["id"]}</Objecten:identificatie>'
+                    '<Objecten:geometrie>'
+                    f'{self.__polygon(o["x"], o["y"], self.pand_width, self.pand_depth, 3)}'
+                    '</Objecten:geometrie>'
+                    f'<Objecten:oorspronkelijkBouwjaar>{o["bouwjaar"]}</Objecten:oorspronkelijkBouwjaar>'
+                    f'<Objecten:status>{v["status"]}</Objecten:status>'
+                    f'{self.__document_kenmerken(v["begindatum"])}'
+                    f'{self.__voorkomen(v)}'
+                    '</Objecten:Pand>')
+            case 'Verblijfsobject':
+                gebruiksdoelen = ''.join(f'<Objecten:gebruiksdoel>{gebruiksdoel}</Objecten:gebruiksdoel>'
+                                         for gebruiksdoel in o['gebruiksdoelen'])
+                # All nevenadressen and panden are references in a single element, like in the BAG extract
+                nevenadressen = ''
+                if o['nevenadressen']:
+                    nevenadressen = '<Objecten:heeftAlsNevenadres>' + ''.join(
+                        f'<Objecten-ref:NummeraanduidingRef domein="NL.IMBAG.Nummeraanduiding">{nummer_id}</Objecten-ref:NummeraanduidingRef>'
+                        for nummer_id in o['nevenadressen']) + '</Objecten:heeftAlsNevenadres>'
+                panden = '<Objecten:maaktDeelUitVan>' + ''.join(
+                    f'<Objecten-ref:PandRef domein="NL.IMBAG.Pand">{pand_id}</Objecten-ref:PandRef>'
+                    for pand_id in o['pand_ids']) + '</Objecten:maaktDeelUitVan>'
+                return (
+                    '<Objecten:Verblijfsobject>'
+                    '<Objecten:heeftAlsHoofdadres>'
+                    f'<Objecten-ref:NummeraanduidingRef domein="NL.IMBAG.Nummeraanduiding">{o["nummer_id"]}</Objecten-ref:NummeraanduidingRef>'
+                    '</Objecten:heeftAlsHoofdadres>'
+                    f'{nevenadressen}'
+                    f'{self.__voorkomen(v)}'
+                    f'<Objecten:identificatie domein="NL.IMBAG.Verblijfsobject">{o["id"]}</Objecten:identificatie>'
+                    '<Objecten:geometrie><Objecten:punt>'
+                    '<gml:Point srsName="urn:ogc:def:crs:EPSG::28992" srsDimension="3">'
+                    f'<gml:pos>{o["x"]:.3f} {o["y"]:.3f} 0.0</gml:pos>'
+                    '</gml:Point>'
+                    '</Objecten:punt></Objecten:geometrie>'
+                    f'{gebruiksdoelen}'
+                    f'<Objecten:oppervlakte>{o["oppervlakte"]}</Objecten:oppervlakte>'
+                    f'<Objecten:status>{v["status"]}</Objecten:status>'
+                    f'{self.__document_kenmerken(v["begindatum"])}'
+                    f'{panden}'
+                    '</Objecten:Verblijfsobject>')
+            case 'Ligplaats' | 'Standplaats':
+                return (
+                    f'<Objecten:{object_type}>'
+                    '<Objecten:heeftAlsHoofdadres>'
+                    f'<Objecten-ref:NummeraanduidingRef domein="NL.IMBAG.Nummeraanduiding">{o["nummer_id"]}</Objecten-ref:NummeraanduidingRef>'
+                    '</Objecten:heeftAlsHoofdadres>'
+                    f'{self.__voorkomen(v)}'
+                    f'<Objecten:identificatie domein="NL.IMBAG.{object_type}">{o["id"]}</Objecten:identificatie>'
+                    f'<Objecten:status>{v["status"]}</Objecten:status>'
+                    f'{self.__document_kenmerken(v["begindatum"])}'
+                    f'<Objecten:geometrie>{self.__polygon(o["x"], o["y"], 15.0, 5.0)}</Objecten:geometrie>'
+                    f'</Objecten:{object_type}>')
+            case _:
+                raise Exception(f'Onbekend BAG object type "{object_type}"')
+
+    def document_xml(self, object_type, bag_objects):
+        if object_type == 'GemeenteWoonplaatsRelatie':
+            relaties = ''.join(self.object_xml(object_type, bag_object, None) for bag_object in bag_objects)
+            return (
+                '<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<gwr-bestand:BAG-GWR-Deelbestand-LVC {NAMESPACES_GWR}>'
+                '<gwr-bestand:antwoord><gwr-bestand:producten><gwr-product:LVC-product>'
+                f'{relaties}'
+                '</gwr-product:LVC-product></gwr-bestand:producten></gwr-bestand:antwoord>'
+                '</gwr-bestand:BAG-GWR-Deelbestand-LVC>\n')
+
+        objects = ''.join(
+            f'<sl-bag-extract:bagObject>{self.object_xml(object_type, bag_object, version)}</sl-bag-extract:bagObject>\n'
+            for bag_object in bag_objects for version in self.versions(object_type, bag_object))
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<sl-bag-extract:bagStand {NAMESPACES_BAG}>'
+            '<sl:standBestand><sl:dataset>LVBAG</sl:dataset>'
+            f'<sl:inhoud><sl:gebied>NLD</sl:gebied><sl:leveringsId>0000000001</sl:leveringsId>'
+            f'<sl:objectTypen><sl:objectType>{FILE_BAG_CODES[object_type][4:]}</sl:objectType></sl:objectTypen>'
+            '</sl:inhoud>'
+            f'<sl:stand>\n{objects}</sl:stand>'
+            '</sl:standBestand></sl-bag-extract:bagStand>\n')
+
+    def xml_files(self, object_type, objects_per_file=10000):
+        # Yields (file name, XML document) for the objects of one type, named like the files in the BAG extract
+        file_bag_code = FILE_BAG_CODES[object_type]
+        bag_objects = self.objects[object_type]
+        if object_type == 'GemeenteWoonplaatsRelatie':
+            # The BAG extract has a single file with all relations
+            yield f"{file_bag_code}-{EXTRACT_DATE}.xml", self.document_xml(object_type, bag_objects)
+            return
+
+        for file_number, start in enumerate(range(0, max(len(bag_objects), 1), objects_per_file), 1):
+            yield (f"{file_bag_code}{EXTRACT_DATE}-{file_number:06d}.xml",
+                   self.document_xml(object_type, bag_objects[start:start + objects_per_file]))
+
+    def write_xml_files(self, object_type, folder, objects_per_file=10000):
+        # Write the objects of one type to XML files. Returns the list of written files.
+        files = []
+        for file_name, document in self.xml_files(object_type, objects_per_file):
+            file_xml = os.path.join(folder, file_name)
+            with open(file_xml, 'w', encoding='utf-8') as file:
+                file.write(document)
+            files.append(file_xml)
+
+        return files
+
+    def write_zip(self, file_zip, objects_per_file=10000):
+        # Write a BAG extract zip like lvbag-extract-nl.zip: one inner zip with XML files per object type
+        folder = os.path.dirname(file_zip)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with ZipFile(file_zip, 'w', ZIP_STORED) as outer_zip, tempfile.TemporaryDirectory() as temp_folder:
+            outer_zip.writestr('Leveringsdocument-BAG-Extract.xml',
+                               '<?xml version="1.0" encoding="UTF-8"?>\n'
+                               f'<Leveringsdocument><Datum>{EXTRACT_DATE}</Datum>'
+                               f'<Schaal>{self.scale}</Schaal></Leveringsdocument>\n')
+
+            for object_type in OBJECT_TYPES:
+                if object_type == 'GemeenteWoonplaatsRelatie':
+                    inner_name = f"{FILE_BAG_CODES[object_type]}-{EXTRACT_DATE}.zip"
+                else:
+                    inner_name = f"{FILE_BAG_CODES[object_type]}{EXTRACT_DATE}.zip"
+                inner_file = os.path.join(temp_folder, inner_name)
+                with ZipFile(inner_file, 'w', ZIP_DEFLATED) as inner_zip:
+                    for file_name, document in self.xml_files(object_type, objects_per_file):
+                        inner_zip.writestr(file_name, document)
+
+                outer_zip.write(inner_file, inner_name)
+                os.remove(inner_file)
+
+        return file_zip
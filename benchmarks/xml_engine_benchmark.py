@@ -0,0 +1,90 @@
+# Differential test and throughput comparison of the XML extractor engines (config.xml_engine): lxml and scan.
+# Both engines must return identical rows for every XML file, on a synthetic BAG and a sample of the real BAG.
+import os
+import tempfile
+from zipfile import ZipFile
+
+import config
+import utils
+from bag.bag_parser import BagParser, parse_xml_file, OBJECT_TYPE_TABLES
+from benchmarks.benchmark import Benchmark
+from benchmarks.synthetic_bag import SyntheticBag
+
+ENGINES = ['lxml', 'scan']
+
+
+class XmlEngineBenchmark(Benchmark):
+    repeat = 3
+    # XML files per object type taken from the real BAG
+    bag_sample_files = 2
+
+    def __init__(self, scale=0.001, seed=1):
+        super().__init__()
+        self.scale = scale
+        self.seed = seed
+        self.differences = 0
+
+    def run(self):
+        utils.print_log(f"start: XML engines {', '.join(ENGINES)} | synthetische BAG schaal {self.scale}")
+        parser = BagParser(None)
+        synthetic_bag = SyntheticBag(self.scale, self.seed)
+
+        with tempfile.TemporaryDirectory() as folder:
+            for object_type in OBJECT_TYPE_TABLES:
+                parser.set_object_type(object_type)
+                xml_files = synthetic_bag.write_xml_files(object_type, folder)
+                self.compare(f"synthetisch {object_type}", parser, xml_files)
+
+                xml_files = self.bag_xml_files(parser.file_bag_code, folder)
+                if xml_files:
+                    self.compare(f"BAG {object_type}", parser, xml_files)
+
+        parser.close()
+        if self.differences:
+            utils.print_log(f"XML engines geven verschillende resultaten: {self.differences} bestanden", error=True)
+        else:
+            utils.print_log("ready: XML engines geven identieke resultaten")
+        return self.results
+
+    def compare(self, name, parser, xml_files):
+        def parse_files(engine):
+            return [parse_xml_file(file_xml, parser.tag_name, parser.data_init, parser.object_tag_name,
+                                   parser.db_fields, engine)['data'] for file_xml in xml_files]
+
+        objects = 0
+        results = {}
+        for engine in ENGINES:
+            results[engine] = self.measure(f"{engine} {name}", parse_files, engine)
+            objects = sum(len(rows) for rows in results[engine])
+            self.results[f"{engine} {name}"]['objects'] = objects
+
+        for file_xml, rows_lxml, rows_scan in zip(xml_files, results['lxml'], results['scan']):
+            if rows_lxml != rows_scan:
+                self.differences += 1
+                difference = next(((row_lxml, row_scan) for row_lxml, row_scan in zip(rows_lxml, rows_scan)
+                                   if row_lxml != row_scan), (len(rows_lxml), len(rows_scan)))
+                utils.print_log(f"verschil lxml/scan in {file_xml}: {difference}", error=True)
+
+        best = {engine: self.results[f"{engine} {name}"]['best'] for engine in ENGINES}
+        utils.print_log(f"benchmark: {name} | {objects:,d} objecten | " +
+                        " | ".join(f"{engine}: {objects / best[engine]:,.0f}/s" for engine in ENGINES) +
+                        f" | scan {best['lxml'] / best['scan']:.1f}x")
+
+    def bag_xml_files(self, file_bag_code, folder):
+        # A few XML files of an object type from the real BAG file, if it is available
+        if not os.path.exists(config.file_bag):
+            return []
+
+        with ZipFile(config.file_bag) as bag_zip:
+            names = [name for name in bag_zip.namelist() if file_bag_code in name and name.endswith('.zip')]
+            if not names:
+                return []
+            # The zip file of an object type is read from the BAG file without extracting it completely
+            with bag_zip.open(names[0]) as file_zip, ZipFile(file_zip) as object_zip:
+                xml_names = sorted(name for name in object_zip.namelist() if name.endswith('.xml'))
+                step = max(1, len(xml_names) // self.bag_sample_files)
+                xml_files = []
+                for xml_name in xml_names[::step][:self.bag_sample_files]:
+                    xml_files.append(object_zip.extract(xml_name, os.path.join(folder, 'bag')))
+
+        return xml_files
@@ -1,4 +1,6 @@
+import json
 import locale
+import os
 import psutil
 
 version = 91
@@ -18,12 +20,68 @@ file_db_duckdb = 'output/bag.duckdb'
 # Log file containing progress, warnings and error messages. This info is also written to the console.
 file_log = 'output/bag_importer.log'
 
+# Minimum level of the messages that are logged: 'DEBUG', 'INFO', 'WARNING' or 'ERROR'
+log_level = 'INFO'
+
+# Repeated errors of the same kind (e.g. an insert error for each XML file of an object type) are logged once, after
+# that only the number of repeated errors is logged, at most every log_repeated_interval seconds.
+log_repeated_interval = 10
+
+# Timings of the import phases and counters (objects parsed, rows inserted, bytes read) are written at the end of each
+# import as JSON and in the Prometheus textfile format (for the node exporter textfile collector), to track import
+# performance over time. Set to None to disable.
+file_metrics_json = 'output/bag_importer_metrics.json'
+file_metrics_prometheus = 'output/bag_importer_metrics.prom'
+
+# Opt-in memory profiling of the import. Samples the memory (RSS) of the main process, of each worker process and the
+# memory used by DuckDB every profile_memory_interval seconds. Each sample is appended to file_memory_timeline (JSON
+# lines) as soon as it is taken, so the file is also there when the import is killed for running out of memory. The
+# peaks per phase and object type are logged at the end (also after an error) and written to file_memory_profile.
+# Useful to find out what runs out of memory on smaller machines.
+profile_memory = False
+profile_memory_interval = 0.5
+file_memory_profile = 'output/bag_importer_memory.json'
+file_memory_timeline = 'output/bag_importer_memory.jsonl'
+
+# Cache the parsed BAG tables as Parquet files in folder_parse_cache. The cache key is the content hash of the zip
+# file of an object type (e.g. 9999WPL or GEM-WPL-RELATIE) plus the parser fields and settings, so object types that
+# did not change since the previous monthly BAG (and the gemeenten file) are loaded from the cache instead of parsed.
+# With active_only the cache holds all versions with the active status, the versions valid today are selected after
+# loading, so an entry can be used on any day. Except for a region import, its cache entries are only valid on the same
+# day. Only the latest cache entry per object type is kept.
+use_parse_cache = False
+folder_parse_cache = 'cache'
+
 # The parser creates an 'adressen' table merging the data of nummers, panden, verblijfsobjecten, ligplaatsen and
 # standplaatsen tables into one single table. It only contains active addresses.
 create_adressen_table = True
 
+# Also create a denormalized 'adressen_export' table with the street, woonplaats, gemeente and provincie names
+# already resolved, so exports (and your own queries) don't need to join openbare_ruimten, woonplaatsen, gemeenten
+# and provincies. The names are stored dictionary compressed (as ENUM types). Adds roughly 10% to the database size.
+create_adressen_export_table = False
+
+# Also create an 'adressen_lookup' table, sorted on postcode and huisnummer, for fast address lookups from Python
+# with geocoder.BagLookup.
+create_adressen_lookup_table = False
+
+# Also create an 'adressen_grid' table, a uniform grid over the RD coordinates of the adressen, for reverse
+# geocoding (nearest address to a point) with reverse_geocode.py or geocoder.ReverseGeocoder.
+# The cell size is in meters.
+create_adressen_grid_table = False
+adressen_grid_cell_size = 100
+
+# Region import for small development and test databases. Only the BAG objects of these gemeenten (gemeentecodes,
+# e.g. [363] for Amsterdam) or with their location in this bounding box in RD coordinates (xmin, ymin, xmax, ymax)
+# are imported, together with the objects they reference. Set with import_bag.py --only-gemeente or --bbox.
+region_gemeenten = []
+region_bbox = None
+
 # Only add active records. Historical data of no longer active records are removed.
-# The 'adressen' table can only be created if set to True.
+# If set to False all versions (voorkomens) are kept (history mode). The primary key of the BAG tables becomes
+# (id, voorkomen_id) and the versions are stored sorted on id and begin date. The table macro
+# adressen_as_of(peildatum) returns the adressen that were valid on a date, e.g.
+# SELECT * FROM adressen_as_of('2015-01-01'). The 'adressen' table is created for today.
 active_only = True
 
 # If an adressen table is created some BAG tables are no longer needed and can be deleted:
@@ -43,6 +101,26 @@ use_short_street_names = False
 # Parsing will also take a few minutes more.
 parse_geometries = False
 
+# Maximum number of converted polygon vertices kept in memory by each worker process. Adjacent panden share most of
+# their vertices, so these are converted to WGS84 only once. Set to 0 to disable the cache.
+coordinates_cache_size = 100000
+
+# Coordinate system of the parsed geometries in the database: 'WGS84' (converted while parsing) or 'RD' (EPSG:28992,
+# the posList coordinates of the BAG as they are, almost as fast as parsing without geometries). RD geometries are
+# transformed to WGS84 by the export, or in a query with the geometry_wgs84(geometry) macro of the database.
+geometry_crs = 'WGS84'
+
+# Coordinate system of the geometries in exports: 'WGS84' or 'RD'
+export_geometry_crs = 'WGS84'
+
+# Precision of the parsed WGS84 geometries. The BAG gives the RD coordinates in millimetres, the WGS84 coordinates
+# are full precision doubles by default (None). 7 decimals is about 1 cm, 6 decimals about 10 cm.
+geometry_decimals = None
+# Simplify the geometries with Douglas-Peucker in RD coordinates: vertices closer than this number of metres to
+# the simplified outline are removed. 0 keeps all vertices. ./benchmark.py -p compares the database size,
+# export size and import time of these settings.
+geometry_simplify_tolerance = 0
+
 # The BAG sometimes contains addresses without a valid public space id. Generally those are invalid addresses.
 # They will be automatically deleted if the total number of invalid addresses is lower than the number below.
 # Set to 0 if you prefer warning messages and manually check and correct these entries yourself.
@@ -65,3 +143,21 @@ else:
     cpu_cores_used = cpu_cores - 2
 # cpu_cores_used = 4
 
+# Engine that extracts the fields from the BAG XML files: 'lxml' builds an XML tree of each file, 'scan' finds the
+# fields in the raw bytes of each object without building a tree (up to 1.4x faster on some object types). ./benchmark.py -x checks both give
+# identical results and compares their speed.
+xml_engine = 'lxml'
+
+# The results of this number of XML files (about 10,000 objects each) are saved in DuckDB with a single insert
+insert_batch_files = 1
+
+# ./import_bag.py --autotune measures the objects parsed per second for different worker counts and insert batch
+# sizes on a sample of the XML files of each object type. The best settings are saved per computer (host profile) in
+# file_autotune and used instead of cpu_cores_used and insert_batch_files by later imports, if use_autotune is True.
+use_autotune = True
+file_autotune = 'output/bag_autotune.json'
+
+# Settings above can be overridden on the command line: ./import_bag.py --config parse_geometries=True
+# The overrides are passed on in an environment variable, so worker processes get them as well.
+for _name, _value in json.loads(os.environ.get('BAG_PARSER_CONFIG', '{}')).items():
+    globals()[_name] = _value
@@ -1,6 +1,10 @@
+import json
+
 import duckdb
 import polars as pl
 import os
+import re
+import time
 
 import utils
 import config
@@ -10,24 +14,161 @@ class DatabaseDuckdb:
     connection = None
 
     # cursor = None
-    schema_overrides = {
-        'gemeente_id': pl.datatypes.UInt64,
-        'woonplaats_id': pl.datatypes.UInt64,
-        'nummer_id': pl.datatypes.String,
-        'pand_id': pl.datatypes.String,
-        'id': pl.datatypes.String,
-        'pos': pl.datatypes.String,
-        'begindatum_geldigheid': pl.datatypes.String,
-        'einddatum_geldigheid': pl.datatypes.String,
-        'verkorte_naam': pl.datatypes.String,
-        'naam': pl.datatypes.String,
-        'huisletter': pl.datatypes.String,
-        'toevoeging': pl.datatypes.String,
-        'yadayada': pl.datatypes.String,
+    # Polars type of the DuckDB column types in BAG_TABLES, for the DataFrames of the parsed rows. Geometries are
+    # parsed as text (GeoJSON or WKT) and converted by DuckDB, see geometry_sql.
+    POLARS_TYPES = {
+        'TEXT': pl.datatypes.String,
+        'TEXT[]': pl.datatypes.List(pl.datatypes.String),
+        'UBIGINT': pl.datatypes.UInt64,
+        'INTEGER': pl.datatypes.Int32,
+        'DOUBLE': pl.datatypes.Float64,
+        'DATE': pl.datatypes.Date,
+        'GEOMETRY': pl.datatypes.String,
+    }
+    bag_table_schemas = {}
+
+    # BAG tables with all versions of their objects in history mode (active_only = False) and the column with the
+    # BAG id of their objects
+    HISTORY_TABLES = {
+        'woonplaatsen': 'woonplaats_id',
+        'openbare_ruimten': 'id',
+        'nummers': 'id',
+        'panden': 'id',
+        'verblijfsobjecten': 'id',
+        'ligplaatsen': 'id',
+        'standplaatsen': 'id',
     }
 
-    def __init__(self):
-        self.connection = duckdb.connect(config.file_db_duckdb)
+    # DDL per BAG table, so a single table can be recreated when an import is resumed. voorkomen_id is the version
+    # of the object in the BAG (voorkomenidentificatie).
+    BAG_TABLES = {
+        'woonplaatsen': """
+            DROP TABLE IF EXISTS woonplaatsen;
+            CREATE OR REPLACE SEQUENCE seq_wpid START 1;
+            CREATE TABLE woonplaatsen (
+                id UBIGINT PRIMARY KEY DEFAULT NEXTVAL('seq_wpid'),
+                woonplaats_id UBIGINT,
+                naam TEXT,
+                gemeente_id UBIGINT,
+                geometry GEOMETRY,
+                voorkomen_id INTEGER,
+                status TEXT,
+                begindatum_geldigheid DATE,
+                einddatum_geldigheid DATE);
+        """,
+        'gemeente_woonplaatsen': """
+            DROP TABLE IF EXISTS gemeente_woonplaatsen;
+            CREATE TABLE gemeente_woonplaatsen (
+                gemeente_id UBIGINT,
+                woonplaats_id UBIGINT,
+                status TEXT,
+                begindatum_geldigheid DATE,
+                einddatum_geldigheid DATE
+            );
+        """,
+        'openbare_ruimten': """
+            DROP TABLE IF EXISTS openbare_ruimten;
+            CREATE TABLE openbare_ruimten (
+                id UBIGINT PRIMARY KEY,
+                naam TEXT,
+                -- lange_naam TEXT,
+                verkorte_naam TEXT,
+                type TEXT,
+                woonplaats_id UBIGINT,
+                voorkomen_id INTEGER,
+                status TEXT,
+                begindatum_geldigheid DATE,
+                einddatum_geldigheid DATE);
+        """,
+        'nummers': """
+            DROP TABLE IF EXISTS nummers;
+            CREATE TABLE nummers (
+                id TEXT PRIMARY KEY,
+                postcode TEXT,
+                huisnummer INTEGER,
+                huisletter TEXT,
+                toevoeging TEXT,
+                woonplaats_id UBIGINT,
+                openbare_ruimte_id UBIGINT,
+                voorkomen_id INTEGER,
+                status TEXT,
+                begindatum_geldigheid DATE,
+                einddatum_geldigheid DATE);
+        """,
+        'panden': """
+            DROP TABLE IF EXISTS panden;
+            CREATE TABLE panden (id TEXT PRIMARY KEY,
+                bouwjaar INTEGER,
+                geometry GEOMETRY,
+                -- Footprint of the geometry in RD coordinates: area (m2), centroid and bounding box
+                oppervlakte DOUBLE,
+                rd_x DOUBLE,
+                rd_y DOUBLE,
+                rd_xmin DOUBLE,
+                rd_ymin DOUBLE,
+                rd_xmax DOUBLE,
+                rd_ymax DOUBLE,
+                voorkomen_id INTEGER,
+                status TEXT,
+                begindatum_geldigheid DATE,
+                einddatum_geldigheid DATE);
+        """,
+        'verblijfsobjecten': """
+            DROP TABLE IF EXISTS verblijfsobjecten;
+            CREATE TABLE verblijfsobjecten (
+                id TEXT PRIMARY KEY,
+                nummer_id TEXT,
+                pand_id TEXT[],
+                oppervlakte DOUBLE,
+                rd_x DOUBLE,
+                rd_y DOUBLE,
+                latitude DOUBLE,
+                longitude DOUBLE,
+                lon_lat GEOMETRY,
+                gebruiksdoel TEXT[],
+                nevenadressen TEXT[],
+                voorkomen_id INTEGER,
+                status TEXT,
+                begindatum_geldigheid DATE,
+                einddatum_geldigheid DATE);
+        """,
+        'ligplaatsen': """
+            DROP TABLE IF EXISTS ligplaatsen;
+            CREATE TABLE ligplaatsen (
+                id TEXT PRIMARY KEY,
+                nummer_id TEXT,
+                rd_x DOUBLE,
+                rd_y DOUBLE,
+                latitude DOUBLE,
+                longitude DOUBLE,
+                lon_lat GEOMETRY,
+                geometry GEOMETRY,
+                voorkomen_id INTEGER,
+                status TEXT,
+                begindatum_geldigheid DATE,
+                einddatum_geldigheid DATE);
+        """,
+        'standplaatsen': """
+            DROP TABLE IF EXISTS standplaatsen;
+            CREATE TABLE standplaatsen (
+                id TEXT PRIMARY KEY,
+                nummer_id TEXT,
+                rd_x DOUBLE,
+                rd_y DOUBLE,
+                latitude DOUBLE,
+                longitude DOUBLE,
+                lon_lat GEOMETRY,
+                geometry GEOMETRY,
+                voorkomen_id INTEGER,
+                status TEXT,
+                begindatum_geldigheid DATE,
+                einddatum_geldigheid DATE);
+
+        """,
+    }
+
+    def __init__(self, read_only=False, file_db=None):
+        self.connection = duckdb.connect(file_db if file_db else config.file_db_duckdb, read_only=read_only)
         # self.connection = duckdb.connect()
         # install and load extensions
         self.connection.execute(f"""
@@ -72,16 +213,61 @@ class DatabaseDuckdb:
         self.connection.execute(f"COPY FROM DATABASE bag TO {db_name}")
         self.connection.execute(f"DETACH {db_name};")
 
+    def save_table_parquet(self, table_name, file_name):
+        self.connection.execute(f"COPY {table_name} TO '{file_name}' (FORMAT parquet, COMPRESSION zstd)")
+
+    def load_table_parquet(self, table_name, file_name, create=False):
+        # Insert into an existing (empty) table or create the table. Columns are in the same order as saved.
+        if create:
+            self.connection.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM read_parquet('{file_name}')")
+        else:
+            self.connection.execute(f"INSERT INTO {table_name} SELECT * FROM read_parquet('{file_name}')")
+
+    @classmethod
+    def bag_table_schema(cls, table_name):
+        # Column names and polars types of a BAG table, from its DDL
+        if table_name not in cls.bag_table_schemas:
+            ddl = re.sub(r'--[^\n]*', '', cls.BAG_TABLES[table_name])
+            columns = ddl[re.search(r'CREATE TABLE \w+ \(', ddl).end():]
+            cls.bag_table_schemas[table_name] = {
+                name: cls.POLARS_TYPES[column_type]
+                for name, column_type in re.findall(r'(?:^|,)\s*(\w+)\s+(\w+(?:\[])?)', columns)}
+        return cls.bag_table_schemas[table_name]
+
+    def dataframe(self, table_name, datarows):
+        # The parsed rows with the schema of the table, without inferring the types from the rows. Fields that are not
+        # a column of the table are left out. Empty strings are saved as NULL.
+        start_time = time.perf_counter()
+        schema = self.bag_table_schema(table_name)
+        list_columns = [name for name, column_type in schema.items() if column_type == self.POLARS_TYPES['TEXT[]']]
+        df = pl.from_dicts(datarows, schema={name: column_type for name, column_type in schema.items()
+                                             if name not in list_columns})
+        # List columns directly from the lists of the workers, an empty list is saved as NULL
+        lists = [pl.Series(name, [row.get(name) or None for row in datarows], schema[name]) for name in list_columns]
+        df = df.with_columns(pl.when(pl.col(pl.String) != '').then(pl.col(pl.String)).name.keep(), *lists)
+        utils.metrics.add_time('insert_dataframe', time.perf_counter() - start_time, table=table_name)
+        return df.select(list(schema))
+
+    @staticmethod
+    def geometry_sql():
+        # Geometry of the parsed rows: GeoJSON in WGS84 or WKT in RD (config.geometry_crs)
+        if not config.parse_geometries:
+            return "NULL"
+        if config.geometry_crs == 'RD':
+            return "st_geomfromtext(geometry)"
+        return "st_geomfromgeojson(geometry::json)"
+
     def save_woonplaats(self, datarows):
-        df = pl.from_dicts(datarows, schema_overrides=self.schema_overrides, infer_schema_length=None)
-        geom = "st_geomfromgeojson(geometry::json) as geometry" if config.parse_geometries else "NULL as geometry"
+        df = self.dataframe('woonplaatsen', datarows)
+        geom = f"{self.geometry_sql()} as geometry"
 
         self.connection.execute(
-            f"""INSERT INTO woonplaatsen (woonplaats_id, naam, geometry, status, begindatum_geldigheid, einddatum_geldigheid) select
+            f"""INSERT INTO woonplaatsen (woonplaats_id, naam, geometry, voorkomen_id, status, begindatum_geldigheid, einddatum_geldigheid) select
             id as woonplaatsen_id,
             naam,
             -- geometry,
             {geom},
+            voorkomen_id,
             status,
             begindatum_geldigheid,
             einddatum_geldigheid
@@ -123,13 +309,7 @@ class DatabaseDuckdb:
             utils.print_log(str(e), error=True)
 
     def save_gemeente_woonplaats(self, datarows):
-        df = pl.from_dicts(datarows, schema_overrides=self.schema_overrides, infer_schema_length=None)
-        df.with_columns(
-            pl.when(pl.col(pl.String).str.len_chars() == 0)
-            .then(None)
-            .otherwise(pl.col(pl.String))
-            .name.keep()
-        )
+        df = self.dataframe('gemeente_woonplaatsen', datarows)
         # print(df)
         try:
             self.connection.execute("INSERT INTO gemeente_woonplaatsen SELECT "
@@ -140,7 +320,7 @@ class DatabaseDuckdb:
                                     "einddatum_geldigheid"
                                     " FROM df")
         except Exception as e:
-            print(e, flush=True)
+            utils.print_log_repeated(str(e), f"insert errors of type {type(e).__name__} in gemeente_woonplaatsen")
             # print(df.dtypes, flush=True)
 
     def add_gemeenten_to_woonplaatsen(self):
@@ -152,13 +332,7 @@ class DatabaseDuckdb:
 
     def save_openbare_ruimte(self, datarows):
         try:
-            df = pl.from_dicts(datarows, schema_overrides=self.schema_overrides, infer_schema_length=None)
-            df.with_columns(
-                pl.when(pl.col(pl.String).str.len_chars() == 0)
-                .then(None)
-                .otherwise(pl.col(pl.String))
-                .name.keep()
-            )
+            df = self.dataframe('openbare_ruimten', datarows)
 
             self.connection.execute("INSERT OR REPLACE INTO openbare_ruimten SELECT "
                                     "id, "
@@ -167,23 +341,18 @@ class DatabaseDuckdb:
                                     "verkorte_naam, "
                                     "type, "
                                     "woonplaats_id,"
+                                    "voorkomen_id,"
                                     "status,"
                                     "begindatum_geldigheid,"
                                     "einddatum_geldigheid"
                                     " FROM df ORDER BY id ASC")
         except pl.exceptions.ComputeError as e:
-            utils.print_log(str(e), error=True)
+            utils.print_log_repeated(str(e), f"insert errors of type {type(e).__name__} in openbare_ruimten")
         except Exception as e:
-            utils.print_log(str(e), error=True)
+            utils.print_log_repeated(str(e), f"insert errors of type {type(e).__name__} in openbare_ruimten")
 
     def save_nummer(self, datarows):
-        df = pl.from_dicts(datarows, schema_overrides=self.schema_overrides, infer_schema_length=None)
-        df.with_columns(
-            pl.when(pl.col(pl.String).str.len_chars() == 0)
-            .then(None)
-            .otherwise(pl.col(pl.String))
-            .name.keep()
-        )
+        df = self.dataframe('nummers', datarows)
         try:
             self.connection.execute("INSERT OR REPLACE INTO nummers SELECT "
                                     "id,postcode,huisnummer,"
@@ -191,221 +360,298 @@ class DatabaseDuckdb:
                                     "toevoeging,"
                                     "woonplaats_id,"
                                     "openbare_ruimte_id,"
+                                    "voorkomen_id,"
                                     "status,"
                                     "begindatum_geldigheid,"
                                     "einddatum_geldigheid"
                                     " FROM df ORDER BY id ASC")
         except Exception as e:
-            print(e, flush=True)
+            utils.print_log_repeated(str(e), f"insert errors of type {type(e).__name__} in nummers")
             # print(df.dtypes, flush=True)
 
     def save_pand(self, datarows):
         try:
-            df = pl.from_dicts(datarows, schema_overrides=self.schema_overrides, infer_schema_length=None)
-            df.with_columns(
-                pl.when(pl.col(pl.String).str.len_chars() == 0)
-                .then(None)
-                .otherwise(pl.col(pl.String))
-                .name.keep()
-            )
-
-            geom = "st_geomfromgeojson(geometry::json)" if config.parse_geometries else "NULL"
+            df = self.dataframe('panden', datarows)
+
+            geom = self.geometry_sql()
             self.connection.execute("INSERT OR REPLACE INTO panden SELECT "
                                     "id, bouwjaar, "
                                     f"{geom} as geometry,"
                                     # "geometry,"
+                                    "oppervlakte,"
+                                    "rd_x,"
+                                    "rd_y,"
+                                    "rd_xmin,"
+                                    "rd_ymin,"
+                                    "rd_xmax,"
+                                    "rd_ymax,"
+                                    "voorkomen_id,"
                                     "status,"
                                     "begindatum_geldigheid,"
                                     "einddatum_geldigheid"
                                     " FROM df ORDER BY id ASC")
         except Exception as e:
-            utils.print_log(str(e), error=True)
+            utils.print_log_repeated(str(e), f"insert errors of type {type(e).__name__} in panden")
 
     def save_verblijfsobject(self, datarows):
         try:
-            df = pl.from_dicts(datarows, schema_overrides=self.schema_overrides, infer_schema_length=None)
-            df.with_columns(
-                pl.when(pl.col(pl.String).str.len_chars() == 0)
-                .then(None)
-                .otherwise(pl.col(pl.String))
-                .name.keep()
-            )
+            df = self.dataframe('verblijfsobjecten', datarows)
 
             self.connection.execute("INSERT OR REPLACE INTO verblijfsobjecten SELECT "
                                     "id,nummer_id,pand_id,"
-                                    "try_cast(oppervlakte as double) as oppervlakte,"
-                                    "try_cast(rd_x as double) as rd_x ,"
-                                    "try_cast(rd_y as double) as rd_y,"
-                                    "try_cast(latitude as double) as latitude,"
-                                    "try_cast(longitude as double) as longitude,"
+                                    "oppervlakte,"
+                                    "rd_x,"
+                                    "rd_y,"
+                                    "latitude,"
+                                    "longitude,"
                                     "NULL as lon_lat,"
                                     "gebruiksdoel,"
                                     "nevenadressen,"
+                                    "voorkomen_id,"
                                     "status,"
                                     "begindatum_geldigheid,"
                                     "einddatum_geldigheid"
                                     " FROM df ORDER BY nummer_id ASC")
         except Exception as e:
-            utils.print_log(str(e), error=True)
+            utils.print_log_repeated(str(e), f"insert errors of type {type(e).__name__} in verblijfsobjecten")
 
     def save_ligplaats(self, datarows):
         try:
-            df = pl.from_dicts(datarows, schema_overrides=self.schema_overrides, infer_schema_length=None)
-            df.with_columns(
-                pl.when(pl.col(pl.String).str.len_chars() == 0)
-                .then(None)
-                .otherwise(pl.col(pl.String))
-                .name.keep()
-            )
-
-            geom = "st_geomfromgeojson(geometry::json)" if config.parse_geometries else "NULL"
+            df = self.dataframe('ligplaatsen', datarows)
+
+            geom = self.geometry_sql()
             self.connection.execute("INSERT OR REPLACE INTO ligplaatsen SELECT "
                                     "id,nummer_id,"
-                                    "try_cast(rd_x as double) as rd_x ,"
-                                    "try_cast(rd_y as double) as rd_y,"
-                                    "try_cast(latitude as double) as latitude,"
-                                    "try_cast(longitude as double) as longitude,"
+                                    "rd_x,"
+                                    "rd_y,"
+                                    "latitude,"
+                                    "longitude,"
                                     "NULL as lon_lat,"
                                     f"{geom} as geometry,"
+                                    "voorkomen_id,"
                                     "status,"
                                     "begindatum_geldigheid,"
                                     "einddatum_geldigheid"
                                     " FROM df ORDER BY nummer_id ASC")
         except Exception as e:
-            utils.print_log(str(e), error=True)
+            utils.print_log_repeated(str(e), f"insert errors of type {type(e).__name__} in ligplaatsen")
 
     def save_standplaats(self, datarows):
         try:
-            df = pl.from_dicts(datarows, schema_overrides=self.schema_overrides, infer_schema_length=None)
-            df.with_columns(
-                pl.when(pl.col(pl.String).str.len_chars() == 0)
-                .then(None)
-                .otherwise(pl.col(pl.String))
-                .name.keep()
-            )
-
-            geom = "st_geomfromgeojson(geometry::json)" if config.parse_geometries else "NULL"
+            df = self.dataframe('standplaatsen', datarows)
+
+            geom = self.geometry_sql()
             self.connection.execute("INSERT OR REPLACE INTO standplaatsen SELECT "
                                     "id,nummer_id,"
-                                    "try_cast(rd_x as double) as rd_x ,"
-                                    "try_cast(rd_y as double) as rd_y,"
-                                    "try_cast(latitude as double) as latitude,"
-                                    "try_cast(longitude as double) as longitude,"
+                                    "rd_x,"
+                                    "rd_y,"
+                                    "latitude,"
+                                    "longitude,"
                                     "NULL as lon_lat,"
                                     f"{geom} as geometry,"
+                                    "voorkomen_id,"
                                     "status,"
                                     "begindatum_geldigheid,"
                                     "einddatum_geldigheid"
                                     " FROM df ORDER BY nummer_id ASC")
         except Exception as e:
-            utils.print_log(str(e), error=True)
+            utils.print_log_repeated(str(e), f"insert errors of type {type(e).__name__} in standplaatsen")
 
     def create_bag_tables(self):
-        self.connection.execute("""
-            DROP TABLE IF EXISTS woonplaatsen;
-            CREATE OR REPLACE SEQUENCE seq_wpid START 1;
-            CREATE TABLE woonplaatsen (
-                id UBIGINT PRIMARY KEY DEFAULT NEXTVAL('seq_wpid'),
-                woonplaats_id UBIGINT,
-                naam TEXT,
-                gemeente_id UBIGINT,
-                geometry GEOMETRY,
-                status TEXT,
-                begindatum_geldigheid TEXT,
-                einddatum_geldigheid TEXT);
-            
-            DROP TABLE IF EXISTS gemeente_woonplaatsen;
-            CREATE TABLE gemeente_woonplaatsen (
-                gemeente_id UBIGINT,
-                woonplaats_id UBIGINT,
-                status TEXT, 
-                begindatum_geldigheid DATE, 
-                einddatum_geldigheid DATE
-            );              
-
-            DROP TABLE IF EXISTS openbare_ruimten;
-            CREATE TABLE openbare_ruimten (
-                id UBIGINT PRIMARY KEY,
-                naam TEXT,
-                -- lange_naam TEXT,
-                verkorte_naam TEXT, 
-                type TEXT,
-                woonplaats_id UBIGINT,
-                status TEXT,
-                begindatum_geldigheid DATE,
-                einddatum_geldigheid DATE);
-
-            DROP TABLE IF EXISTS nummers;
-            CREATE TABLE nummers (
-                id TEXT PRIMARY KEY, 
-                postcode TEXT, 
-                huisnummer INTEGER, 
-                huisletter TEXT,
-                toevoeging TEXT, 
-                woonplaats_id UBIGINT, 
-                openbare_ruimte_id UBIGINT,
-                status TEXT, 
-                begindatum_geldigheid DATE, 
-                einddatum_geldigheid DATE);
-
-            DROP TABLE IF EXISTS panden;
-            CREATE TABLE panden (id TEXT PRIMARY KEY, 
-                bouwjaar INTEGER, 
-                geometry GEOMETRY,
-                status TEXT, 
-                begindatum_geldigheid DATE, 
-                einddatum_geldigheid DATE);
+        for table_name in self.BAG_TABLES:
+            self.create_bag_table(table_name)
+        self.create_import_status()
+        self.create_geometry_macros()
+
+    def create_geometry_macros(self):
+        # geometry_wgs84(geometry) and geometry_rd(geometry) give the geometries in a query in either coordinate
+        # system, regardless of the geometry_crs of the import
+        to_wgs84 = "ST_Transform(geometry, 'EPSG:28992', 'EPSG:4326', true)"
+        to_rd = "ST_Transform(geometry, 'EPSG:4326', 'EPSG:28992', true)"
+        rd = config.geometry_crs == 'RD'
+        self.connection.execute(f"""
+            CREATE OR REPLACE MACRO geometry_wgs84(geometry) AS {to_wgs84 if rd else 'geometry'};
+            CREATE OR REPLACE MACRO geometry_rd(geometry) AS {'geometry' if rd else to_rd};
+            """)
 
-            DROP TABLE IF EXISTS verblijfsobjecten;
-            CREATE TABLE verblijfsobjecten (
-                id TEXT PRIMARY KEY, 
-                nummer_id TEXT, 
-                pand_id TEXT, 
-                oppervlakte DOUBLE, 
-                rd_x DOUBLE, 
-                rd_y DOUBLE, 
-                latitude DOUBLE, 
-                longitude DOUBLE, 
-                lon_lat GEOMETRY, 
-                gebruiksdoel TEXT, 
-                nevenadressen TEXT,
-                status TEXT, 
-                begindatum_geldigheid DATE, 
-                einddatum_geldigheid DATE);           
+    def geometry_crs(self):
+        # Coordinate system of the geometries in the database, from the settings of the import
+        if self.table_exists('import_status'):
+            settings = self.connection.execute("SELECT settings FROM import_status LIMIT 1").fetchone()
+            if settings and settings[0]:
+                return json.loads(settings[0]).get('geometry_crs', 'WGS84')
+        return 'WGS84'
+
+    def create_bag_table(self, table_name, all_versions=False):
+        # (Re)create an empty BAG table. all_versions: with the primary key of history mode, also with active_only.
+        sql = self.BAG_TABLES[table_name]
+        if all_versions or not config.active_only:
+            sql = self.history_table_sql(table_name, sql)
+        self.connection.execute(sql)
 
-            DROP TABLE IF EXISTS ligplaatsen;
-            CREATE TABLE ligplaatsen (
-                id TEXT PRIMARY KEY, 
-                nummer_id TEXT, 
-                rd_x DOUBLE, 
-                rd_y DOUBLE, 
-                latitude DOUBLE, 
-                longitude DOUBLE,
-                lon_lat GEOMETRY, 
-                geometry GEOMETRY, 
-                status TEXT, 
-                begindatum_geldigheid DATE, 
-                einddatum_geldigheid DATE);              
+    def keep_versions_valid_on(self, table_name, peildatum):
+        # Replace a table with all versions (see create_bag_table) by the table with only the versions valid on
+        # peildatum, like the date filter of the parser with active_only. Used for the parse cache.
+        one_version = "QUALIFY row_number() OVER (PARTITION BY id ORDER BY voorkomen_id DESC) = 1" \
+            if self.HISTORY_TABLES.get(table_name) == 'id' else ""
+        self.connection.execute(f"""
+            CREATE OR REPLACE TEMP TABLE bag_versies AS
+            SELECT * FROM {table_name}
+            WHERE begindatum_geldigheid <= DATE '{peildatum}'
+                AND (einddatum_geldigheid IS NULL OR einddatum_geldigheid > DATE '{peildatum}')
+            {one_version}
+            """)
+        self.create_bag_table(table_name)
+        self.connection.execute(f"INSERT INTO {table_name} SELECT * FROM bag_versies; DROP TABLE bag_versies;")
+
+    @classmethod
+    def history_table_sql(cls, table_name, sql):
+        # History mode (active_only = False) keeps all versions of an object: the primary key is the id plus the
+        # version (voorkomen), instead of only the id. Corrections in the BAG often start on the same date as the
+        # version they correct, so the begin date is not unique. Woonplaatsen keep their primary key, a new id
+        # from seq_wpid for every row.
+        if cls.HISTORY_TABLES.get(table_name) != 'id':
+            return sql
+        sql, count = re.subn(r'\bid (TEXT|UBIGINT) PRIMARY KEY,', r'id \1,', sql)
+        if not count:
+            raise Exception(f"Geen primary key id in de DDL van tabel {table_name}")
+        return sql.rstrip()[:-2] + ",\n                PRIMARY KEY (id, voorkomen_id));"
+
+    def sort_history_tables(self):
+        # Store the versions sorted on object id and begin date, so the min/max statistics of the row groups let
+        # queries on an object or a date skip most of the table
+        for table_name, object_id in self.HISTORY_TABLES.items():
+            primary_key = 'id' if object_id != 'id' else 'id, voorkomen_id'
+            with utils.metrics.span('history_sort', table=table_name):
+                self.connection.execute(f"""
+                    CREATE OR REPLACE TABLE {table_name} AS
+                    SELECT * FROM {table_name} ORDER BY {object_id}, begindatum_geldigheid, voorkomen_id;
+                    ALTER TABLE {table_name} ADD PRIMARY KEY ({primary_key});
+                    """)
+
+    def create_history_macros(self):
+        # adressen_as_of(peildatum) gives the adressen table as it was on a date, from the versions of the objects
+        # valid on that date. The validity intervals are half open: a version is valid from its begin date up to
+        # (not including) its end date, the begin date of the next version.
+        self.connection.execute("""
+            CREATE OR REPLACE MACRO geldig_op(begindatum, einddatum, peildatum) AS
+                begindatum <= peildatum AND (einddatum IS NULL OR einddatum > peildatum);
+
+            CREATE OR REPLACE MACRO adressen_as_of(peildatum) AS TABLE
+            WITH
+                n AS (SELECT * FROM nummers WHERE status = 'Naamgeving uitgegeven'
+                      AND geldig_op(begindatum_geldigheid, einddatum_geldigheid, peildatum::DATE)),
+                o AS (SELECT * FROM openbare_ruimten WHERE status = 'Naamgeving uitgegeven'
+                      AND geldig_op(begindatum_geldigheid, einddatum_geldigheid, peildatum::DATE)),
+                gw AS (SELECT * FROM gemeente_woonplaatsen
+                       WHERE geldig_op(begindatum_geldigheid, einddatum_geldigheid, peildatum::DATE)),
+                v AS (SELECT * FROM verblijfsobjecten
+                      WHERE geldig_op(begindatum_geldigheid, einddatum_geldigheid, peildatum::DATE)),
+                p AS (SELECT * FROM panden
+                      WHERE geldig_op(begindatum_geldigheid, einddatum_geldigheid, peildatum::DATE)),
+                l AS (SELECT * FROM ligplaatsen
+                      WHERE geldig_op(begindatum_geldigheid, einddatum_geldigheid, peildatum::DATE)),
+                s AS (SELECT * FROM standplaatsen
+                      WHERE geldig_op(begindatum_geldigheid, einddatum_geldigheid, peildatum::DATE)),
+                -- The panden of each verblijfsobject combined, like adressen_import_meerdere_panden
+                vp AS (
+                    SELECT
+                        vo.id,
+                        list(vo.pand_id ORDER BY vo.pand_id) AS pand_id,
+                        min(p.bouwjaar) AS bouwjaar,
+                        CASE WHEN count(p.geometry) > 1 THEN st_collect(list(p.geometry))
+                             ELSE first(p.geometry) END AS geometry,
+                        sum(p.oppervlakte) AS pand_oppervlakte,
+                        sum(p.rd_x * p.oppervlakte) / nullif(sum(p.oppervlakte), 0) AS pand_rd_x,
+                        sum(p.rd_y * p.oppervlakte) / nullif(sum(p.oppervlakte), 0) AS pand_rd_y,
+                        min(p.rd_xmin) AS pand_rd_xmin,
+                        min(p.rd_ymin) AS pand_rd_ymin,
+                        max(p.rd_xmax) AS pand_rd_xmax,
+                        max(p.rd_ymax) AS pand_rd_ymax,
+                        max(p.begindatum_geldigheid) AS pand_begindatum_geldigheid,
+                        max(p.einddatum_geldigheid) AS pand_einddatum_geldigheid
+                    FROM (SELECT id, unnest(pand_id) AS pand_id FROM v) vo
+                    LEFT JOIN p ON p.id = vo.pand_id
+                    GROUP BY vo.id),
+                neven AS (
+                    SELECT unnest(nevenadressen) AS neven_nummer_id, nummer_id AS hoofd_nummer_id
+                    FROM v WHERE nevenadressen IS NOT NULL)
+            SELECT
+                n.id AS nummer_id,
+                n.begindatum_geldigheid AS nummer_begindatum_geldigheid,
+                n.einddatum_geldigheid AS nummer_einddatum_geldigheid,
+                vp.pand_id,
+                vp.pand_begindatum_geldigheid,
+                vp.pand_einddatum_geldigheid,
+                v.id AS verblijfsobject_id,
+                gw.gemeente_id,
+                coalesce(n.woonplaats_id, o.woonplaats_id) AS woonplaats_id,
+                o.id AS openbare_ruimte_id,
+                CASE WHEN l.id IS NOT NULL THEN 'ligplaats'
+                     WHEN s.id IS NOT NULL THEN 'standplaats'
+                     ELSE 'verblijfsobject' END AS object_type,
+                v.gebruiksdoel,
+                n.postcode,
+                n.huisnummer,
+                n.huisletter,
+                n.toevoeging,
+                v.oppervlakte,
+                coalesce(l.rd_x, s.rd_x, v.rd_x) AS rd_x,
+                coalesce(l.rd_y, s.rd_y, v.rd_y) AS rd_y,
+                coalesce(l.longitude, s.longitude, v.longitude) AS longitude,
+                coalesce(l.latitude, s.latitude, v.latitude) AS latitude,
+                st_point(coalesce(l.longitude, s.longitude, v.longitude),
+                         coalesce(l.latitude, s.latitude, v.latitude)) AS lon_lat,
+                vp.bouwjaar,
+                neven.hoofd_nummer_id,
+                coalesce(l.geometry, s.geometry, vp.geometry) AS geometry,
+                vp.pand_oppervlakte,
+                vp.pand_rd_x,
+                vp.pand_rd_y,
+                vp.pand_rd_xmin,
+                vp.pand_rd_ymin,
+                vp.pand_rd_xmax,
+                vp.pand_rd_ymax
+            FROM n
+              LEFT JOIN o     ON o.id                 = n.openbare_ruimte_id
+              LEFT JOIN gw    ON gw.woonplaats_id     = o.woonplaats_id
+              LEFT JOIN v     ON v.nummer_id          = n.id
+              LEFT JOIN vp    ON vp.id                = v.id
+              LEFT JOIN l     ON l.nummer_id          = n.id
+              LEFT JOIN s     ON s.nummer_id          = n.id
+              LEFT JOIN neven ON neven.neven_nummer_id = n.id;
+            """)
 
-            DROP TABLE IF EXISTS standplaatsen;
-            CREATE TABLE standplaatsen (
-                id TEXT PRIMARY KEY, 
-                nummer_id TEXT, 
-                rd_x DOUBLE, 
-                rd_y DOUBLE, 
-                latitude DOUBLE, 
-                longitude DOUBLE, 
-                lon_lat GEOMETRY, 
-                geometry GEOMETRY, 
-                status TEXT, 
-                begindatum_geldigheid DATE, 
-                einddatum_geldigheid DATE);              
-        """)
+    def create_adressen_as_of(self, peildatum=None, table_name='adressen'):
+        # Builds an adressen table for a date (default: today) from a database imported in history mode
+        peildatum = peildatum or utils.bag_date_today()
+        utils.print_log(f"create {table_name} tabel op peildatum {peildatum}")
+        start_time = time.perf_counter()
+        self.connection.execute(f"""
+            CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM adressen_as_of('{peildatum}');
+            ALTER TABLE {table_name} ADD PRIMARY KEY (nummer_id);
+            """)
+        if table_name == 'adressen':
+            self.set_info('adressen_peildatum', peildatum)
+        count = self.fetchone(f"SELECT COUNT(*) FROM {table_name}")
+        utils.metrics.count('rows_inserted', count, table=table_name)
+        utils.print_log(f"create {table_name} tabel ready | adressen: {count:n} | {utils.time_elapsed(start_time)}")
+
+    def geldig_op_peildatum(self, alias):
+        # Join condition for the version of a BAG object that was valid on the date of the adressen table. Only
+        # needed in history mode, otherwise the BAG tables only contain the active version of each object.
+        peildatum = self.get_info('adressen_peildatum')
+        if not peildatum:
+            return ""
+        return f" AND geldig_op({alias}.begindatum_geldigheid, {alias}.einddatum_geldigheid, DATE '{peildatum}')"
 
     def create_adressen_from_bag(self):
 
         utils.print_log('create adressen tabel: import adressen')
+        # The adressen of the active versions, see geldig_op_peildatum
+        self.set_info('adressen_peildatum', '')
 
+        start_time = time.perf_counter()
         # Use CTAS (Create Table As Select) since it is ~ 30% faster
         # than creating a table first and then inserting values
         # A primary key column cannot be created that way,
@@ -416,7 +662,7 @@ class DatabaseDuckdb:
                 n.id AS nummer_id,
                 n.begindatum_geldigheid as nummer_begindatum_geldigheid,
                 n.einddatum_geldigheid as nummer_einddatum_geldigheid,
-                split(p.id, e'\t') as pand_id,
+                CASE WHEN p.id IS NOT NULL THEN v.pand_id END as pand_id,
                 p.begindatum_geldigheid as pand_begindatum_geldigheid,
                 p.einddatum_geldigheid as pand_einddatum_geldigheid,
                 v.id AS verblijfsobject_id,
@@ -424,7 +670,7 @@ class DatabaseDuckdb:
                 o.woonplaats_id as woonplaats_id,
                 o.id as openbare_ruimte_id,
                 'verblijfsobject' as object_type,
-                split(v.gebruiksdoel,e'\t') as gebruiksdoel,
+                v.gebruiksdoel,
                 n.postcode as postcode,
                 n.huisnummer as huisnummer,
                 n.huisletter as huisletter,
@@ -437,37 +683,56 @@ class DatabaseDuckdb:
                 v.lon_lat,
                 p.bouwjaar,
                 NULL::TEXT as hoofd_nummer_id,
-                p.geometry
+                p.geometry,
+                p.oppervlakte as pand_oppervlakte,
+                p.rd_x as pand_rd_x,
+                p.rd_y as pand_rd_y,
+                p.rd_xmin as pand_rd_xmin,
+                p.rd_ymin as pand_rd_ymin,
+                p.rd_xmax as pand_rd_xmax,
+                p.rd_ymax as pand_rd_ymax
             FROM nummers n
             LEFT JOIN openbare_ruimten o  ON o.id            = n.openbare_ruimte_id
             LEFT JOIN woonplaatsen w      ON w.woonplaats_id = o.woonplaats_id
             LEFT JOIN verblijfsobjecten v ON v.nummer_id     = n.id
-            LEFT JOIN panden p            ON v.pand_id       = p.id;
+            -- Only the first pand, verblijfsobjecten with multiple panden are replaced by adressen_import_meerdere_panden
+            LEFT JOIN panden p            ON p.id            = v.pand_id[1];
         """)
+        utils.metrics.add_time('adressen_step', time.perf_counter() - start_time, step='import adressen')
 
         utils.print_log('create adressen tabel: set primary key')
-        self.connection.execute("""
-            ALTER TABLE adressen ADD PRIMARY KEY (nummer_id);
-        """)
+        with utils.metrics.span('adressen_step', step='primary key'):
+            self.connection.execute("""
+                ALTER TABLE adressen ADD PRIMARY KEY (nummer_id);
+            """)
 
         utils.print_log('create adressen tabel: importeer pand info voor adressen met meerdere panden')
-        self.adressen_import_meerdere_panden()
+        with utils.metrics.span('adressen_step', step='meerdere panden'):
+            self.adressen_import_meerdere_panden()
 
         utils.print_log('create adressen tabel: import ligplaatsen data')
-        self.adressen_import_ligplaatsen()
+        with utils.metrics.span('adressen_step', step='ligplaatsen'):
+            self.adressen_import_ligplaatsen()
 
         utils.print_log('create adressen tabel: import standplaatsen data')
-        self.adressen_import_standplaatsen()
+        with utils.metrics.span('adressen_step', step='standplaatsen'):
+            self.adressen_import_standplaatsen()
 
         utils.print_log('create adressen tabel: import woonplaatsen from nummers')
-        self.adressen_update_woonplaatsen_from_nummers()
+        with utils.metrics.span('adressen_step', step='woonplaatsen'):
+            self.adressen_update_woonplaatsen_from_nummers()
 
         utils.print_log('create adressen tabel: update nevenadressen data')
-        self.adressen_update_nevenadressen()
+        with utils.metrics.span('adressen_step', step='nevenadressen'):
+            self.adressen_update_nevenadressen()
 
         utils.print_log('create adressen tabel: fill lon_lat column from longitude/latitude')
-        self.connection.execute(
-            "UPDATE adressen SET lon_lat=st_point(longitude, latitude) WHERE lon_lat is NULL and longitude is not NULL and latitude is not NULL")
+        with utils.metrics.span('adressen_step', step='lon_lat'):
+            self.connection.execute(
+                "UPDATE adressen SET lon_lat=st_point(longitude, latitude) WHERE lon_lat is NULL and longitude is not NULL and latitude is not NULL")
+
+        count = self.connection.execute("SELECT count(*) FROM adressen").fetchone()[0]
+        utils.metrics.count('rows_inserted', count, table='adressen')
 
         # Creating R-Tree index disabled as it can slow down specific queries significantly...
         # utils.print_log('create adressen tabel: Create R-Tree index on geometry column')
@@ -480,14 +745,117 @@ class DatabaseDuckdb:
 
         # self.connection.commit()
 
+    def create_adressen_export(self):
+        # Denormalized adressen table with all names resolved, so exports need no joins.
+        # The names are stored as ENUM types, which DuckDB stores as dictionary codes.
+        utils.print_log('create adressen_export tabel')
+        start_time = time.perf_counter()
+
+        self.connection.execute("""
+            DROP TABLE IF EXISTS adressen_export;
+            DROP TYPE IF EXISTS straat_naam;
+            DROP TYPE IF EXISTS woonplaats_naam;
+            DROP TYPE IF EXISTS gemeente_naam;
+            DROP TYPE IF EXISTS gemeente_code;
+            DROP TYPE IF EXISTS provincie_naam;
+            DROP TYPE IF EXISTS provincie_code;
+            CREATE TYPE straat_naam AS ENUM (SELECT DISTINCT naam FROM openbare_ruimten WHERE naam IS NOT NULL);
+            CREATE TYPE woonplaats_naam AS ENUM (SELECT DISTINCT naam FROM woonplaatsen WHERE naam IS NOT NULL);
+            CREATE TYPE gemeente_naam AS ENUM (SELECT DISTINCT naam FROM gemeenten WHERE naam IS NOT NULL);
+            CREATE TYPE gemeente_code AS ENUM (SELECT DISTINCT gm_code FROM gemeenten WHERE gm_code IS NOT NULL);
+            CREATE TYPE provincie_naam AS ENUM (SELECT DISTINCT naam FROM provincies WHERE naam IS NOT NULL);
+            CREATE TYPE provincie_code AS ENUM (SELECT DISTINCT pv_code FROM provincies WHERE pv_code IS NOT NULL);
+        """)
+
+        self.connection.execute(f"""
+            CREATE TABLE adressen_export AS
+            SELECT
+                a.*,
+                o.naam::straat_naam        AS straat,
+                w.naam::woonplaats_naam    AS woonplaats,
+                g.naam::gemeente_naam      AS gemeente,
+                g.gm_code::gemeente_code   AS gm_code,
+                p.naam::provincie_naam     AS provincie,
+                p.pv_code::provincie_code  AS pv_code
+            FROM adressen a
+              LEFT JOIN openbare_ruimten o ON a.openbare_ruimte_id = o.id{self.geldig_op_peildatum('o')}
+              LEFT JOIN gemeenten g        ON a.gemeente_id        = g.id
+              LEFT JOIN woonplaatsen w     ON a.woonplaats_id      = w.woonplaats_id{self.geldig_op_peildatum('w')}
+              LEFT JOIN provincies p       ON g.provincie_id       = p.id;
+        """)
+
+        count = self.fetchone("SELECT COUNT(*) FROM adressen_export;")
+        utils.print_log(f"create adressen_export tabel ready | adressen: {count:n} | {utils.time_elapsed(start_time)}")
+
+    def create_adressen_lookup(self):
+        # Compact copy of adressen for point lookups on postcode + huisnummer (+ toevoeging), see geocoder.BagLookup.
+        # Sorted on the lookup key, so the min/max (zonemap) statistics of each row group let DuckDB skip all but
+        # one or two row groups. DuckDB does not use ART indexes for multi-column or parameterized filters.
+        # toevoeging holds huisletter and toevoeging combined, in upper case. Nevenadressen get the location of
+        # their hoofdadres.
+        utils.print_log('create adressen_lookup tabel')
+        start_time = time.perf_counter()
+
+        self.connection.execute("""
+            CREATE OR REPLACE TABLE adressen_lookup AS
+            SELECT
+                a.postcode,
+                a.huisnummer,
+                upper(concat(a.huisletter, a.toevoeging)) AS toevoeging,
+                a.nummer_id,
+                a.object_type,
+                coalesce(a.rd_x, h.rd_x)           AS rd_x,
+                coalesce(a.rd_y, h.rd_y)           AS rd_y,
+                coalesce(a.latitude, h.latitude)   AS latitude,
+                coalesce(a.longitude, h.longitude) AS longitude,
+                a.bouwjaar,
+                a.oppervlakte,
+                a.woonplaats_id,
+                a.gemeente_id,
+                g.naam    AS gemeente,
+                g.gm_code AS gm_code
+            FROM adressen a
+              LEFT JOIN adressen h  ON a.hoofd_nummer_id = h.nummer_id
+              LEFT JOIN gemeenten g ON a.gemeente_id = g.id
+            WHERE a.postcode IS NOT NULL AND a.huisnummer IS NOT NULL
+            ORDER BY a.postcode, a.huisnummer, toevoeging;
+        """)
+
+        utils.print_log(f"create adressen_lookup tabel ready | {utils.time_elapsed(start_time)}")
+
+    def create_adressen_grid(self, cell_size):
+        # Uniform grid over the RD coordinates of the (hoofd)adressen for reverse geocoding, see
+        # geocoder.ReverseGeocoder. Sorted on grid cell, so a lookup of the cells around a point only
+        # reads a few row groups. Nevenadressen are left out, they have the location of their hoofdadres.
+        utils.print_log(f'create adressen_grid tabel | cel grootte: {cell_size}m')
+        start_time = time.perf_counter()
+
+        self.connection.execute(f"""
+            CREATE OR REPLACE TABLE adressen_grid AS
+            SELECT
+                floor(rd_x / {cell_size})::INTEGER AS cel_x,
+                floor(rd_y / {cell_size})::INTEGER AS cel_y,
+                nummer_id,
+                postcode,
+                huisnummer,
+                upper(concat(huisletter, toevoeging)) AS toevoeging,
+                rd_x,
+                rd_y,
+                latitude,
+                longitude
+            FROM adressen
+            WHERE rd_x IS NOT NULL AND rd_y IS NOT NULL AND hoofd_nummer_id IS NULL
+            ORDER BY cel_x, cel_y;
+        """)
+        self.set_info('adressen_grid_cell_size', cell_size)
+
+        utils.print_log(f"create adressen_grid tabel ready | {utils.time_elapsed(start_time)}")
+
     def adressen_import_meerdere_panden(self):
 
         # Verblijfsobjecten can be linked to multiple Panden (case for roughly 33k5 of them)
-        # In initial ingestion these are encoded as \t (tab) separated pand_id-s in
-        # the verblijfsobjecten table.
-        # meaning that initial insert into adressen table will not match for these instances
-        # (because a combined pand_id in verblijfsobjecten table will not be equal to any
-        # id in the panden table).
+        # The pand_id column of the verblijfsobjecten table is a list, the initial insert into
+        # the adressen table only joins the panden of verblijfsobjecten with a single pand_id.
         # In the end we want to combine the geometries of all Panden involved and take
         # the earliest bouwjaar (year of build), since having bouwjaar as a list is a bit
         # of a pain.
@@ -501,8 +869,8 @@ class DatabaseDuckdb:
         # unnest multiple pand_id-s
         self.connection.execute("""
             CREATE OR REPLACE TEMP VIEW temp_vo_pand_id AS
-            SELECT id, unnest(split(pand_id, e'\t')) AS pand_id
-            FROM verblijfsobjecten where pand_id like e'%\t%';
+            SELECT id, unnest(pand_id) AS pand_id
+            FROM verblijfsobjecten WHERE len(pand_id) > 1;
         """)
         # Create another view which combines with geometry
         self.connection.execute("""
@@ -512,6 +880,14 @@ class DatabaseDuckdb:
                 list(v.pand_id) as pand_id,
                 min(bouwjaar) as bouwjaar,
                 st_collect(list(p.geometry)) as geometry,
+                -- Combined footprint: total area, area weighted centroid and the bounding box of all panden
+                sum(p.oppervlakte) as pand_oppervlakte,
+                sum(p.rd_x * p.oppervlakte) / nullif(sum(p.oppervlakte), 0) as pand_rd_x,
+                sum(p.rd_y * p.oppervlakte) / nullif(sum(p.oppervlakte), 0) as pand_rd_y,
+                min(p.rd_xmin) as pand_rd_xmin,
+                min(p.rd_ymin) as pand_rd_ymin,
+                max(p.rd_xmax) as pand_rd_xmax,
+                max(p.rd_ymax) as pand_rd_ymax,
                 max(p.begindatum_geldigheid) as pand_begindatum_geldigheid,
                 max(p. einddatum_geldigheid) as pand_einddatum_geldigheid
             FROM temp_vo_pand_id v LEFT JOIN panden p ON v.pand_id = p.id
@@ -553,7 +929,14 @@ class DatabaseDuckdb:
                 latitude,
                 lon_lat,
                 bouwjaar,
-                geometry)
+                geometry,
+                pand_oppervlakte,
+                pand_rd_x,
+                pand_rd_y,
+                pand_rd_xmin,
+                pand_rd_ymin,
+                pand_rd_xmax,
+                pand_rd_ymax)
             SELECT
                 n.id AS nummer_id,
                 n.begindatum_geldigheid,
@@ -566,7 +949,7 @@ class DatabaseDuckdb:
                 o.woonplaats_id,
                 o.id,
                 'verblijfsobject',
-                split(v.gebruiksdoel,e'\t') as gebruiksdoel,
+                v.gebruiksdoel,
                 n.postcode,
                 n.huisnummer,
                 n.huisletter,
@@ -578,7 +961,14 @@ class DatabaseDuckdb:
                 v.latitude,
                 v.lon_lat,
                 v.bouwjaar,
-                v.geometry
+                v.geometry,
+                v.pand_oppervlakte,
+                v.pand_rd_x,
+                v.pand_rd_y,
+                v.pand_rd_xmin,
+                v.pand_rd_ymin,
+                v.pand_rd_xmax,
+                v.pand_rd_ymax
             FROM nummers n
             RIGHT JOIN openbare_ruimten o  ON o.id            = n.openbare_ruimte_id
             RIGHT JOIN woonplaatsen w      ON w.woonplaats_id = o.woonplaats_id
@@ -632,7 +1022,7 @@ class DatabaseDuckdb:
         self.connection.execute("""
             CREATE OR REPLACE TEMP VIEW nevenadressen AS
             SELECT 
-                unnest(split(nevenadressen, e'\t')) as neven_nummer_id,
+                unnest(nevenadressen) as neven_nummer_id,
                 nummer_id as hoofd_nummer_id
             FROM verblijfsobjecten 
             WHERE nevenadressen IS NOT NULL;
@@ -794,6 +1184,53 @@ class DatabaseDuckdb:
             self.connection.execute("DELETE FROM adressen WHERE openbare_ruimte_id IS NULL "
                                     "OR openbare_ruimte_id NOT IN (SELECT id FROM openbare_ruimten)")
 
+    def set_info(self, key, value):
+        # Key/value store for information about the database itself, e.g. settings used when creating a table
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS bag_info (key TEXT PRIMARY KEY, value TEXT);
+            """)
+        self.connection.execute("INSERT OR REPLACE INTO bag_info VALUES (?, ?)", [key, str(value)])
+
+    def get_info(self, key, default=None):
+        if not self.table_exists('bag_info'):
+            return default
+        row = self.connection.execute("SELECT value FROM bag_info WHERE key = ?", [key]).fetchone()
+        return row[0] if row else default
+
+    def create_import_status(self):
+        # Completed phases of the import, so an interrupted import can be resumed (import_bag.py --resume)
+        self.connection.execute("""
+            CREATE OR REPLACE TABLE import_status (
+                phase TEXT PRIMARY KEY,
+                row_count UBIGINT,
+                bag_fingerprint TEXT,
+                settings TEXT,
+                ready TIMESTAMP);
+            """)
+
+    def set_import_phase_ready(self, phase, table_name, bag_fingerprint, settings):
+        if table_name and not self.table_exists(table_name):
+            # The phase failed (e.g. gemeenten file not readable), it is run again on resume
+            utils.print_log(f"resume: tabel {table_name} bestaat niet, fase {phase} niet klaar", error=True)
+            return
+
+        row_count = self.fetchone(f"SELECT count(*) FROM {table_name}") if table_name else None
+        self.connection.execute("INSERT OR REPLACE INTO import_status VALUES (?, ?, ?, ?, current_localtimestamp())",
+                                [phase, row_count, bag_fingerprint, settings])
+
+    def import_phases_ready(self, bag_fingerprint, settings):
+        # Completed phases of an earlier import of the same BAG file with the same settings
+        if not self.table_exists('import_status'):
+            return set()
+
+        rows = self.connection.execute("SELECT phase, bag_fingerprint, settings FROM import_status").fetchall()
+        if any(row[1] != bag_fingerprint or row[2] != settings for row in rows):
+            utils.print_log("resume: database is gemaakt met een ander BAG bestand of andere instellingen. "
+                            "Volledige import", error=True)
+            return set()
+
+        return {row[0] for row in rows}
+
     def table_exists(self, table_name):
         # Check if database contains adressen tabel
         count = self.fetchone(
@@ -1,13 +1,33 @@
 # Export DuckDB BAG to csv or other format
+import json
 
+import config
 import utils
 from database_duckdb import DatabaseDuckdb
 
+# Smaller row groups give bbox filters on the exported (Geo)Parquet file more to skip,
+# at the expense of a slightly larger file.
+GEOPARQUET_ROW_GROUP_SIZE = 65536
+
+# DuckDB ST_GeometryType names to GeoParquet geometry_types names
+GEOPARQUET_GEOMETRY_TYPES = {
+    'POINT': 'Point',
+    'LINESTRING': 'LineString',
+    'POLYGON': 'Polygon',
+    'MULTIPOINT': 'MultiPoint',
+    'MULTILINESTRING': 'MultiLineString',
+    'MULTIPOLYGON': 'MultiPolygon',
+    'GEOMETRYCOLLECTION': 'GeometryCollection',
+}
+
+
 class Exporter:
 
-    def __init__(self):
-        self.database = DatabaseDuckdb()
+    def __init__(self, database=None):
+        self.database = database if database else DatabaseDuckdb()
         self.total_adressen = 0
+        # Read from the denormalized adressen_export table if the database has one
+        self.use_adressen_export = True
 
     def __export(self, output_filename, export_options, sql):
 
@@ -31,24 +51,105 @@ class Exporter:
             self.database.connection.execute(sqlcmd)
             self.database.connection.execute(f"DETACH export;")
 
+    def _geometry(self):
+        # The geometries are transformed (vectorized by DuckDB) if they are stored in another coordinate system than
+        # config.export_geometry_crs
+        database_crs = self.database.geometry_crs()
+        if database_crs == config.export_geometry_crs:
+            return "a.geometry"
+        if database_crs == 'RD':
+            return "ST_Transform(a.geometry, 'EPSG:28992', 'EPSG:4326', true)"
+        return "ST_Transform(a.geometry, 'EPSG:4326', 'EPSG:28992', true)"
+
     def _lon_lat_export(self, output_filename, export_geometry=False):
         exp_geom = ""
         exp_lon_lat = ""
+        geometry = self._geometry() if export_geometry else None
         if output_filename.endswith('.parquet'):
             exp_lon_lat = "a.lon_lat AS lon_lat,"
-            exp_geom = "a.geometry AS geometry" if export_geometry else ""
+            exp_geom = f"{geometry} AS geometry" if export_geometry else ""
         elif output_filename.endswith('.json'):
             exp_lon_lat = "st_asgeojson(a.lon_lat) AS lon_lat,"
-            exp_geom = "st_asgeojson(a.geometry) as geometry " if export_geometry else ""
+            exp_geom = f"st_asgeojson({geometry}) as geometry " if export_geometry else ""
         elif output_filename.endswith('.tsv'):
             exp_lon_lat = "st_astext(a.lon_lat) AS lon_lat,"
-            exp_geom = "st_astext(a.geometry) as geometry " if export_geometry else ""
+            exp_geom = f"st_astext({geometry}) as geometry " if export_geometry else ""
         elif output_filename.endswith('.duckdb'):
             exp_lon_lat = "a.lon_lat AS lon_lat,"
-            exp_geom = "a.geometry as geometry " if export_geometry else ""
+            exp_geom = f"{geometry} as geometry " if export_geometry else ""
 
         return exp_geom, exp_lon_lat
 
+    def _adressen_from(self, *names):
+        # Returns the FROM clause and the column expressions of the requested names (straat, woonplaats, gemeente,
+        # gm_code, provincie, pv_code). The adressen_export table already contains these, otherwise only the
+        # lookup tables that are needed for the requested names are joined. In history mode only the versions of
+        # the openbare ruimten and woonplaatsen that were valid on the date of the adressen table.
+        if self.use_adressen_export and self.database.table_exists('adressen_export'):
+            return "adressen_export a", {name: f"a.{name}::VARCHAR" for name in names}
+
+        columns = {
+            'straat': 'o.naam',
+            'woonplaats': 'w.naam',
+            'gemeente': 'g.naam',
+            'gm_code': 'g.gm_code',
+            'provincie': 'p.naam',
+            'pv_code': 'p.pv_code',
+        }
+        joins = ''
+        if 'straat' in names:
+            joins += ("\n  LEFT JOIN openbare_ruimten o ON a.openbare_ruimte_id = o.id" +
+                      self.database.geldig_op_peildatum('o'))
+        if {'gemeente', 'gm_code', 'provincie', 'pv_code'} & set(names):
+            joins += "\n  LEFT JOIN gemeenten g        ON a.gemeente_id        = g.id"
+        if 'woonplaats' in names:
+            joins += ("\n  LEFT JOIN woonplaatsen w     ON a.woonplaats_id      = w.woonplaats_id" +
+                      self.database.geldig_op_peildatum('w'))
+        if {'provincie', 'pv_code'} & set(names):
+            joins += "\n  LEFT JOIN provincies p       ON g.provincie_id       = p.id"
+
+        return "adressen a" + joins, {name: columns[name] for name in names}
+
+    def _geoparquet_geometry_types(self, column):
+        if not self.database.table_exists('adressen'):
+            return []
+        rows = self.database.fetchall(
+            f"SELECT DISTINCT ST_GeometryType({column}) FROM adressen WHERE {column} IS NOT NULL")
+        return sorted(GEOPARQUET_GEOMETRY_TYPES[str(row[0])] for row in rows)
+
+    def _geoparquet_options(self, export_options, export_geometry=False):
+        # GeoParquet 1.1 metadata with a bbox covering column for each geometry column, so readers
+        # (DuckDB, GDAL, polars, ...) can use the row group statistics of the bbox columns to skip row groups.
+        # DuckDB only writes GeoParquet 1.0 metadata (without covering) itself, so write our own.
+        columns = {
+            'lon_lat': {
+                'encoding': 'WKB',
+                'geometry_types': ['Point'],
+                'covering': {'bbox': {
+                    'xmin': ['bbox', 'xmin'],
+                    'ymin': ['bbox', 'ymin'],
+                    'xmax': ['bbox', 'xmax'],
+                    'ymax': ['bbox', 'ymax'],
+                }},
+            },
+        }
+        if export_geometry:
+            columns['geometry'] = {
+                'encoding': 'WKB',
+                'geometry_types': self._geoparquet_geometry_types('geometry'),
+                # Without crs GeoParquet readers assume WGS84 (OGC:CRS84)
+                **({'crs': {'id': {'authority': 'EPSG', 'code': 28992}}} if config.export_geometry_crs == 'RD' else {}),
+                'covering': {'bbox': {
+                    'xmin': ['geometry_bbox', 'xmin'],
+                    'ymin': ['geometry_bbox', 'ymin'],
+                    'xmax': ['geometry_bbox', 'xmax'],
+                    'ymax': ['geometry_bbox', 'ymax'],
+                }},
+            }
+        geo = {'version': '1.1.0', 'primary_column': 'lon_lat', 'columns': columns}
+
+        return (export_options[:-1] + f", ROW_GROUP_SIZE {GEOPARQUET_ROW_GROUP_SIZE}, GEOPARQUET_VERSION 'NONE', "
+                                      f"KV_METADATA {{geo: '{json.dumps(geo)}'}})")
 
     def export(self, output_filename, export_options, export_geometry=False):
         # exp_geom = ""
@@ -67,17 +168,44 @@ class Exporter:
         #     exp_geom = "a.geometry as geometry " if export_geometry else ""
         exp_geom, exp_lon_lat = self._lon_lat_export(output_filename, export_geometry)
 
+        exp_bbox = ""
+        order_by = ""
+        if output_filename.endswith('.parquet'):
+            # bbox covering columns. For the lon_lat points these are simply the coordinates.
+            exp_bbox = ("{'xmin': a.longitude, 'ymin': a.latitude, "
+                        "'xmax': a.longitude, 'ymax': a.latitude} AS bbox,")
+            if export_geometry:
+                geometry = self._geometry()
+                exp_bbox += (f"{{'xmin': ST_XMin({geometry}), 'ymin': ST_YMin({geometry}), "
+                             f"'xmax': ST_XMax({geometry}), 'ymax': ST_YMax({geometry})}} AS geometry_bbox,")
+            # Order rows along a Hilbert curve, so that nearby addresses end up in the same row groups
+            # and the bbox statistics of each row group cover only a small area.
+            order_by = """
+                ORDER BY ST_Hilbert(a.longitude, a.latitude, (
+                  SELECT {'min_x': min(longitude), 'min_y': min(latitude),
+                          'max_x': max(longitude), 'max_y': max(latitude)}::BOX_2D
+                  FROM adressen))
+            """
+            export_options = self._geoparquet_options(export_options, export_geometry)
+
+        # gebruiksdoel is a list. Parquet, JSON and DuckDB keep the list, text formats get the values separated by
+        # commas instead of a DuckDB list literal.
+        exp_gebruiksdoel = "a.gebruiksdoel"
+        if output_filename.endswith(('.tsv', '.csv')):
+            exp_gebruiksdoel = "array_to_string(a.gebruiksdoel, ',')"
+
+        from_sql, names = self._adressen_from('straat', 'gemeente', 'gm_code', 'woonplaats', 'provincie', 'pv_code')
         sql = f"""
                 SELECT
-                  o.naam                       AS straat,
+                  {names['straat']}            AS straat,
                   a.huisnummer,
                   concat(a.huisletter,a.toevoeging) AS toevoeging,
                   a.postcode,
-                  g.naam                       AS gemeente,
-                  g.gm_code                    AS gm_code,
-                  w.naam                       AS woonplaats,
-                  p.naam                       AS provincie,
-                  p.pv_code                    AS pv_code,
+                  {names['gemeente']}          AS gemeente,
+                  {names['gm_code']}           AS gm_code,
+                  {names['woonplaats']}        AS woonplaats,
+                  {names['provincie']}         AS provincie,
+                  {names['pv_code']}           AS pv_code,
                   a.bouwjaar,
                   a.rd_x,
                   a.rd_y,
@@ -85,33 +213,30 @@ class Exporter:
                   a.longitude,
                   {exp_lon_lat}
                   a.oppervlakte                AS vloeroppervlakte,
-                  a.gebruiksdoel,
+                  {exp_gebruiksdoel}           AS gebruiksdoel,
                   a.hoofd_nummer_id,
+                  {exp_bbox}
                   {exp_geom}
-                FROM adressen a
-                  LEFT JOIN openbare_ruimten o ON a.openbare_ruimte_id = o.id
-                  LEFT JOIN gemeenten g        ON a.gemeente_id        = g.id
-                  LEFT JOIN woonplaatsen w     ON a.woonplaats_id      = w.woonplaats_id
-                  LEFT JOIN provincies p       ON g.provincie_id       = p.id
+                FROM {from_sql}
+                {order_by}
         """
 
         self.__export(output_filename, export_options, sql)
 
     def export_postcode(self, output_filename, export_options, is_parquet=False):
         exp_geom, exp_lon_lat = self._lon_lat_export(output_filename)
+        from_sql, names = self._adressen_from('straat', 'woonplaats')
         sql = f"""
             SELECT
-              o.naam                       AS straat,
+              {names['straat']}            AS straat,
               a.huisnummer,
               concat(a.huisletter,a.toevoeging) AS toevoeging,
               a.postcode,
               a.latitude,
               a.longitude,
               {exp_lon_lat}
-              w.naam                       AS woonplaats
-            FROM adressen a
-              LEFT JOIN openbare_ruimten o ON a.openbare_ruimte_id = o.id
-              LEFT JOIN woonplaatsen w     ON a.woonplaats_id      = w.woonplaats_id
+              {names['woonplaats']}        AS woonplaats
+            FROM {from_sql}
         """
 
         self.__export(output_filename, export_options, sql)
@@ -119,6 +244,7 @@ class Exporter:
     def export_postcode4_stats(self, output_filename, export_options):
         exp_geom, exp_lon_lat = self._lon_lat_export(output_filename)
         exp_lon_lat = exp_lon_lat.replace("a.lon_lat", "ST_Centroid(ST_Collect(list(a.lon_lat)))")
+        from_sql, names = self._adressen_from('woonplaats')
         sql = f"""
           SELECT
             SUBSTR(a.postcode, 0, 5) AS pc4,
@@ -126,9 +252,8 @@ class Exporter:
             AVG(a.longitude)         AS center_lon,
             {exp_lon_lat}
             COUNT(1)                 AS aantal_adressen,
-            FIRST(w.naam)            AS woonplaats
-          FROM adressen a
-            LEFT JOIN woonplaatsen w ON a.woonplaats_id = w.woonplaats_id
+            FIRST({names['woonplaats']}) AS woonplaats
+          FROM {from_sql}
           WHERE a.postcode <> ''
           GROUP BY pc4
         """
@@ -137,6 +262,7 @@ class Exporter:
     def export_postcode5_stats(self, output_filename, export_options):
         exp_geom, exp_lon_lat = self._lon_lat_export(output_filename)
         exp_lon_lat = exp_lon_lat.replace("a.lon_lat", "ST_Centroid(ST_Collect(list(a.lon_lat)))")
+        from_sql, names = self._adressen_from('woonplaats')
         sql = f"""
           SELECT
             SUBSTR(a.postcode, 0, 6) AS pc5,
@@ -144,9 +270,8 @@ class Exporter:
             AVG(a.longitude)         AS center_lon,
             {exp_lon_lat}
             COUNT(1)                 AS aantal_adressen,
-            FIRST(w.naam)            AS woonplaats
-          FROM adressen a
-            LEFT JOIN woonplaatsen w ON a.woonplaats_id = w.woonplaats_id
+            FIRST({names['woonplaats']}) AS woonplaats
+          FROM {from_sql}
           WHERE a.postcode <> ''
           GROUP BY pc5
         """
@@ -156,6 +281,7 @@ class Exporter:
     def export_postcode6_stats(self, output_filename, export_options):
         exp_geom, exp_lon_lat = self._lon_lat_export(output_filename)
         exp_lon_lat = exp_lon_lat.replace("a.lon_lat", "ST_Centroid(ST_Collect(list(a.lon_lat)))")
+        from_sql, names = self._adressen_from('woonplaats')
         sql = f"""
           SELECT
             a.postcode       AS pc6,
@@ -163,9 +289,8 @@ class Exporter:
             AVG(a.longitude) AS center_lon,
             {exp_lon_lat}
             COUNT(1)         AS aantal_adressen,
-            FIRST(w.naam)    AS woonplaats
-          FROM adressen a
-            LEFT JOIN woonplaatsen w ON a.woonplaats_id = w.woonplaats_id
+            FIRST({names['woonplaats']}) AS woonplaats
+          FROM {from_sql}
           WHERE a.postcode <> ''
           GROUP BY pc6
         """
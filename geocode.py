@@ -0,0 +1,28 @@
+#! /usr/bin/env python3
+from argparse import ArgumentParser
+
+from geocoder import BatchGeocoder
+
+parser = ArgumentParser(description='Geocode a CSV or Parquet file with addresses (postcode, huisnummer, toevoeging) '
+                                    'against the adressen in the DuckDB database')
+
+parser.add_argument('input', help="CSV or Parquet file with addresses")
+
+helpText = "Output file with matched addresses (default: output/geocoded.parquet). Use a .csv extension for CSV"
+parser.add_argument('-o', '--output', default='output/geocoded.parquet', help=helpText)
+
+helpText = "Output file with unmatched addresses (default: output/geocoded_unmatched.parquet)"
+parser.add_argument('-u', '--unmatched', default='output/geocoded_unmatched.parquet', help=helpText)
+
+helpText = "Name of the postcode column (default: postcode)"
+parser.add_argument('--postcode', default='postcode', help=helpText)
+
+helpText = "Name of the huisnummer column (default: huisnummer)"
+parser.add_argument('--huisnummer', default='huisnummer', help=helpText)
+
+helpText = "Name of the huisletter/toevoeging column (default: toevoeging)"
+parser.add_argument('--toevoeging', default='toevoeging', help=helpText)
+
+args = parser.parse_args()
+
+BatchGeocoder().geocode_file(args.input, args.output, args.unmatched, args.postcode, args.huisnummer, args.toevoeging)
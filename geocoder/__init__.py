@@ -0,0 +1,3 @@
+from geocoder.bag_lookup import BagLookup
+from geocoder.reverse_geocoder import ReverseGeocoder
+from geocoder.batch_geocoder import BatchGeocoder
@@ -0,0 +1,110 @@
+# Address lookups on postcode + huisnummer (+ huisletter/toevoeging) from Python, e.g. in a web service
+from collections import OrderedDict
+
+import polars as pl
+
+from database_duckdb import DatabaseDuckdb
+
+LOOKUP_COLUMNS = ['nummer_id', 'object_type', 'rd_x', 'rd_y', 'latitude', 'longitude', 'bouwjaar', 'oppervlakte',
+                  'woonplaats_id', 'gemeente_id', 'gemeente', 'gm_code']
+
+
+class BagLookup:
+
+    def __init__(self, database=None, cache_size=100000):
+        self.database = database if database else DatabaseDuckdb(read_only=True)
+        if not self.database.table_exists('adressen_lookup'):
+            raise Exception("DuckDB database bevat geen adressen_lookup tabel. "
+                            "Zet create_adressen_lookup_table in config.py aan en importeer BAG opnieuw.")
+
+        # Own cursor, so lookups can run next to other queries on the same database
+        self.cursor = self.database.connection.cursor()
+        self.columns = ', '.join(f"l.{column}" for column in LOOKUP_COLUMNS)
+        self.sql_lookup = (f"SELECT {self.columns} FROM adressen_lookup l "
+                           "WHERE l.postcode = $postcode AND l.huisnummer = $huisnummer AND l.toevoeging = $toevoeging")
+
+        # LRU cache of lookup results. Addresses that are not found are cached as None.
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @staticmethod
+    def key(postcode, huisnummer, toevoeging=None):
+        # Normalize to the adressen_lookup format: '1071 xx' -> '1071XX', toevoeging 'a-2' -> 'A2'
+        postcode = postcode.replace(' ', '').upper()
+        toevoeging = ''.join(c for c in (toevoeging or '').upper() if c.isalnum())
+        return postcode, int(huisnummer), toevoeging
+
+    def __cache_get(self, key):
+        result = self.cache[key]
+        self.cache.move_to_end(key)
+        self.cache_hits += 1
+        return result
+
+    def __cache_put(self, key, result):
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def lookup(self, postcode, huisnummer, toevoeging=None):
+        # Returns a dict with the LOOKUP_COLUMNS of the address, or None if the address does not exist.
+        key = self.key(postcode, huisnummer, toevoeging)
+        if key in self.cache:
+            return self.__cache_get(key)
+
+        self.cache_misses += 1
+        row = self.cursor.execute(self.sql_lookup, {
+            'postcode': key[0],
+            'huisnummer': key[1],
+            'toevoeging': key[2]}).fetchone()
+        result = dict(zip(LOOKUP_COLUMNS, row)) if row else None
+        self.__cache_put(key, result)
+        return result
+
+    def lookup_many(self, addresses):
+        # Batched lookup of a list of (postcode, huisnummer, toevoeging) tuples. All addresses that are not in the
+        # cache are looked up in a single join. Returns a list of results in the same order as addresses.
+        keys = [self.key(*address) for address in addresses]
+        results = {}
+        missing = []
+        for key in keys:
+            if key in results:
+                continue
+            if key in self.cache:
+                results[key] = self.__cache_get(key)
+            else:
+                results[key] = None
+                missing.append(key)
+
+        if missing:
+            self.cache_misses += len(missing)
+            df_keys = pl.DataFrame(missing, orient='row', schema={
+                'postcode': pl.String,
+                'huisnummer': pl.Int32,
+                'toevoeging': pl.String})
+            rows = self.cursor.execute(f"""
+                SELECT k.postcode, k.huisnummer, k.toevoeging, {self.columns}
+                FROM df_keys k
+                  JOIN adressen_lookup l
+                    ON l.postcode = k.postcode AND l.huisnummer = k.huisnummer AND l.toevoeging = k.toevoeging
+                """).fetchall()
+            for row in rows:
+                results[row[0:3]] = dict(zip(LOOKUP_COLUMNS, row[3:]))
+            for key in missing:
+                self.__cache_put(key, results[key])
+
+        return [results[key] for key in keys]
+
+    def cache_info(self):
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self.cache),
+            'max_size': self.cache_size,
+        }
+
+    def cache_clear(self):
+        self.cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
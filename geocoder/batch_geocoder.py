@@ -0,0 +1,140 @@
+# Batch geocoding of a CSV or Parquet file with addresses (postcode, huisnummer, toevoeging) against adressen
+import time
+
+import utils
+from database_duckdb import DatabaseDuckdb
+
+# Match quality codes (match_kwaliteit column):
+#   exact       postcode, huisnummer and huisletter + toevoeging found
+#   huisnummer  postcode and huisnummer found, toevoeging not. Geocoded to the address without (or with the
+#               lowest) toevoeging of that huisnummer
+#   postcode    only the postcode found. Geocoded to the average location of the addresses of the postcode
+#   onbekend    postcode not found (unmatched)
+#   ongeldig    no valid postcode or huisnummer in the input (unmatched)
+MATCHED = ('exact', 'huisnummer', 'postcode')
+
+
+class BatchGeocoder:
+
+    def __init__(self, database=None):
+        self.database = database if database else DatabaseDuckdb(read_only=True)
+
+    @staticmethod
+    def __export_options(filename):
+        return "(FORMAT parquet)" if filename.endswith('.parquet') else "(HEADER)"
+
+    def geocode_file(self, input_filename, output_filename, unmatched_filename,
+                     postcode_column='postcode', huisnummer_column='huisnummer', toevoeging_column='toevoeging'):
+        utils.print_log(f"start: geocode '{input_filename}'")
+        start_time = time.perf_counter()
+        connection = self.database.connection
+
+        # The input is read into a table first. With preserve_insertion_order DuckDB stores the rows in the order
+        # of the file, so the rowid of the table numbers them for the output in input order.
+        connection.execute("SET preserve_insertion_order = true")
+        connection.execute(f"CREATE OR REPLACE TEMP TABLE geocode_bron AS SELECT * FROM '{input_filename}'")
+        input_columns = [row[0] for row in connection.execute("DESCRIBE geocode_bron").fetchall()]
+        toevoeging = f'"{toevoeging_column}"::VARCHAR' if toevoeging_column in input_columns else "NULL"
+
+        # Normalize the input keys the same way as the BAG keys: postcode without spaces in upper case,
+        # huisletter and toevoeging combined (concat(huisletter, toevoeging)) without separators in upper case.
+        # Huisnummers like '12a' or '12-2' without a separate toevoeging are split into huisnummer and toevoeging.
+        connection.execute(f"""
+            CREATE OR REPLACE TEMP TABLE geocode_invoer AS
+            SELECT
+                *,
+                rowid AS _rij,
+                CASE WHEN regexp_full_match(upper(regexp_replace(coalesce("{postcode_column}"::VARCHAR, ''), '\\s', '', 'g')),
+                                            '[1-9][0-9]{{3}}[A-Z]{{2}}')
+                     THEN upper(regexp_replace("{postcode_column}"::VARCHAR, '\\s', '', 'g')) END AS _postcode,
+                try_cast(regexp_extract("{huisnummer_column}"::VARCHAR, '^\\s*([0-9]+)', 1) AS INTEGER) AS _huisnummer,
+                upper(regexp_replace(
+                    CASE WHEN coalesce({toevoeging}, '') = ''
+                         THEN regexp_extract("{huisnummer_column}"::VARCHAR, '^\\s*[0-9]+(.*)$', 1)
+                         ELSE {toevoeging} END,
+                    '[^0-9A-Za-z]', '', 'g')) AS _toevoeging
+            FROM geocode_bron
+        """)
+        total = self.database.fetchone("SELECT COUNT(*) FROM geocode_invoer")
+
+        # One pass over adressen: exact matches, matches on huisnummer and postcode centroids are all
+        # joined to the input in a single query. Nevenadressen get the location of their hoofdadres.
+        connection.execute("""
+            CREATE OR REPLACE TEMP TABLE geocode_resultaat AS
+            WITH bag AS (
+                SELECT
+                    a.postcode,
+                    a.huisnummer,
+                    upper(concat(a.huisletter, a.toevoeging)) AS toevoeging,
+                    a.nummer_id,
+                    a.object_type,
+                    coalesce(a.rd_x, h.rd_x)          AS rd_x,
+                    coalesce(a.rd_y, h.rd_y)          AS rd_y,
+                    coalesce(a.latitude, h.latitude)   AS latitude,
+                    coalesce(a.longitude, h.longitude) AS longitude,
+                    a.bouwjaar,
+                    a.woonplaats_id,
+                    a.gemeente_id
+                FROM adressen a
+                  LEFT JOIN adressen h ON a.hoofd_nummer_id = h.nummer_id
+                WHERE a.postcode IN (SELECT DISTINCT _postcode FROM geocode_invoer)
+            ),
+            huisnummers AS (
+                SELECT postcode, huisnummer, arg_min(bag, toevoeging) AS adres
+                FROM bag
+                GROUP BY postcode, huisnummer
+            ),
+            postcodes AS (
+                SELECT postcode, avg(rd_x) AS rd_x, avg(rd_y) AS rd_y, avg(latitude) AS latitude,
+                       avg(longitude) AS longitude, any_value(woonplaats_id) AS woonplaats_id,
+                       any_value(gemeente_id) AS gemeente_id
+                FROM bag
+                GROUP BY postcode
+            )
+            SELECT
+                i.* EXCLUDE (_postcode, _huisnummer, _toevoeging),
+                CASE
+                    WHEN i._postcode IS NULL OR i._huisnummer IS NULL THEN 'ongeldig'
+                    WHEN e.nummer_id IS NOT NULL THEN 'exact'
+                    WHEN h.adres IS NOT NULL THEN 'huisnummer'
+                    WHEN p.postcode IS NOT NULL THEN 'postcode'
+                    ELSE 'onbekend'
+                END AS match_kwaliteit,
+                coalesce(e.nummer_id, h.adres.nummer_id)                           AS bag_nummer_id,
+                coalesce(e.object_type, h.adres.object_type)                       AS bag_object_type,
+                coalesce(e.rd_x, h.adres.rd_x, p.rd_x)                             AS bag_rd_x,
+                coalesce(e.rd_y, h.adres.rd_y, p.rd_y)                             AS bag_rd_y,
+                coalesce(e.latitude, h.adres.latitude, p.latitude)                 AS bag_latitude,
+                coalesce(e.longitude, h.adres.longitude, p.longitude)              AS bag_longitude,
+                coalesce(e.bouwjaar, h.adres.bouwjaar)                             AS bag_bouwjaar,
+                coalesce(e.woonplaats_id, h.adres.woonplaats_id, p.woonplaats_id)  AS bag_woonplaats_id,
+                coalesce(e.gemeente_id, h.adres.gemeente_id, p.gemeente_id)        AS bag_gemeente_id
+            FROM geocode_invoer i
+              LEFT JOIN bag e
+                ON e.postcode = i._postcode AND e.huisnummer = i._huisnummer AND e.toevoeging = i._toevoeging
+              LEFT JOIN huisnummers h ON h.postcode = i._postcode AND h.huisnummer = i._huisnummer
+              LEFT JOIN postcodes p ON p.postcode = i._postcode
+        """)
+
+        matched = ", ".join(f"'{code}'" for code in MATCHED)
+        connection.execute(f"""
+            COPY (SELECT * EXCLUDE (_rij) FROM geocode_resultaat WHERE match_kwaliteit IN ({matched}) ORDER BY _rij)
+            TO '{output_filename}' {self.__export_options(output_filename)}
+            """)
+        connection.execute(f"""
+            COPY (SELECT * EXCLUDE (_rij, bag_nummer_id, bag_object_type, bag_rd_x, bag_rd_y, bag_latitude,
+                                    bag_longitude, bag_bouwjaar, bag_woonplaats_id, bag_gemeente_id)
+                  FROM geocode_resultaat WHERE match_kwaliteit NOT IN ({matched}) ORDER BY _rij)
+            TO '{unmatched_filename}' {self.__export_options(unmatched_filename)}
+            """)
+
+        counts = dict(connection.execute(
+            "SELECT match_kwaliteit, COUNT(*) FROM geocode_resultaat GROUP BY match_kwaliteit").fetchall())
+        elapsed_time = time.perf_counter() - start_time
+        rows_per_second = round(total / elapsed_time) if elapsed_time > 0 else 0
+        utils.print_log(f"ready: geocode '{output_filename}' | adressen: {total:n} | "
+                        + ' | '.join(f"{code}: {counts.get(code, 0):n}" for code in MATCHED + ('onbekend', 'ongeldig'))
+                        + f" | {utils.time_elapsed(start_time)} | per seconde: {rows_per_second:,d}")
+
+        connection.execute("DROP TABLE geocode_resultaat; DROP TABLE geocode_invoer; DROP TABLE geocode_bron;")
+        return counts
@@ -0,0 +1,137 @@
+# Reverse geocoder, finds the nearest address to a WGS84 or RD point using the adressen_grid table
+import time
+
+import polars as pl
+
+import utils
+from bag import rijksdriehoek
+from database_duckdb import DatabaseDuckdb
+
+RESULT_COLUMNS = ['nummer_id', 'postcode', 'huisnummer', 'toevoeging', 'rd_x', 'rd_y', 'latitude', 'longitude']
+
+
+class ReverseGeocoder:
+    # Don't search further away than this (in meters). Points without an address within this distance get None.
+    max_distance = 5000
+
+    def __init__(self, database=None):
+        self.database = database if database else DatabaseDuckdb(read_only=True)
+        if not self.database.table_exists('adressen_grid'):
+            raise Exception("DuckDB database bevat geen adressen_grid tabel. "
+                            "Zet create_adressen_grid_table in config.py aan en importeer BAG opnieuw.")
+
+        self.cursor = self.database.connection.cursor()
+        self.cell_size = float(self.database.get_info('adressen_grid_cell_size'))
+        self.columns = ', '.join(f"'{column}': g.{column}" for column in RESULT_COLUMNS)
+
+    def nearest_wgs84(self, latitude, longitude):
+        x, y = rijksdriehoek.wgs84_to_rijksdriehoek(latitude, longitude)
+        return self.nearest_rd(x, y)
+
+    def nearest_rd(self, x, y):
+        # Search the cells within radius cells of the cell of the point, at least the cell itself and its 8
+        # neighbours. The nearest address found is only guaranteed to be the nearest if it lies within
+        # radius * cell_size, otherwise search again with a doubled radius. Once radius * cell_size reaches
+        # max_distance all addresses within max_distance have been searched.
+        cel_x = int(x // self.cell_size)
+        cel_y = int(y // self.cell_size)
+        radius = 1
+        while True:
+            row = self.cursor.execute(f"""
+                SELECT {{{self.columns}}}, sqrt((g.rd_x - $x) ^ 2 + (g.rd_y - $y) ^ 2) AS afstand
+                FROM adressen_grid g
+                WHERE g.cel_x BETWEEN $cel_x - $radius AND $cel_x + $radius
+                  AND g.cel_y BETWEEN $cel_y - $radius AND $cel_y + $radius
+                ORDER BY afstand
+                LIMIT 1
+                """, {'x': x, 'y': y, 'cel_x': cel_x, 'cel_y': cel_y, 'radius': radius}).fetchone()
+
+            if row and row[1] <= radius * self.cell_size:
+                return self.__result(row[0], row[1]) if row[1] <= self.max_distance else None
+            if radius * self.cell_size >= self.max_distance:
+                return None
+            radius *= 2
+
+    def nearest_many_wgs84(self, points):
+        # points: list of (latitude, longitude). Points without a latitude or longitude get None.
+        return self.nearest_many_rd([rijksdriehoek.wgs84_to_rijksdriehoek(lat, lon)
+                                     if lat is not None and lon is not None else (None, None) for lat, lon in points])
+
+    def nearest_many_rd(self, points):
+        # Vectorized version of nearest_rd for a list of (x, y) points. Each round joins all unresolved points
+        # with the grid cells around them in a single query. Returns a list of results in the order of points.
+        results = [None] * len(points)
+        unresolved = list(range(len(points)))
+        radius = 1
+        while unresolved:
+            df_points = pl.DataFrame({
+                'i': unresolved,
+                'x': [points[i][0] for i in unresolved],
+                'y': [points[i][1] for i in unresolved],
+            })
+            rows = self.cursor.execute(f"""
+                WITH cellen AS (
+                    SELECT
+                        p.i, p.x, p.y,
+                        floor(p.x / $cell_size)::INTEGER + dx AS cel_x,
+                        floor(p.y / $cell_size)::INTEGER + dy AS cel_y
+                    FROM df_points p,
+                      range(-$radius, $radius + 1) AS rx(dx),
+                      range(-$radius, $radius + 1) AS ry(dy)
+                )
+                SELECT
+                    c.i,
+                    arg_min({{{self.columns}}}, (g.rd_x - c.x) ^ 2 + (g.rd_y - c.y) ^ 2),
+                    sqrt(min((g.rd_x - c.x) ^ 2 + (g.rd_y - c.y) ^ 2)) AS afstand
+                FROM cellen c
+                  JOIN adressen_grid g ON g.cel_x = c.cel_x AND g.cel_y = c.cel_y
+                GROUP BY c.i
+                """, {'cell_size': self.cell_size, 'radius': radius}).fetchall()
+
+            resolved = set()
+            for i, row, distance in rows:
+                if distance <= radius * self.cell_size:
+                    resolved.add(i)
+                    if distance <= self.max_distance:
+                        results[i] = self.__result(row, distance)
+
+            unresolved = [i for i in unresolved if i not in resolved]
+            if radius * self.cell_size >= self.max_distance:
+                break
+            radius *= 2
+
+        return results
+
+    def nearest_file(self, input_filename, output_filename):
+        # Reverse geocode all points in a CSV or Parquet file with either latitude/longitude or rd_x/rd_y columns.
+        # The output file contains the input columns plus the RESULT_COLUMNS (prefixed with bag_) and afstand.
+        utils.print_log(f"start: reverse geocode '{input_filename}'")
+        start_time = time.perf_counter()
+
+        df_input = self.cursor.execute(f"SELECT * FROM '{input_filename}'").pl()
+        if 'rd_x' in df_input.columns and 'rd_y' in df_input.columns:
+            results = self.nearest_many_rd(list(zip(df_input['rd_x'], df_input['rd_y'])))
+        elif 'latitude' in df_input.columns and 'longitude' in df_input.columns:
+            results = self.nearest_many_wgs84(list(zip(df_input['latitude'], df_input['longitude'])))
+        else:
+            raise Exception(f"'{input_filename}' bevat geen rd_x/rd_y of latitude/longitude kolommen")
+
+        columns = RESULT_COLUMNS + ['afstand']
+        df_results = pl.DataFrame(
+            [[result[column] if result else None for column in columns] for result in results],
+            schema=[f"bag_{column}" if column != 'afstand' else column for column in columns],
+            orient='row', infer_schema_length=None)
+        df_output = pl.concat([df_input, df_results], how='horizontal')
+
+        export_options = "(FORMAT parquet)" if output_filename.endswith('.parquet') else "(HEADER)"
+        self.cursor.execute(f"COPY (SELECT * FROM df_output) TO '{output_filename}' {export_options}")
+
+        found = sum(1 for result in results if result)
+        utils.print_log(f"ready: reverse geocode '{output_filename}' | punten: {len(results):n} | "
+                        f"gevonden: {found:n} | {utils.time_elapsed(start_time)}")
+
+    @staticmethod
+    def __result(row, distance):
+        result = dict(row)
+        result['afstand'] = distance
+        return result
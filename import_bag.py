@@ -1,17 +1,27 @@
 #! /usr/bin/env python3
+import ast
+import json
 import os
 import sys
 import platform
 import time
+from argparse import ArgumentParser
 
 import utils
 import config
 from database_duckdb import DatabaseDuckdb
-from bag.bag_parser import BagParser
+from bag.bag_parser import BagParser, OBJECT_TYPE_TABLES, import_order
 from bag.gemeente_parser import GemeentenParser
+from memory_monitor import MemoryMonitor
+from autotune import AutoTune
 
 
-def main():
+# Settings that change the content of the BAG tables. A resumed import must use the same settings.
+RESUME_SETTINGS = ['active_only', 'parse_geometries', 'geometry_crs', 'geometry_decimals',
+                   'geometry_simplify_tolerance', 'use_short_street_names', 'region_gemeenten', 'region_bbox']
+
+
+def main(resume=False, autotune=False):
     start_time = time.perf_counter()
 
     utils.clear_log()
@@ -22,36 +32,107 @@ def main():
     if not os.path.exists(config.file_bag):
         sys.exit('BAG file not found. See readme.MD')
 
-    temp_folder_name = 'temp'
+    utils.metrics.info = {'version': config.version, 'python': platform.python_version(),
+                          'cpu_cores_used': config.cpu_cores_used, 'parse_geometries': config.parse_geometries,
+                          'active_only': config.active_only, 'region_gemeenten': config.region_gemeenten,
+                          'region_bbox': config.region_bbox}
+
+    memory_monitor = None
+    if config.profile_memory:
+        memory_monitor = MemoryMonitor()
+        memory_monitor.start()
+
+    try:
+        import_bag(resume, autotune, memory_monitor)
+    finally:
+        # Also when the import fails, the memory timeline and peaks help to find out why
+        if memory_monitor:
+            memory_monitor.stop()
+            memory_monitor.write()
+
+    utils.print_log(f"ready: BAG XML to DuckDB database '{config.file_db_duckdb}'")
 
-    # unzip BAG file to temp folder
-    utils.print_log('unzip BAG file to temp folder')
-    if not os.path.exists(temp_folder_name):
-        os.makedirs(temp_folder_name)
-    utils.empty_folder(temp_folder_name)
+    utils.print_log(f"total run time: {utils.time_elapsed(start_time)}")
+
+    utils.metrics.add_time('total', time.perf_counter() - start_time)
+    utils.metrics.write()
 
-    utils.unzip_files_multithreaded(config.file_bag, temp_folder_name)
 
+def import_bag(resume, autotune, memory_monitor):
+    # Creates and fills the database, see main
     db_duckdb = DatabaseDuckdb()
+    if memory_monitor:
+        memory_monitor.set_database(db_duckdb.connection)
+
+    bag_fingerprint = utils.file_fingerprint(config.file_bag)
+    settings = json.dumps({name: getattr(config, name) for name in RESUME_SETTINGS}, sort_keys=True)
+    phases_ready = db_duckdb.import_phases_ready(bag_fingerprint, settings) if resume else set()
+
+    def phase_todo(phase):
+        if phase in phases_ready:
+            utils.print_log(f"resume: {phase} is al klaar, wordt overgeslagen")
+            return False
+        return True
+
+    def phase_ready(phase, table_name=None):
+        db_duckdb.set_import_phase_ready(phase, table_name, bag_fingerprint, settings)
+
+    if phases_ready:
+        utils.print_log(f"resume: import hervatten, klaar: {', '.join(sorted(phases_ready))}")
+    else:
+        resume = False
+        utils.print_log("create BAG DuckDB database structure")
+        with utils.metrics.span('create_tables'):
+            db_duckdb.create_bag_tables()
+
+    temp_folder_name = 'temp'
 
-    utils.print_log("create BAG DuckDB database structure")
-    db_duckdb.create_bag_tables()
+    # unzip BAG file to temp folder. Not needed if all object types were parsed by an import that is resumed
+    if any(object_type not in phases_ready for object_type in OBJECT_TYPE_TABLES):
+        utils.print_log('unzip BAG file to temp folder')
+        if not os.path.exists(temp_folder_name):
+            os.makedirs(temp_folder_name)
+        utils.empty_folder(temp_folder_name)
+
+        with utils.metrics.span('unzip_bag'):
+            utils.unzip_files_multithreaded(config.file_bag, temp_folder_name)
+        utils.metrics.count('bytes_read', os.path.getsize(config.file_bag), object_type='bag')
+
+        if autotune:
+            with utils.metrics.span('autotune'):
+                AutoTune().run(temp_folder_name)
 
     # parse gemeenten csv
-    g_parser = GemeentenParser(db_duckdb)
-    g_parser.parse()
+    if phase_todo('gemeenten'):
+        g_parser = GemeentenParser(db_duckdb)
+        with utils.metrics.span('gemeenten'):
+            g_parser.parse()
+        phase_ready('gemeenten', 'gemeenten')
 
     # parse BAG
-    b_parser = BagParser(db_duckdb)
-
-    b_parser.parse('Woonplaats')
-    b_parser.parse('GemeenteWoonplaatsRelatie')
-    b_parser.parse('OpenbareRuimte')
-    b_parser.parse('Nummeraanduiding')
-    b_parser.parse('Pand')
-    b_parser.parse('Verblijfsobject')
-    b_parser.parse('Ligplaats')
-    b_parser.parse('Standplaats')
+    b_parser = BagParser(db_duckdb, AutoTune().load())
+
+    object_types = import_order()
+    if object_types != list(OBJECT_TYPE_TABLES):
+        utils.print_log(f"regio import: {', '.join(object_types)}")
+    for object_type in object_types:
+        table_name = OBJECT_TYPE_TABLES[object_type]
+        if phase_todo(object_type):
+            if resume:
+                # Remove the rows saved by the interrupted import
+                db_duckdb.create_bag_table(table_name)
+            b_parser.parse(object_type)
+            phase_ready(object_type, table_name)
+
+    b_parser.close()
+    b_parser.log_worker_startup()
+
+    if not config.active_only and phase_todo('history'):
+        utils.print_log('history: sorteer versies op id en begindatum')
+        with utils.metrics.span('history'):
+            db_duckdb.sort_history_tables()
+            db_duckdb.create_history_macros()
+        phase_ready('history')
 
     # utils.print_log('create BAG table indices')
     # db_sqlite.create_indices_bag()
@@ -59,26 +140,112 @@ def main():
     b_parser.add_gemeenten_into_woonplaatsen()
 
     if config.create_adressen_table:
-        if not config.active_only:
-            utils.print_log('addresses table is only created if active_only=True in config', True)
-        else:
-            db_duckdb.create_adressen_from_bag()
-            db_duckdb.adressen_remove_dummy_values()
-            db_duckdb.test_bag_adressen()
-
-            if config.delete_no_longer_needed_bag_tables:
-                utils.print_log('delete no longer needed BAG tables')
+        if phase_todo('adressen'):
+            with utils.metrics.span('adressen'):
+                if config.active_only:
+                    db_duckdb.create_adressen_from_bag()
+                else:
+                    # History mode: the adressen of today, other dates with adressen_as_of
+                    db_duckdb.create_adressen_as_of()
+            with utils.metrics.span('cleaning'):
+                db_duckdb.adressen_remove_dummy_values()
+            if config.region_gemeenten or config.region_bbox:
+                utils.print_log('regio import: tests op de hele BAG overgeslagen')
+            else:
+                with utils.metrics.span('tests'):
+                    db_duckdb.test_bag_adressen()
+            phase_ready('adressen', 'adressen')
+
+        if config.create_adressen_export_table and phase_todo('adressen_export'):
+            with utils.metrics.span('adressen_export'):
+                db_duckdb.create_adressen_export()
+            phase_ready('adressen_export', 'adressen_export')
+
+        if config.create_adressen_lookup_table and phase_todo('adressen_lookup'):
+            with utils.metrics.span('adressen_lookup'):
+                db_duckdb.create_adressen_lookup()
+            phase_ready('adressen_lookup', 'adressen_lookup')
+
+        if config.create_adressen_grid_table and phase_todo('adressen_grid'):
+            with utils.metrics.span('adressen_grid'):
+                db_duckdb.create_adressen_grid(config.adressen_grid_cell_size)
+            phase_ready('adressen_grid', 'adressen_grid')
+
+        if config.delete_no_longer_needed_bag_tables and not config.active_only:
+            utils.print_log('history: BAG tabellen worden niet verwijderd, adressen_as_of heeft ze nodig', True)
+        elif config.delete_no_longer_needed_bag_tables and phase_todo('delete_tables'):
+            utils.print_log('delete no longer needed BAG tables')
+            with utils.metrics.span('delete_tables'):
                 db_duckdb.delete_no_longer_needed_bag_tables()
+            phase_ready('delete_tables')
 
     utils.print_log('cleaning up: vacuum')
 
-    utils.empty_folder(temp_folder_name)
+    with utils.metrics.span('cleanup'):
+        if os.path.exists(temp_folder_name):
+            utils.empty_folder(temp_folder_name)
 
-    db_duckdb.close()
+        if memory_monitor:
+            memory_monitor.stop()
+        db_duckdb.close()
 
-    utils.print_log(f"ready: BAG XML to DuckDB database '{config.file_db_duckdb}'")
 
-    utils.print_log(f"total run time: {utils.time_elapsed(start_time)}")
+def parse_config_overrides(settings):
+    # Settings like ['parse_geometries=True', 'cpu_cores_used=4'] to a dict. Values are Python literals,
+    # anything else is used as string.
+    overrides = {}
+    for setting in settings:
+        name, separator, value = setting.partition('=')
+        if not separator:
+            raise Exception(f"Ongeldige config instelling '{setting}'. Gebruik NAME=VALUE")
+        try:
+            overrides[name.strip()] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            overrides[name.strip()] = value
+
+    return overrides
+
 
 if __name__ == '__main__':
-    main()
+    parser = ArgumentParser(description='Parse the BAG zip file to a DuckDB database')
+
+    helpText = f"BAG zip file (default: {config.file_bag})"
+    parser.add_argument('--bag-file', help=helpText)
+
+    helpText = f"Output DuckDB database (default: {config.file_db_duckdb})"
+    parser.add_argument('--db-file', help=helpText)
+
+    helpText = ("Resume an interrupted import into the same database. Completed object types and phases are skipped, "
+                "the interrupted one is run again")
+    parser.add_argument('--resume', action='store_true', help=helpText)
+
+    helpText = ("Measure the best worker count and insert batch size per object type on this computer before the import. "
+                "Saved and used by later imports")
+    parser.add_argument('--autotune', action='store_true', help=helpText)
+
+    region = parser.add_mutually_exclusive_group()
+    helpText = ("Only import the BAG objects of these gemeenten (gemeentecodes, e.g. 363 for Amsterdam) and the objects "
+                "they reference. For small development and test databases")
+    region.add_argument('--only-gemeente', type=int, nargs='+', metavar='CODE', help=helpText)
+
+    helpText = ("Only import the verblijfsobjecten, ligplaatsen and standplaatsen in this bounding box in RD coordinates "
+                "and the objects they reference")
+    region.add_argument('--bbox', type=float, nargs=4, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'), help=helpText)
+
+    helpText = "Override a setting in config.py, e.g. -c parse_geometries=True. Can be used multiple times"
+    parser.add_argument('-c', '--config', action='append', default=[], metavar='NAME=VALUE', help=helpText)
+
+    args = parser.parse_args()
+
+    overrides = parse_config_overrides(args.config)
+    if args.bag_file:
+        overrides['file_bag'] = args.bag_file
+    if args.db_file:
+        overrides['file_db_duckdb'] = args.db_file
+    if args.only_gemeente:
+        overrides['region_gemeenten'] = args.only_gemeente
+    if args.bbox:
+        overrides['region_bbox'] = args.bbox
+    utils.config_override(overrides)
+
+    main(args.resume, args.autotune)
@@ -1,32 +1,148 @@
+import multiprocessing
 import os
+import queue
 import threading
+import time
+from multiprocessing.util import Finalize
 
 import config
 
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+# Maximum number of messages written to the file at once
+BATCH_SIZE = 1000
+
 
 class Logger:
+    # Log messages are put in a queue and written to the log file in batches by a background thread, so logging does
+    # not block the import. Worker processes (parsing, unzipping) write to their own log file (bag_importer.<pid>.log),
+    # which is only created if a worker logs something.
 
     def __init__(self):
+        self.lock = None
+        self.pid = None
+        self.file_name = None
+        self.file = None
+        self.queue = None
+        self.thread = None
+        self.repeated_messages = {}
+        self.__start()
+
+    def __start(self):
         self.lock = threading.Lock()
-        file_name = config.file_log
-        path = os.path.dirname(file_name)
-        if not os.path.exists(path):
+        self.pid = os.getpid()
+        self.repeated_messages = {}
+        self.file_name = config.file_log
+        if multiprocessing.parent_process() is not None:
+            root, extension = os.path.splitext(config.file_log)
+            self.file_name = f"{root}.{self.pid}{extension}"
+        self.file = None
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.__write_queue, daemon=True)
+        self.thread.start()
+        # Also runs when a worker process ends, atexit handlers do not
+        Finalize(self, self.close, exitpriority=100)
+
+    def __check_process(self):
+        # A forked worker process inherits the logger, but not its writer thread
+        if self.pid != os.getpid():
+            self.__start()
+
+    def __open(self):
+        path = os.path.dirname(self.file_name)
+        if path and not os.path.exists(path):
             os.makedirs(path)
+        self.file = open(self.file_name, "a", encoding='utf-8')
 
-        self.file = open(config.file_log, "a", encoding='utf-8')
+    def __write_queue(self):
+        while True:
+            items = [self.queue.get()]
+            while len(items) < BATCH_SIZE:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
 
-    def clear(self):
-        self.lock.acquire()
+            for item in items:
+                if item is None:
+                    if self.file:
+                        self.file.flush()
+                    return
+                if isinstance(item, threading.Event):
+                    # flush() waits for this
+                    if self.file:
+                        self.file.flush()
+                    item.set()
+                elif item == 'clear':
+                    if not self.file:
+                        self.__open()
+                    self.file.seek(0)
+                    self.file.truncate()
+                else:
+                    if not self.file:
+                        self.__open()
+                    self.file.write(item + '\n')
 
-        self.file.seek(0)
-        self.file.truncate()
+            if self.file:
+                self.file.flush()
 
-        self.lock.release()
+    def clear(self):
+        self.__check_process()
+        self.queue.put('clear')
 
     def log(self, text):
-        self.lock.acquire()
+        self.__check_process()
+        self.queue.put(text)
+
+    def flush(self):
+        # Wait until all queued messages are written
+        self.__check_process()
+        event = threading.Event()
+        self.queue.put(event)
+        event.wait()
+
+    def close(self):
+        if self.pid != os.getpid() or not self.thread.is_alive():
+            return
+        self.queue.put(None)
+        self.thread.join()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def reopen(self):
+        # Write to config.file_log again after it was changed, e.g. with import_bag.py --config file_log=...
+        self.close()
+        self.__start()
+
+    @staticmethod
+    def level_enabled(level):
+        return LOG_LEVELS[level] >= LOG_LEVELS[config.log_level]
+
+    def repeated(self, category):
+        # Rate limiting of repeated messages, like an insert error for each XML file. Returns 0 if the message should
+        # be logged (the first one), the number of suppressed messages to report every log_repeated_interval seconds,
+        # or None if the message is suppressed.
+        self.__check_process()
+        with self.lock:
+            now = time.perf_counter()
+            entry = self.repeated_messages.get(category)
+            if entry is None:
+                self.repeated_messages[category] = {'suppressed': 0, 'time': now}
+                return 0
 
-        self.file.write(text + '\n')
-        self.file.flush()
+            entry['suppressed'] += 1
+            if now - entry['time'] >= config.log_repeated_interval:
+                suppressed = entry['suppressed']
+                entry['suppressed'] = 0
+                entry['time'] = now
+                return suppressed
+            return None
 
-        self.lock.release()
+    def repeated_summary(self):
+        # Number of suppressed messages per category that were not reported yet. Resets the rate limiting.
+        with self.lock:
+            summary = {category: entry['suppressed'] for category, entry in self.repeated_messages.items()
+                       if entry['suppressed'] > 0}
+            self.repeated_messages = {}
+        return summary
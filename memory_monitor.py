@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import psutil
+
+import config
+import utils
+
+
+class MemoryMonitor:
+    # Samples the RSS of the main process and each worker process, plus the memory DuckDB reports, at a fixed
+    # interval in a background thread. Each sample is attributed to the running import phase and object type
+    # (from utils.metrics). Every sample is appended to the timeline file (JSON lines) right away, so the file explains
+    # an import that runs out of memory and is killed. At the end the peaks per phase are logged and written to a
+    # JSON file.
+
+    def __init__(self, interval=None):
+        self.interval = interval or config.profile_memory_interval
+        self.process = psutil.Process()
+        self.cursor = None
+        self.samples = []
+        self.start_time = None
+        self.start_datetime = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.file_timeline = None
+
+    def set_database(self, connection):
+        # A DuckDB connection is not thread safe, a cursor is a separate connection to the same database
+        self.cursor = connection.cursor() if connection else None
+
+    def start(self, file_name=None):
+        file_name = file_name or config.file_memory_timeline
+        self.start_time = time.perf_counter()
+        self.start_datetime = datetime.now()
+
+        path = os.path.dirname(file_name)
+        if path and not os.path.exists(path):
+            os.makedirs(path)
+        self.file_timeline = open(file_name, 'w')
+        # The first line describes the samples that follow
+        self.__write_line({'start': self.start_datetime.isoformat(timespec='seconds'), 'interval': self.interval})
+
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # Can be called more than once
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.set_database(None)
+        if self.file_timeline:
+            self.file_timeline.close()
+            self.file_timeline = None
+
+    def __write_line(self, record):
+        if self.file_timeline:
+            self.file_timeline.write(json.dumps(record) + '\n')
+            self.file_timeline.flush()
+
+    def __run(self):
+        while not self.stop_event.is_set():
+            self.sample()
+            self.stop_event.wait(self.interval)
+
+    def __duckdb_memory(self):
+        if not self.cursor:
+            return None
+        try:
+            return self.cursor.execute("SELECT sum(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0]
+        except Exception:
+            return None
+
+    def sample(self):
+        phase, object_type = utils.metrics.current_phase()
+        workers = {}
+        try:
+            main = self.process.memory_info().rss
+            for child in self.process.children(recursive=True):
+                try:
+                    workers[child.pid] = child.memory_info().rss
+                except psutil.Error:
+                    # Worker ended while sampling
+                    pass
+        except psutil.Error:
+            return
+
+        sample = {
+            'seconds': round(time.perf_counter() - self.start_time, 3),
+            'phase': phase or 'import',
+            'object_type': object_type,
+            'main': main,
+            'workers': workers,
+            'duckdb': self.__duckdb_memory(),
+        }
+        self.samples.append(sample)
+        self.__write_line(sample)
+
+    def peaks(self):
+        # Peak memory (bytes) per phase and object type
+        peaks = {}
+        for sample in self.samples:
+            key = f"{sample['phase']} {sample['object_type']}" if sample['object_type'] else str(sample['phase'])
+            workers = sum(sample['workers'].values())
+            values = {
+                'main': sample['main'],
+                'workers': workers,
+                'worker_max': max(sample['workers'].values(), default=0),
+                'duckdb': sample['duckdb'] or 0,
+                'total': sample['main'] + workers,
+            }
+            peak = peaks.setdefault(key, {'phase': sample['phase'], 'object_type': sample['object_type'], **values})
+            for name, value in values.items():
+                peak[name] = max(peak[name], value)
+        return peaks
+
+    def write(self, file_name=None):
+        file_name = file_name or config.file_memory_profile
+        peaks = self.peaks()
+        for key, peak in peaks.items():
+            utils.print_log(f"geheugen: {key:40} | totaal: {peak['total'] / 1e6:8.1f} MB | "
+                            f"main: {peak['main'] / 1e6:8.1f} MB | workers: {peak['workers'] / 1e6:8.1f} MB | "
+                            f"grootste worker: {peak['worker_max'] / 1e6:8.1f} MB | "
+                            f"DuckDB: {peak['duckdb'] / 1e6:8.1f} MB")
+
+        path = os.path.dirname(file_name)
+        if path and not os.path.exists(path):
+            os.makedirs(path)
+        with open(file_name, 'w') as file:
+            json.dump({
+                'start': self.start_datetime.isoformat(timespec='seconds'),
+                'interval': self.interval,
+                'samples': len(self.samples),
+                'timeline': config.file_memory_timeline,
+                'peaks': list(peaks.values()),
+            }, file)
+        utils.print_log(f"geheugen pieken opgeslagen in '{file_name}', tijdlijn in '{config.file_memory_timeline}'")
@@ -0,0 +1,124 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import config
+
+
+class Metrics:
+    # Named spans (total duration and number of calls) and counters, both with optional labels like
+    # object_type='Pand'. Written as JSON and Prometheus textfile at the end of an import.
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.spans = {}
+        self.counters = {}
+        self.info = {}
+        # Stack of the spans that are running, the last one is the current phase
+        self.active = []
+
+    @staticmethod
+    def __key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @contextmanager
+    def span(self, name, **labels):
+        start_time = time.perf_counter()
+        self.active.append((name, labels))
+        try:
+            yield
+        finally:
+            self.active.pop()
+            self.add_time(name, time.perf_counter() - start_time, **labels)
+
+    def current_phase(self):
+        # Name of the innermost running span and the object type of the nearest span that has one
+        # (copy, because the memory monitor calls this from another thread)
+        active = list(self.active)
+        phase = active[-1][0] if active else None
+        object_type = next((labels['object_type'] for _, labels in reversed(active) if 'object_type' in labels), None)
+        return phase, object_type
+
+    def add_time(self, name, seconds, **labels):
+        span = self.spans.setdefault(self.__key(name, labels), {'seconds': 0.0, 'calls': 0})
+        span['seconds'] += seconds
+        span['calls'] += 1
+
+    def count(self, name, value=1, **labels):
+        key = self.__key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def throughput(self):
+        # Objects parsed per second of each parse span
+        result = []
+        for (name, labels), span in self.spans.items():
+            objects = self.counters.get(('objects_parsed', labels))
+            if name == 'parse' and objects and span['seconds'] > 0:
+                result.append({'labels': dict(labels), 'objects_per_second': objects / span['seconds']})
+        return result
+
+    def to_dict(self):
+        return {
+            'start': datetime.fromtimestamp(self.start_time).isoformat(timespec='seconds'),
+            'end': datetime.now().isoformat(timespec='seconds'),
+            'info': self.info,
+            'spans': [{'name': name, 'labels': dict(labels), **span} for (name, labels), span in self.spans.items()],
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in self.counters.items()],
+            'throughput': self.throughput(),
+        }
+
+    @staticmethod
+    def __prometheus_labels(labels):
+        if not labels:
+            return ''
+
+        def escape(value):
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels) + '}'
+
+    def to_prometheus(self):
+        lines = []
+
+        def metric(name, metric_type, help_text, values):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in values:
+                lines.append(f'{name}{self.__prometheus_labels(labels)} {value}')
+
+        metric('bag_import_info', 'gauge', 'BAG parser version and settings of the last import',
+               [(tuple(sorted((key, str(value)) for key, value in self.info.items())), 1)])
+        metric('bag_import_last_run_timestamp_seconds', 'gauge', 'Start time of the last import',
+               [((), self.start_time)])
+        metric('bag_import_span_seconds', 'gauge', 'Total duration of an import phase in seconds',
+               [((('span', name),) + labels, span['seconds']) for (name, labels), span in self.spans.items()])
+        metric('bag_import_span_calls', 'gauge', 'Number of times an import phase was run',
+               [((('span', name),) + labels, span['calls']) for (name, labels), span in self.spans.items()])
+        for name in sorted({name for name, _ in self.counters}):
+            metric(f'bag_import_{name}_total', 'counter', f'{name.replace("_", " ").capitalize()} in the last import',
+                   [(labels, value) for (counter_name, labels), value in self.counters.items()
+                    if counter_name == name])
+        metric('bag_import_objects_per_second', 'gauge', 'Objects parsed per second',
+               [(tuple(item['labels'].items()), item['objects_per_second']) for item in self.throughput()])
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def __write_file(file_name, text):
+        # Write to a temporary file first, so a reader (like the Prometheus node exporter) never sees a partial file
+        path = os.path.dirname(file_name)
+        if path and not os.path.exists(path):
+            os.makedirs(path)
+
+        with open(file_name + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(file_name + '.tmp', file_name)
+
+    def write(self):
+        if config.file_metrics_json:
+            self.__write_file(config.file_metrics_json, json.dumps(self.to_dict(), indent=2))
+        if config.file_metrics_prometheus:
+            self.__write_file(config.file_metrics_prometheus, self.to_prometheus())
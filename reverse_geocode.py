@@ -0,0 +1,31 @@
+#! /usr/bin/env python3
+from argparse import ArgumentParser
+
+from geocoder import ReverseGeocoder
+
+parser = ArgumentParser(description='Find the nearest address to a point or to all points in a CSV or Parquet file')
+
+helpText = "WGS84 point, e.g. --wgs84 52.3600 4.8852"
+parser.add_argument('--wgs84', nargs=2, type=float, metavar=('LATITUDE', 'LONGITUDE'), help=helpText)
+
+helpText = "Rijksdriehoek (RD) point, e.g. --rd 120816 485901"
+parser.add_argument('--rd', nargs=2, type=float, metavar=('X', 'Y'), help=helpText)
+
+helpText = "CSV or Parquet file with latitude/longitude or rd_x/rd_y columns"
+parser.add_argument('-f', '--file', help=helpText)
+
+helpText = "Output file for --file (default: output/reverse_geocoded.parquet). Use a .csv extension for CSV"
+parser.add_argument('-o', '--output', default='output/reverse_geocoded.parquet', help=helpText)
+
+args = parser.parse_args()
+
+reverse_geocoder = ReverseGeocoder()
+
+if args.wgs84:
+    print(reverse_geocoder.nearest_wgs84(*args.wgs84))
+elif args.rd:
+    print(reverse_geocoder.nearest_rd(*args.rd))
+elif args.file:
+    reverse_geocoder.nearest_file(args.file, args.output)
+else:
+    parser.print_help()
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import polars as pl
+import pytest
+
+# The tests import the modules of the repository root, like the scripts there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database_duckdb import DatabaseDuckdb  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = DatabaseDuckdb(file_db=str(tmp_path / 'test.duckdb'))
+    yield database
+    database.close()
+
+
+def create_adressen(database, rows):
+    # Minimal adressen table with the columns the geocoders use. rows: (nummer_id, postcode, huisnummer, rd_x, rd_y)
+    database.connection.execute("""
+        CREATE OR REPLACE TABLE adressen (
+            nummer_id TEXT, postcode TEXT, huisnummer INTEGER, huisletter TEXT, toevoeging TEXT,
+            hoofd_nummer_id TEXT, object_type TEXT, rd_x DOUBLE, rd_y DOUBLE, latitude DOUBLE, longitude DOUBLE,
+            bouwjaar INTEGER, woonplaats_id INTEGER, gemeente_id INTEGER)
+        """)
+    df_rows = pl.DataFrame(rows, schema=['nummer_id', 'postcode', 'huisnummer', 'rd_x', 'rd_y'], orient='row')
+    database.connection.execute("""
+        INSERT INTO adressen BY NAME
+        SELECT *, 'V' AS object_type, 2000 AS bouwjaar, 1 AS woonplaats_id, 1 AS gemeente_id FROM df_rows
+        """)
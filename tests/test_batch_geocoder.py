@@ -0,0 +1,31 @@
+import random
+
+import duckdb
+
+from geocoder import BatchGeocoder
+from conftest import create_adressen
+
+
+def test_geocode_file_keeps_input_order(database, tmp_path):
+    random.seed(1)
+    create_adressen(database, [(f"{i:04d}", f"{1000 + i}AA", 1, 100_000.0 + i, 400_000.0) for i in range(5000)])
+
+    # Addresses in random order, every 10th with a postcode that is not in the BAG
+    input_filename = str(tmp_path / 'adressen.csv')
+    postcodes = [f"{1000 + i}AA" if i % 10 else f"{1000 + i}ZZ" for i in range(5000)]
+    random.shuffle(postcodes)
+    with open(input_filename, 'w', encoding='utf-8') as file:
+        file.write('n,postcode,huisnummer\n')
+        file.writelines(f"{n},{postcode},1\n" for n, postcode in enumerate(postcodes))
+
+    output_filename = str(tmp_path / 'geocoded.parquet')
+    unmatched_filename = str(tmp_path / 'unmatched.parquet')
+    counts = BatchGeocoder(database).geocode_file(input_filename, output_filename, unmatched_filename)
+
+    assert counts == {'exact': 4500, 'onbekend': 500}
+    output = duckdb.sql(f"SELECT n, postcode, bag_rd_x FROM '{output_filename}'").fetchall()
+    unmatched = duckdb.sql(f"SELECT n, postcode FROM '{unmatched_filename}'").fetchall()
+    assert [row[0] for row in output] == sorted(row[0] for row in output)
+    assert [row[0] for row in unmatched] == sorted(row[0] for row in unmatched)
+    assert [row[1] for row in output] == [postcode for postcode in postcodes if postcode.endswith('AA')]
+    assert all(row[2] == 100_000.0 + int(row[1][:4]) - 1000 for row in output)
@@ -0,0 +1,61 @@
+from datetime import date
+
+import duckdb
+import polars as pl
+import pytest
+
+
+def test_dataframe_schema_and_list_columns(database):
+    rows = [
+        {'id': '1', 'pand_id': ['p1\tp2', None], 'gebruiksdoel': [], 'nevenadressen': None, 'oppervlakte': 80,
+         'status': '', 'onbekend_veld': 'x'},
+        {'id': '2', 'pand_id': ['p3'], 'gebruiksdoel': ['woonfunctie', 'winkelfunctie'], 'nevenadressen': ['n1'],
+         'oppervlakte': None, 'status': 'Verblijfsobject in gebruik'},
+    ]
+
+    df = database.dataframe('verblijfsobjecten', rows)
+
+    assert df.columns == list(database.bag_table_schema('verblijfsobjecten'))
+    assert df.schema['pand_id'] == pl.List(pl.String)
+    # Values are kept as they are, also with a tab or a None element
+    assert df['pand_id'].to_list() == [['p1\tp2', None], ['p3']]
+    assert df['gebruiksdoel'].to_list() == [None, ['woonfunctie', 'winkelfunctie']]
+    assert df['nevenadressen'].to_list() == [None, ['n1']]
+    assert df['status'].to_list() == [None, 'Verblijfsobject in gebruik']
+    assert df['oppervlakte'].to_list() == [80.0, None]
+
+
+def test_save_verblijfsobject_list_columns(database):
+    database.create_bag_table('verblijfsobjecten')
+    database.save_verblijfsobject([{'id': '1', 'pand_id': ['p1\tp2', None], 'gebruiksdoel': ['woonfunctie'],
+                                    'nevenadressen': None}])
+
+    assert database.fetchall("SELECT pand_id, gebruiksdoel FROM verblijfsobjecten") == \
+        [(['p1\tp2', None], ['woonfunctie'])]
+
+
+def test_keep_versions_valid_on(database, tmp_path):
+    # The parse cache holds all versions of an import with active_only, the versions valid on a date are selected
+    # after loading it
+    database.create_bag_table('openbare_ruimten', all_versions=True)
+    database.save_openbare_ruimte([
+        {'id': 1, 'naam': 'Eerste straat', 'voorkomen_id': 1, 'status': 'Naamgeving uitgegeven',
+         'begindatum_geldigheid': date(2000, 1, 1), 'einddatum_geldigheid': date(2015, 1, 1)},
+        {'id': 1, 'naam': 'Tweede straat', 'voorkomen_id': 2, 'status': 'Naamgeving uitgegeven',
+         'begindatum_geldigheid': date(2015, 1, 1), 'einddatum_geldigheid': None},
+        {'id': 2, 'naam': 'Nieuwe straat', 'voorkomen_id': 1, 'status': 'Naamgeving uitgegeven',
+         'begindatum_geldigheid': date(2030, 1, 1), 'einddatum_geldigheid': None},
+    ])
+    file_parquet = str(tmp_path / 'openbare_ruimten.parquet')
+    database.save_table_parquet('openbare_ruimten', file_parquet)
+
+    for peildatum, namen in [('2014-12-31', ['Eerste straat']), ('2015-01-01', ['Tweede straat']),
+                             ('2030-01-01', ['Tweede straat', 'Nieuwe straat'])]:
+        database.create_bag_table('openbare_ruimten', all_versions=True)
+        database.load_table_parquet('openbare_ruimten', file_parquet)
+        database.keep_versions_valid_on('openbare_ruimten', peildatum)
+        assert [row[0] for row in database.fetchall("SELECT naam FROM openbare_ruimten ORDER BY id")] == namen
+
+    # The table has the primary key of an import with active_only again
+    with pytest.raises(duckdb.ConstraintException):
+        database.connection.execute("INSERT INTO openbare_ruimten (id, voorkomen_id) VALUES (1, 3)")
@@ -0,0 +1,74 @@
+from datetime import date
+
+import pytest
+
+import config
+from exporter import Exporter
+
+
+@pytest.fixture
+def history_database(database, monkeypatch):
+    # A woonplaats and a street that were both renamed, with a correction of the first version of the street on
+    # the same date, and a single address
+    monkeypatch.setattr(config, 'active_only', False)
+    database.create_bag_tables()
+    database.connection.execute("""
+        CREATE TABLE provincies AS SELECT 27 AS id, 'PV27' AS pv_code, 'Noord-Holland' AS naam;
+        CREATE TABLE gemeenten AS SELECT 363 AS id, 'GM0363' AS gm_code, 'Amsterdam' AS naam, 27 AS provincie_id;
+        """)
+    database.save_woonplaats([
+        {'id': 3594, 'naam': 'Oud', 'voorkomen_id': 1, 'status': 'Woonplaats aangewezen',
+         'begindatum_geldigheid': date(2000, 1, 1), 'einddatum_geldigheid': date(2010, 1, 1)},
+        {'id': 3594, 'naam': 'Nieuw', 'voorkomen_id': 2, 'status': 'Woonplaats aangewezen',
+         'begindatum_geldigheid': date(2010, 1, 1), 'einddatum_geldigheid': None},
+    ])
+    database.save_gemeente_woonplaats([
+        {'gemeente_id': 363, 'woonplaats_id': 3594, 'status': 'definitief',
+         'begindatum_geldigheid': date(2000, 1, 1), 'einddatum_geldigheid': None},
+    ])
+    database.save_openbare_ruimte([
+        {'id': 363300000000001, 'naam': 'Foutstraat', 'voorkomen_id': 1, 'woonplaats_id': 3594,
+         'status': 'Naamgeving uitgegeven', 'begindatum_geldigheid': date(2000, 1, 1),
+         'einddatum_geldigheid': date(2000, 1, 1)},
+        {'id': 363300000000001, 'naam': 'Eerste straat', 'voorkomen_id': 2, 'woonplaats_id': 3594,
+         'status': 'Naamgeving uitgegeven', 'begindatum_geldigheid': date(2000, 1, 1),
+         'einddatum_geldigheid': date(2015, 1, 1)},
+        {'id': 363300000000001, 'naam': 'Tweede straat', 'voorkomen_id': 3, 'woonplaats_id': 3594,
+         'status': 'Naamgeving uitgegeven', 'begindatum_geldigheid': date(2015, 1, 1),
+         'einddatum_geldigheid': None},
+    ])
+    database.save_nummer([
+        {'id': '0363200000000001', 'postcode': '1000AA', 'huisnummer': 1, 'voorkomen_id': 1,
+         'openbare_ruimte_id': 363300000000001, 'status': 'Naamgeving uitgegeven',
+         'begindatum_geldigheid': date(2000, 1, 1), 'einddatum_geldigheid': None},
+    ])
+    database.sort_history_tables()
+    database.create_history_macros()
+    return database
+
+
+def test_versions_with_the_same_begin_date_are_kept(history_database):
+    assert history_database.fetchall(
+        "SELECT voorkomen_id, naam FROM openbare_ruimten ORDER BY voorkomen_id") == \
+        [(1, 'Foutstraat'), (2, 'Eerste straat'), (3, 'Tweede straat')]
+    assert history_database.fetchone("SELECT count(*) FROM woonplaatsen") == 2
+
+
+@pytest.mark.parametrize('peildatum, straat, woonplaats', [
+    ('2000-01-01', 'Eerste straat', 'Oud'),
+    ('2012-06-01', 'Eerste straat', 'Nieuw'),
+    ('2015-01-01', 'Tweede straat', 'Nieuw'),
+])
+def test_export_names_valid_on_peildatum(history_database, peildatum, straat, woonplaats):
+    # One row per address with the names of the versions valid on the peildatum, not one per version
+    history_database.create_adressen_as_of(peildatum)
+    history_database.create_adressen_export()
+
+    assert history_database.fetchall("SELECT straat::VARCHAR, woonplaats::VARCHAR FROM adressen_export") == \
+        [(straat, woonplaats)]
+
+    exporter = Exporter(history_database)
+    exporter.use_adressen_export = False
+    from_clause, columns = exporter._adressen_from('straat', 'woonplaats')
+    assert history_database.fetchall(f"SELECT {columns['straat']}, {columns['woonplaats']} FROM {from_clause}") == \
+        [(straat, woonplaats)]
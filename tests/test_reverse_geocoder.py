@@ -0,0 +1,55 @@
+import pytest
+
+from bag import rijksdriehoek
+from geocoder import ReverseGeocoder
+from conftest import create_adressen
+
+ADRESSEN = [
+    ('0001', '1000AA', 1, 100_010.0, 400_010.0),
+    ('0002', '1000AA', 2, 100_500.0, 400_500.0),
+    # In the neighbouring cell of the points below, for all cell sizes used
+    ('0003', '1000AB', 1, 99_990.0, 399_990.0),
+    # Further away than max_distance of all points below
+    ('0004', '1000AC', 1, 130_000.0, 430_000.0),
+]
+
+
+def reverse_geocoder(database, cell_size):
+    create_adressen(database, ADRESSEN)
+    database.create_adressen_grid(cell_size)
+    return ReverseGeocoder(database)
+
+
+@pytest.mark.parametrize('cell_size', [100, 1000, 20_000, 100_000])
+def test_nearest_rd(database, cell_size):
+    # Also with a cell size of more than 2 * max_distance, where only the own and neighbouring cells are searched
+    geocoder = reverse_geocoder(database, cell_size)
+
+    assert geocoder.nearest_rd(100_020, 400_020)['nummer_id'] == '0001'
+    assert geocoder.nearest_rd(100_490, 400_480)['nummer_id'] == '0002'
+    assert geocoder.nearest_rd(100_000, 400_000)['nummer_id'] in ('0001', '0003')
+    assert geocoder.nearest_rd(99_980, 399_985)['nummer_id'] == '0003'
+    assert geocoder.nearest_rd(115_000, 415_000) is None
+
+
+@pytest.mark.parametrize('cell_size', [100, 1000, 20_000, 100_000])
+def test_nearest_many_rd(database, cell_size):
+    geocoder = reverse_geocoder(database, cell_size)
+    points = [(100_020, 400_020), (100_490, 400_480), (99_980, 399_985), (115_000, 415_000)]
+
+    results = geocoder.nearest_many_rd(points)
+
+    assert [result['nummer_id'] if result else None for result in results] == ['0001', '0002', '0003', None]
+    assert results[0]['afstand'] == pytest.approx(10 * 2 ** 0.5)
+    assert results == [geocoder.nearest_rd(x, y) for x, y in points]
+
+
+def test_nearest_many_with_missing_coordinates(database):
+    geocoder = reverse_geocoder(database, 100)
+    latitude, longitude = rijksdriehoek.rijksdriehoek_to_wgs84(100_020, 400_020)
+
+    results = geocoder.nearest_many_wgs84([(latitude, longitude), (None, longitude), (latitude, None)])
+    assert [result['nummer_id'] if result else None for result in results] == ['0001', None, None]
+
+    results = geocoder.nearest_many_rd([(None, None), (100_020, 400_020)])
+    assert [result['nummer_id'] if result else None for result in results] == [None, '0001']
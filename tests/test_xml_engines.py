@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import config
+from bag.bag_parser import BagParser, parse_xml_file, OBJECT_TYPE_TABLES
+from benchmarks.synthetic_bag import SyntheticBag
+
+FILE_GEMEENTEN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'input', 'gemeenten.csv')
+
+
+@pytest.fixture(scope='module')
+def synthetic_bag():
+    return SyntheticBag(scale=0.0002, seed=1, file_gemeenten=FILE_GEMEENTEN)
+
+
+def parse(file_xml, parser, engine):
+    return parse_xml_file(file_xml, parser.tag_name, parser.data_init, parser.object_tag_name, parser.db_fields,
+                          engine)['data']
+
+
+@pytest.mark.parametrize('object_type', list(OBJECT_TYPE_TABLES))
+@pytest.mark.parametrize('active_only', [True, False])
+def test_engines_give_identical_rows(synthetic_bag, tmp_path, monkeypatch, object_type, active_only):
+    # The scan engine must return exactly the rows of lxml, with all versions and with only the active ones
+    monkeypatch.setattr(config, 'active_only', active_only)
+    parser = BagParser(None)
+    parser.set_object_type(object_type)
+    xml_files = synthetic_bag.write_xml_files(object_type, str(tmp_path))
+
+    for file_xml in xml_files:
+        rows_lxml = parse(file_xml, parser, 'lxml')
+        assert rows_lxml
+        assert parse(file_xml, parser, 'scan') == rows_lxml
+    parser.close()
+
+
+def test_engines_give_identical_geometries(synthetic_bag, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'parse_geometries', True)
+    parser = BagParser(None)
+    parser.set_object_type('Pand')
+    xml_files = synthetic_bag.write_xml_files('Pand', str(tmp_path))
+
+    for file_xml in xml_files:
+        rows_lxml = parse(file_xml, parser, 'lxml')
+        assert all(row['geometry'] for row in rows_lxml)
+        assert parse(file_xml, parser, 'scan') == rows_lxml
+    parser.close()
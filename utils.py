@@ -1,3 +1,5 @@
+import hashlib
+import json
 import math
 import multiprocessing
 import time
@@ -8,7 +10,9 @@ import shutil
 import sys
 from zipfile import ZipFile
 
+import config
 from logger import Logger
+from metrics import Metrics
 from bag import rijksdriehoek
 from enum import Enum
 
@@ -27,6 +31,7 @@ class TextStyle(Enum):
 
 
 logger = Logger()
+metrics = Metrics()
 
 
 def unzip_files(zip_filename, filenames, path):
@@ -35,7 +40,8 @@ def unzip_files(zip_filename, filenames, path):
             file_zip.extract(filename, path)
 
 
-def unzip_files_multithreaded(zip_filename, path, workers_count=multiprocessing.cpu_count()):
+def unzip_files_multithreaded(zip_filename, path, workers_count=multiprocessing.cpu_count(), executor=None):
+    # Unzip in worker processes. Uses the given executor (process pool) if any, instead of starting a new pool.
 
     with ZipFile(zip_filename, 'r') as archive:
         files = archive.namelist()
@@ -50,31 +56,64 @@ def unzip_files_multithreaded(zip_filename, path, workers_count=multiprocessing.
     # use ceil instead of round to prevent zero batch size
     batch_size = math.ceil(files_total / workers_count)
 
-    with ProcessPoolExecutor(workers_count) as executor:
-        for i in range(0, files_total, batch_size):
-            filenames = files[i:(i + batch_size)]
-            _ = executor.submit(unzip_files, zip_filename, filenames, path)
+    def submit(pool):
+        return [pool.submit(unzip_files, zip_filename, files[i:(i + batch_size)], path)
+                for i in range(0, files_total, batch_size)]
+
+    if executor:
+        futures = submit(executor)
+    else:
+        with ProcessPoolExecutor(workers_count) as pool:
+            futures = submit(pool)
+
+    # Raise errors of the workers
+    for future in futures:
+        future.result()
 
 
 def clear_log():
     logger.clear()
 
 
-def print_log(message, error=False):
+def print_log(message, error=False, level='INFO'):
+    if error:
+        level = 'ERROR'
+    if not logger.level_enabled(level):
+        return
+
     now = datetime.now()
 
-    if error:
-        message = 'ERROR: ' + message
+    if level in ('WARNING', 'ERROR'):
+        message = f"{level}: " + message
 
     text = now.strftime("%Y-%m-%d %H:%M:%S.%f") + ' ' + message
     text_console = text
-    if error:
+    if level == 'ERROR':
         text_console = TextStyle.RED.value + text + TextStyle.RESET.value
+    elif level == 'WARNING':
+        text_console = TextStyle.YELLOW.value + text + TextStyle.RESET.value
 
+    # The console stays in sync with the progress bar, the log file is written by a background thread
     print(text_console)
     logger.log(text)
 
 
+def print_log_repeated(message, category, error=True):
+    # For errors that can occur for every XML file or batch. The first message of a category (e.g. "insert errors
+    # of type ConversionException in verblijfsobjecten") is logged, repeats are counted.
+    suppressed = logger.repeated(category)
+    if suppressed == 0:
+        print_log(message, error)
+    elif suppressed:
+        print_log(f"{suppressed} more {category}", error)
+
+
+def print_log_repeated_summary():
+    # Log the number of repeated messages that were not reported yet
+    for category, suppressed in logger.repeated_summary().items():
+        print_log(f"{suppressed} more {category}", error=True)
+
+
 def find_file(folder, search_text, extension):
     for file_name in os.listdir(folder):
         if search_text in file_name and file_name.endswith(extension):
@@ -113,9 +152,10 @@ def print_progress_bar(i, max_value, text, final=False):
 
 
 def time_elapsed(start_time):
-    now_time = time.perf_counter()
-    elapsed_time = now_time - start_time
+    return time_text(time.perf_counter() - start_time)
 
+
+def time_text(elapsed_time):
     hours = elapsed_time // 3600
     minutes = (elapsed_time % 3600) // 60
     seconds = elapsed_time % 60
@@ -147,26 +187,95 @@ def bag_date_today():
     return datetime.today().strftime("%Y-%m-%d")
 
 
+# Cache of converted polygon vertices in each (worker) process. Adjacent panden, like terraced houses, share most of
+# their vertices and every ring repeats its first vertex at the end. The key is the text of the RD coordinate in the
+# posList, which the BAG gives in millimetres. The cache is cleared when it holds coordinates_cache_size vertices.
+# The vertices are cached as formatted with geometry_decimals.
+coordinates_cache = {}
+coordinates_cache_hits = 0
+coordinates_cache_misses = 0
+
+
+def coordinates_cache_counts():
+    # (hits, misses) since the previous call
+    global coordinates_cache_hits, coordinates_cache_misses
+    counts = (coordinates_cache_hits, coordinates_cache_misses)
+    coordinates_cache_hits = 0
+    coordinates_cache_misses = 0
+    return counts
+
+
+def rd_vertex_to_wgs_json(x, y):
+    # '[lon,lat]' of an RD vertex given as posList text
+    global coordinates_cache_hits, coordinates_cache_misses
+    key = (x, y)
+    vertex = coordinates_cache.get(key)
+    if vertex is not None:
+        coordinates_cache_hits += 1
+        return vertex
+
+    coordinates_cache_misses += 1
+    lat, lon = rijksdriehoek.rijksdriehoek_to_wgs84(float(x), float(y))
+    if config.geometry_decimals is not None:
+        lat = round(lat, config.geometry_decimals)
+        lon = round(lon, config.geometry_decimals)
+    vertex = '[' + str(lon) + ',' + str(lat) + ']'
+    if config.coordinates_cache_size:
+        if len(coordinates_cache) >= config.coordinates_cache_size:
+            coordinates_cache.clear()
+        coordinates_cache[key] = vertex
+    return vertex
+
+
+def simplify_ring(vertices, tolerance):
+    # Douglas-Peucker simplification of a closed ring of RD vertices (posList text), tolerance in metres. Returns the
+    # ring unchanged if less than 4 vertices (a closed triangle) would remain.
+    points = [(float(x), float(y)) for x, y in vertices]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    segments = [(0, len(points) - 1)]
+    while segments:
+        first, last = segments.pop()
+        x1, y1 = points[first]
+        dx = points[last][0] - x1
+        dy = points[last][1] - y1
+        length = math.hypot(dx, dy)
+        max_distance = 0
+        farthest = None
+        for i in range(first + 1, last):
+            x, y = points[i]
+            if length:
+                distance = abs(dy * (x - x1) - dx * (y - y1)) / length
+            else:
+                # The first and last vertex of a ring are the same point
+                distance = math.hypot(x - x1, y - y1)
+            if distance > max_distance:
+                max_distance = distance
+                farthest = i
+        if farthest is not None and max_distance > tolerance:
+            keep[farthest] = True
+            segments.append((first, farthest))
+            segments.append((farthest, last))
+
+    if sum(keep) < 4:
+        return vertices
+    return [vertex for vertex, kept in zip(vertices, keep) if kept]
+
+
 def bag_geometry_to_wgs_geojson(geometry, geometry_points=2):
     geometries = geometry.split(",")
     coordinates_wgs = ''
     for linear_ring in geometries:
         linear_ring = linear_ring.split()
-        ring_coordinates_wgs = ''
         it = iter(linear_ring)
 
         if geometry_points == 2:
-            for x, y in zip(it, it):
-                lat, lon = rijksdriehoek.rijksdriehoek_to_wgs84(float(x), float(y))
-                if ring_coordinates_wgs:
-                    ring_coordinates_wgs += ','
-                ring_coordinates_wgs += '[' + str(lon) + ',' + str(lat) + ']'
+            vertices = list(zip(it, it))
         else:
-            for x, y, z in zip(it, it, it):
-                lat, lon = rijksdriehoek.rijksdriehoek_to_wgs84(float(x), float(y))
-                if ring_coordinates_wgs:
-                    ring_coordinates_wgs += ','
-                ring_coordinates_wgs += '[' + str(lon) + ',' + str(lat) + ']'
+            vertices = [(x, y) for x, y, z in zip(it, it, it)]
+        if config.geometry_simplify_tolerance:
+            vertices = simplify_ring(vertices, config.geometry_simplify_tolerance)
+        ring_coordinates_wgs = ','.join([rd_vertex_to_wgs_json(x, y) for x, y in vertices])
         if coordinates_wgs:
             coordinates_wgs += ','
         coordinates_wgs += '[' + ring_coordinates_wgs + ']'
@@ -175,6 +284,117 @@ def bag_geometry_to_wgs_geojson(geometry, geometry_points=2):
     return coordinates_wgs
 
 
+def bag_geometry_footprint(geometry, geometry_points=2):
+    # Area (m2), centroid and bounding box in RD coordinates of a polygon posList text. The first ring is the outline,
+    # the other rings are holes.
+    area = 0.0
+    moment_x = 0.0
+    moment_y = 0.0
+    xmin = ymin = math.inf
+    xmax = ymax = -math.inf
+    for ring_number, linear_ring in enumerate(geometry.split(",")):
+        coordinates = [float(c) for c in linear_ring.split()]
+        xs = coordinates[0::geometry_points]
+        ys = coordinates[1::geometry_points]
+        if len(xs) < 3:
+            continue
+        xmin = min(xmin, min(xs))
+        ymin = min(ymin, min(ys))
+        xmax = max(xmax, max(xs))
+        ymax = max(ymax, max(ys))
+
+        # Shoelace formula, relative to the first vertex for precision
+        x0 = xs[0]
+        y0 = ys[0]
+        ring_area = 0.0
+        ring_moment_x = 0.0
+        ring_moment_y = 0.0
+        for i in range(len(xs) - 1):
+            x1 = xs[i] - x0
+            y1 = ys[i] - y0
+            x2 = xs[i + 1] - x0
+            y2 = ys[i + 1] - y0
+            cross = x1 * y2 - x2 * y1
+            ring_area += cross
+            ring_moment_x += (x1 + x2) * cross
+            ring_moment_y += (y1 + y2) * cross
+        ring_area /= 2
+        if ring_area == 0:
+            continue
+        centroid_x = x0 + ring_moment_x / (6 * ring_area)
+        centroid_y = y0 + ring_moment_y / (6 * ring_area)
+        # Holes are subtracted, regardless of the orientation of the ring
+        ring_area = abs(ring_area) if ring_number == 0 else -abs(ring_area)
+        area += ring_area
+        moment_x += centroid_x * ring_area
+        moment_y += centroid_y * ring_area
+
+    if xmin == math.inf:
+        return None
+    if area <= 0:
+        return 0.0, (xmin + xmax) / 2, (ymin + ymax) / 2, xmin, ymin, xmax, ymax
+    return area, moment_x / area, moment_y / area, xmin, ymin, xmax, ymax
+
+
+def bag_geometry_to_rd_wkt(geometry, geometry_points=2):
+    # WKT polygon in RD coordinates (geometry_crs = 'RD'), the posList coordinates are used as they are
+    rings_wkt = ''
+    for linear_ring in geometry.split(","):
+        it = iter(linear_ring.split())
+
+        if geometry_points == 2:
+            vertices = list(zip(it, it))
+        else:
+            vertices = [(x, y) for x, y, z in zip(it, it, it)]
+        if config.geometry_simplify_tolerance:
+            vertices = simplify_ring(vertices, config.geometry_simplify_tolerance)
+        if rings_wkt:
+            rings_wkt += ','
+        rings_wkt += '(' + ','.join([x + ' ' + y for x, y in vertices]) + ')'
+
+    return 'POLYGON(' + rings_wkt + ')'
+
+
+def file_fingerprint(file_name, block_size=1024 * 1024):
+    # Quick fingerprint of a (large) file: the size plus a hash of the first and last block.
+    # Hashing the complete 3GB BAG file would take too long to do on every import.
+    size = os.path.getsize(file_name)
+    sha256 = hashlib.sha256(str(size).encode())
+    with open(file_name, 'rb') as file:
+        sha256.update(file.read(block_size))
+        if size > block_size:
+            file.seek(max(size - block_size, block_size))
+            sha256.update(file.read(block_size))
+
+    return sha256.hexdigest()
+
+
+def file_hash(file_name, block_size=1024 * 1024):
+    # sha256 hash of the complete file content
+    sha256 = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        while block := file.read(block_size):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+def config_override(overrides):
+    # Override settings in config.py (a dict with setting names and values). Worker processes get the
+    # overrides through an environment variable that is read by config.py.
+    for name, value in overrides.items():
+        if not hasattr(config, name):
+            raise Exception(f"Onbekende config instelling '{name}'")
+        setattr(config, name, value)
+
+    # The logger of this process was created with the file_log setting of config.py
+    if 'file_log' in overrides:
+        logger.reopen()
+
+    overrides = {**json.loads(os.environ.get('BAG_PARSER_CONFIG', '{}')), **overrides}
+    os.environ['BAG_PARSER_CONFIG'] = json.dumps(overrides)
+
+
 def bag_pos_to_rd_coordinates(pos):
     pos = pos.split()
     return float(pos[0]), float(pos[1])